@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Times rendering a template with many constant :ttag:`embed` tags of a single content type, with one template override halfway through. Run from the root of the repository with django and mptt installed::
+
+	python benchmarks/embed_loading.py [N ...]
+
+Each N is a number of embeds (default: 100 400 1600). The best of several renders is reported, so the embedded instances are already loaded and only the template lookup is measured.
+
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+if not settings.configured:
+	settings.configure(
+		DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+		INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'django.contrib.sites', 'mptt', 'philo'],
+		SITE_ID=1,
+	)
+
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test.utils import setup_test_template_loader
+
+
+def main(sizes):
+	call_command('syncdb', interactive=False, verbosity=0)
+	from philo.models import Tag
+	tag = Tag.objects.create(name='Tag', slug='tag')
+	setup_test_template_loader({'embed-slug': '{{ embedded.slug }}', 'embed-name': '{{ embedded.name }}'})
+	
+	print '%8s  %10s' % ('N', 'seconds')
+	for size in sizes:
+		embed = '{%% embed philo.tag %d %%}' % tag.pk
+		half = size / 2
+		t = Template('{% load embed %}{% embed philo.tag with "embed-slug" %}' + embed * half + '{% embed philo.tag with "embed-name" %}' + embed * (size - half))
+		best = min(timeit.repeat(lambda: t.render(Context()), number=1, repeat=5))
+		print '%8d  %10.4f' % (size, best)
+
+
+if __name__ == '__main__':
+	main([int(arg) for arg in sys.argv[1:]] or [100, 400, 1600])
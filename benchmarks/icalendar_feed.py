@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Times :meth:`ICalendarFeed.write <philo.contrib.julian.feedgenerator.ICalendarFeed.write>` for a calendar of N events, written natively and - if vobject is installed - with :setting:`PHILO_ICALENDAR_USE_VOBJECT`. Each event has a multi-line description long enough to be folded, categories, and both aware and naive datetimes. Run from the root of the repository with django installed::
+
+	python benchmarks/icalendar_feed.py [N]
+
+N defaults to 10000. The best of three writes is reported for each serializer, along with the installed vobject version.
+
+"""
+import datetime
+import os
+import sys
+import timeit
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+if not settings.configured:
+	settings.configure()
+
+from django.utils.tzinfo import FixedOffset
+
+from philo.contrib.julian.feedgenerator import ICalendarFeed, vobject
+
+
+def build_feed(size):
+	feed = ICalendarFeed(title=u'Benchmark', link=u'http://example.com/', description=u'Benchmark calendar')
+	tz = FixedOffset(-300)
+	start = datetime.datetime(2011, 1, 1, 9, 0, tzinfo=tz)
+	for i in xrange(size):
+		feed.add_item(
+			title=u'Event %d; with, punctuation' % i,
+			link=u'http://example.com/events/%d/' % i,
+			description=u'First line of the description of event %d\nSecond line, which is long enough that the property has to be folded \xe9\xe9\xe9' % i,
+			unique_id=u'event-%d@example.com' % i,
+			start=start + datetime.timedelta(hours=i),
+			end=datetime.datetime(2011, 1, 1, 10, 0) + datetime.timedelta(hours=i),
+			categories=[u'benchmark', u'category %d' % (i % 10)],
+		)
+	return feed
+
+
+def time_write(feed):
+	def write():
+		feed.write(StringIO(), 'utf-8')
+	return min(timeit.repeat(write, number=1, repeat=3))
+
+
+def main(size):
+	feed = build_feed(size)
+	out = StringIO()
+	feed.write(out, 'utf-8')
+	print 'events: %d, bytes: %d' % (size, len(out.getvalue()))
+	print 'native   %.2fs' % time_write(feed)
+	
+	if vobject is None:
+		print 'vobject  not installed'
+		return
+	
+	import pkg_resources
+	settings.PHILO_ICALENDAR_USE_VOBJECT = True
+	try:
+		print 'vobject  %.2fs (vobject %s)' % (time_write(feed), pkg_resources.get_distribution('vobject').version)
+	finally:
+		settings.PHILO_ICALENDAR_USE_VOBJECT = False
+
+
+if __name__ == '__main__':
+	main(len(sys.argv) > 1 and int(sys.argv[1]) or 10000)
@@ -19,6 +19,10 @@ class EventAdmin(EntityAdmin):
 		('Time', {
 			'fields': (('start_date', 'start_time'), ('end_date', 'end_time'),),
 		}),
+		('Recurrence', {
+			'fields': (('recurrence_frequency', 'recurrence_interval'), ('recurrence_count', 'recurrence_until'),),
+			'classes': COLLAPSE_CLASSES
+		}),
 		('Advanced', {
 			'fields': ('parent_event', 'site',),
 			'classes': COLLAPSE_CLASSES
@@ -56,7 +60,7 @@ class CalendarViewAdmin(EntityAdmin):
 			'fields': ('index_page', 'event_detail_page')
 		}),
 		('General Settings', {
-			'fields': ('tag_permalink_base', 'owner_permalink_base', 'location_permalink_base', 'events_per_page')
+			'fields': ('tag_permalink_base', 'owner_permalink_base', 'location_permalink_base', 'events_per_page', 'cursor_pagination')
 		}),
 		('Event List Pages', {
 			'fields': ('timespan_page', 'tag_page', 'location_page', 'owner_page'),
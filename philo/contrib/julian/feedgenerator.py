@@ -1,6 +1,17 @@
+import datetime
+
+from django.conf import settings
 from django.http import HttpResponse
-from django.utils.feedgenerator import SyndicationFeed
-import vobject
+from django.utils.encoding import force_unicode
+from django.utils.feedgenerator import SyndicationFeed, Enclosure
+from django.utils.tzinfo import FixedOffset
+
+from philo.contrib.penfield.feedgenerator import StreamingFeedMixin
+
+try:
+	import vobject
+except ImportError:
+	vobject = None
 
 
 # Map the keys in the ICalendarFeed internal dictionary to the names of iCalendar attributes.
@@ -37,41 +48,150 @@ ITEM_ICAL_MAP = {
 	# ttl is ignored.
 	'start': 'dtstart',
 	'end': 'dtend',
+	'rrule': 'rrule',
 }
 
 
-class ICalendarFeed(SyndicationFeed):
+UTC = FixedOffset(0)
+DEFAULT_PRODID = u'-//Philo//Julian//EN'
+# Properties whose values aren't TEXT, and so aren't escaped.
+UNESCAPED_PROPERTIES = ('URL', 'RRULE')
+
+
+def escape_text(value):
+	"""Escapes ``value`` as an iCalendar TEXT value, as described in :rfc:`5545#section-3.3.11`. Line breaks of any style are written as ``\\n``."""
+	value = force_unicode(value).replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+	return value.replace(u'\\', u'\\\\').replace(u';', u'\\;').replace(u',', u'\\,').replace(u'\n', u'\\n')
+
+
+def format_property(name, value):
+	"""
+	Returns an iCalendar content line for the property ``name`` with the given ``value``. Dates are written as DATE values and datetimes as DATE-TIME values - floating if they are naive, and in UTC otherwise. Lists are written as comma-separated TEXT values, URLs and recurrence rules as they are, and everything else as a single TEXT value.
+	
+	"""
+	name = name.upper()
+	if isinstance(value, datetime.datetime):
+		if value.tzinfo is not None:
+			return u'%s:%sZ' % (name, value.astimezone(UTC).strftime('%Y%m%dT%H%M%S'))
+		return u'%s:%s' % (name, value.strftime('%Y%m%dT%H%M%S'))
+	if isinstance(value, datetime.date):
+		return u'%s;VALUE=DATE:%s' % (name, value.strftime('%Y%m%d'))
+	if isinstance(value, Enclosure):
+		return u'%s;FMTTYPE=%s:%s' % (name, value.mime_type, value.url)
+	if isinstance(value, (list, tuple)):
+		return u'%s:%s' % (name, u','.join([escape_text(v) for v in value]))
+	if name in UNESCAPED_PROPERTIES:
+		return u'%s:%s' % (name, force_unicode(value))
+	return u'%s:%s' % (name, escape_text(value))
+
+
+def fold_line(line):
+	"""Encodes ``line`` as UTF-8 and folds it into lines of at most 75 octets, as described in :rfc:`5545#section-3.1`, without splitting any multi-octet characters. Returns the folded line, terminated by a CRLF."""
+	line = line.encode('utf-8')
+	chunks = []
+	limit = 75
+	while len(line) > limit:
+		cut = limit
+		while ord(line[cut]) & 0xC0 == 0x80:
+			cut -= 1
+		chunks.append(line[:cut])
+		line = line[cut:]
+		# Continuation lines start with a space, which counts towards the limit.
+		limit = 74
+	chunks.append(line)
+	return '\r\n '.join(chunks) + '\r\n'
+
+
+class ICalendarFeed(StreamingFeedMixin, SyndicationFeed):
+	"""
+	Serializes events as an iCalendar (:rfc:`5545`) VCALENDAR. By default, the calendar is written directly; if :setting:`PHILO_ICALENDAR_USE_VOBJECT` is ``True`` and `vobject <http://vobject.skyhouseconsulting.com/>`_ is installed, it will be built and serialized with vobject instead.
+	
+	"""
 	mime_type = 'text/calendar'
 	
 	def add_item(self, *args, **kwargs):
-		for kwarg in ['start', 'end', 'last_modified', 'location']:
+		for kwarg in ['start', 'end', 'last_modified', 'location', 'rrule']:
 			kwargs.setdefault(kwarg, None)
 		super(ICalendarFeed, self).add_item(*args, **kwargs)
 	
+	@property
+	def use_vobject(self):
+		return vobject is not None and getattr(settings, 'PHILO_ICALENDAR_USE_VOBJECT', False)
+	
 	def write(self, outfile, encoding):
-		# TODO: Use encoding... how? Just convert all values when setting them should work...
-		cal = vobject.iCalendar()
+		if self.use_vobject:
+			self.write_vobject(outfile, encoding)
+		else:
+			head, tail = self.write_frame(encoding)
+			outfile.write(head)
+			outfile.write(self.write_current_items(encoding))
+			outfile.write(tail)
 		
-		# IE/Outlook needs this. See
-		# <http://blog.thescoop.org/archives/2007/07/31/django-ical-and-vobject/>
-		cal.add('method').value = 'PUBLISH'
+		# Some special handling for HttpResponses. See link above.
+		if isinstance(outfile, HttpResponse):
+			self.prepare_response(outfile)
+	
+	def prepare_response(self, response):
+		filename = self.feed.get('filename', 'filename.ics')
+		response['Filename'] = filename
+		response['Content-Disposition'] = 'attachment; filename=%s' % filename
+	
+	def write_frame(self, encoding):
+		if self.use_vobject:
+			serialized = self.get_calendar().serialize()
+			end = serialized.rindex('END:VCALENDAR')
+			return serialized[:end], serialized[end:]
 		
+		# IE/Outlook needs METHOD:PUBLISH. See
+		# <http://blog.thescoop.org/archives/2007/07/31/django-ical-and-vobject/>
+		lines = [u'BEGIN:VCALENDAR', u'VERSION:2.0', u'METHOD:PUBLISH']
+		prodid = self.feed.get('id') or DEFAULT_PRODID
+		lines.append(u'PRODID:%s' % escape_text(prodid))
 		for key, val in self.feed.items():
-			if key in FEED_ICAL_MAP and val:
-				cal.add(FEED_ICAL_MAP[key]).value = val
+			if key in FEED_ICAL_MAP and key != 'id' and val:
+				lines.append(format_property(FEED_ICAL_MAP[key], val))
+		return ''.join([fold_line(line) for line in lines]), fold_line(u'END:VCALENDAR')
+	
+	def write_current_items(self, encoding):
+		if self.use_vobject:
+			events = []
+			for item in self.items:
+				event = vobject.newFromBehavior('vevent')
+				self.add_event(event, item, utc=True)
+				events.append(event.serialize())
+			return ''.join(events)
 		
+		lines = []
 		for item in self.items:
 			# TODO: handle multiple types of events.
-			event = cal.add('vevent')
+			lines.append(fold_line(u'BEGIN:VEVENT'))
 			for key, val in item.items():
 				#TODO: handle the non-standard items like comments and author.
 				if key in ITEM_ICAL_MAP and val:
-					event.add(ITEM_ICAL_MAP[key]).value = val
+					lines.append(fold_line(format_property(ITEM_ICAL_MAP[key], val)))
+			lines.append(fold_line(u'END:VEVENT'))
+		return ''.join(lines)
+	
+	# vobject fallback.
+	def get_calendar(self):
+		cal = vobject.iCalendar()
+		cal.add('method').value = 'PUBLISH'
 		
+		for key, val in self.feed.items():
+			if key in FEED_ICAL_MAP and val:
+				cal.add(FEED_ICAL_MAP[key]).value = val
+		return cal
+	
+	def add_event(self, event, item, utc=False):
+		for key, val in item.items():
+			if key in ITEM_ICAL_MAP and val:
+				if utc and isinstance(val, datetime.datetime) and val.tzinfo is not None:
+					# Events which are serialized on their own can't refer to a VTIMEZONE.
+					val = val.astimezone(vobject.icalendar.utc)
+				event.add(ITEM_ICAL_MAP[key]).value = val
+	
+	def write_vobject(self, outfile, encoding):
+		cal = self.get_calendar()
+		for item in self.items:
+			self.add_event(cal.add('vevent'), item)
 		cal.serialize(outfile)
-		
-		# Some special handling for HttpResponses. See link above.
-		if isinstance(outfile, HttpResponse):
-			filename = self.feed.get('filename', 'filename.ics')
-			outfile['Filename'] = filename
-			outfile['Content-Disposition'] = 'attachment; filename=%s' % filename
\ No newline at end of file
@@ -7,6 +7,7 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.generic import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import RegexValidator
 from django.db import models
@@ -15,11 +16,13 @@ from django.http import HttpResponse, Http404
 from django.utils.encoding import force_unicode
 
 from philo.contrib.julian.feedgenerator import ICalendarFeed
-from philo.contrib.penfield.models import FeedView, FEEDS
+from philo.contrib.julian.recurrence import FREQUENCY_CHOICES, Occurrence, iter_starts, get_last_start, format_rrule
+from philo.contrib.penfield.models import FeedView, FEEDS, register_feed_model, get_tag_list
 from philo.exceptions import ViewCanNotProvideSubpath
 from philo.models import Tag, Entity, Page
+from philo.models.pages import get_modification_stamp
 from philo.models.fields import TemplateField
-from philo.utils import ContentTypeRegistryLimiter
+from philo.utils import ContentTypeRegistryLimiter, get_prefetched, filter_by_all
 
 
 __all__ = ('register_location_model', 'unregister_location_model', 'Location', 'TimedModel', 'Event', 'Calendar', 'CalendarView',)
@@ -72,6 +75,11 @@ class TimedModel(models.Model):
 	end_date = models.DateField()
 	end_time = models.TimeField(blank=True, null=True)
 	
+	#: The moment at which the instance starts - midnight at the start of :attr:`start_date` if it has no :attr:`start_time`. This is maintained by :meth:`save` so that timespans can be queried against a single indexed column.
+	start_datetime = models.DateTimeField(editable=False)
+	#: The moment at which the instance ends - midnight at the end of :attr:`end_date` if it has no :attr:`end_time`. This is maintained by :meth:`save`.
+	end_datetime = models.DateTimeField(editable=False)
+	
 	def is_all_day(self):
 		return self.start_time is None and self.end_time is None
 	
@@ -88,10 +96,24 @@ class TimedModel(models.Model):
 	def get_end(self):
 		return datetime.datetime.combine(self.end_date, self.end_time) if self.end_time else self.end_date
 	
+	def save(self, *args, **kwargs):
+		self.start_datetime, self.end_datetime = get_datetime_span(self.start_date, self.start_time, self.end_date, self.end_time)
+		super(TimedModel, self).save(*args, **kwargs)
+	
 	class Meta:
 		abstract = True
 
 
+def get_datetime_span(start_date, start_time, end_date, end_time):
+	"""Returns the values of :attr:`TimedModel.start_datetime` and :attr:`TimedModel.end_datetime` for the given dates and times."""
+	start = datetime.datetime.combine(start_date, start_time or datetime.time.min)
+	if end_time is None:
+		end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+	else:
+		end = datetime.datetime.combine(end_date, end_time)
+	return start, end
+
+
 class EventManager(models.Manager):
 	def get_query_set(self):
 		return EventQuerySet(self.model)
@@ -105,6 +127,21 @@ class EventQuerySet(QuerySet):
 		return self.filter(start_date__exact=models.F('end_date'))
 	def multiday(self):
 		return self.exclude(start_date__exact=models.F('end_date'))
+	def overlapping(self, start, end):
+		"""Returns the events which overlap the span from ``start`` up to (but not including) ``end``. Recurring events are matched if the span falls between their first occurrence and the end of their last, even if no single occurrence overlaps it; use :meth:`occurring` to leave those out."""
+		return self.filter(models.Q(end_datetime__gt=start) | models.Q(recurrence_end__gt=start) | models.Q(recurrence_end__isnull=True, recurrence_frequency__gt=''), start_datetime__lt=end)
+	def occurring(self, start, end):
+		"""Returns the events with at least one occurrence which overlaps the span from ``start`` up to (but not including) ``end``. The recurring events matched by :meth:`overlapping` are fetched and expanded within the span to find those which don't occur in it."""
+		events = self.overlapping(start, end)
+		missing = []
+		for event in events.exclude(recurrence_frequency=''):
+			for occurrence in event.get_occurrences(start, end):
+				break
+			else:
+				missing.append(event.pk)
+		if missing:
+			events = events.exclude(pk__in=missing)
+		return events
 
 class Event(Entity, TimedModel):
 	name = models.CharField(max_length=255)
@@ -120,6 +157,17 @@ class Event(Entity, TimedModel):
 	
 	parent_event = models.ForeignKey('self', blank=True, null=True)
 	
+	#: How often the event repeats. If this is blank, the event happens only once.
+	recurrence_frequency = models.CharField(max_length=7, choices=FREQUENCY_CHOICES, blank=True)
+	#: The number of days, weeks, months or years between repetitions.
+	recurrence_interval = models.PositiveIntegerField(default=1)
+	#: The total number of occurrences, if the repetition is limited.
+	recurrence_count = models.PositiveIntegerField(blank=True, null=True)
+	#: The last date on which an occurrence may start, if the repetition is limited.
+	recurrence_until = models.DateField(blank=True, null=True)
+	#: The moment at which the last occurrence ends, or ``None`` if the event repeats forever. This is maintained by :meth:`save`, and is the end of the event itself if its limits leave no occurrences.
+	recurrence_end = models.DateTimeField(blank=True, null=True, editable=False)
+	
 	# TODO: "User module"
 	owner = models.ForeignKey(User, related_name='owned_events')
 	
@@ -134,6 +182,52 @@ class Event(Entity, TimedModel):
 	
 	objects = EventManager()
 	
+	@property
+	def is_recurring(self):
+		return bool(self.recurrence_frequency)
+	
+	def iter_occurrence_starts(self, after=None):
+		return iter_starts(self.start_datetime, self.recurrence_frequency, self.recurrence_interval, self.recurrence_count, self.recurrence_until, after)
+	
+	def get_occurrences(self, start=None, end=None):
+		"""Lazily yields the :class:`.Occurrence`\ s of the event which overlap the span from ``start`` up to (but not including) ``end``. Either bound may be ``None``; without an ``end``, a recurring event with no count or until date yields occurrences forever."""
+		duration = self.end_datetime - self.start_datetime
+		if not self.is_recurring:
+			if (start is None or self.end_datetime > start) and (end is None or self.start_datetime < end):
+				yield Occurrence(self, self.start_datetime, self.end_datetime)
+			return
+		
+		for occurrence_start in self.iter_occurrence_starts(after=start is not None and start - duration or None):
+			if end is not None and occurrence_start >= end:
+				return
+			if start is None or occurrence_start + duration > start:
+				yield Occurrence(self, occurrence_start, occurrence_start + duration)
+	
+	def get_rrule(self):
+		"""Returns the event's recurrence rule as the value of an iCalendar ``RRULE`` property, or ``None`` if the event doesn't repeat."""
+		if not self.is_recurring:
+			return None
+		return format_rrule(self.start_datetime, self.recurrence_frequency, self.recurrence_interval, self.recurrence_count, self.recurrence_until, self.is_all_day())
+	
+	def clean(self):
+		super(Event, self).clean()
+		if self.is_recurring:
+			if self.recurrence_count is not None and self.recurrence_count < 1:
+				raise ValidationError("A repeating %s must occur at least once." % self.__class__.__name__)
+			if self.recurrence_until is not None and self.recurrence_until < self.start_date:
+				raise ValidationError("A %s cannot stop repeating before it starts." % self.__class__.__name__)
+	
+	def save(self, *args, **kwargs):
+		self.start_datetime, self.end_datetime = get_datetime_span(self.start_date, self.start_time, self.end_date, self.end_time)
+		self.recurrence_end = None
+		if self.is_recurring and (self.recurrence_count is not None or self.recurrence_until is not None):
+			last_start = get_last_start(self.start_datetime, self.recurrence_frequency, self.recurrence_interval, self.recurrence_count, self.recurrence_until)
+			if last_start is None:
+				self.recurrence_end = self.end_datetime
+			else:
+				self.recurrence_end = last_start + (self.end_datetime - self.start_datetime)
+		super(Event, self).save(*args, **kwargs)
+	
 	def __unicode__(self):
 		return self.name
 	
@@ -141,6 +235,9 @@ class Event(Entity, TimedModel):
 		unique_together = ('site', 'created')
 
 
+CALENDAR_LOCATIONS_CACHE_KEY = 'philo_calendar_locations:%s'
+
+
 class Calendar(Entity):
 	name = models.CharField(max_length=100)
 	slug = models.SlugField(max_length=100)
@@ -153,6 +250,27 @@ class Calendar(Entity):
 	def __unicode__(self):
 		return self.name
 	
+	def get_location_pks(self):
+		"""
+		Returns a dictionary mapping the primary keys of the location :class:`ContentType`\ s of the :class:`Calendar`'s events to lists of the primary keys of their locations. The distinct pairs are found in a single query. If :setting:`PHILO_CALENDAR_CACHE_TIMEOUT` is set, the result is kept in django's cache for that many seconds, or until one of the :class:`Calendar`'s events is saved or deleted.
+		
+		"""
+		timeout = getattr(settings, 'PHILO_CALENDAR_CACHE_TIMEOUT', None)
+		if timeout:
+			cache_key = CALENDAR_LOCATIONS_CACHE_KEY % self.pk
+			location_pks = cache.get(cache_key)
+			if location_pks is not None:
+				return location_pks
+		
+		location_pks = {}
+		locations = self.events.exclude(location_content_type=None).values_list('location_content_type', 'location_pk').distinct()
+		for ct_pk, pk in locations:
+			location_pks.setdefault(ct_pk, []).append(pk)
+		
+		if timeout:
+			cache.set(cache_key, location_pks, timeout)
+		return location_pks
+	
 	@property
 	def fpi(self):
 		# See http://xml.coverpages.org/tauber-fpi.html or ISO 9070:1991 for format information.
@@ -183,6 +301,9 @@ class CalendarView(FeedView):
 	
 	item_context_var = "events"
 	object_attr = "calendar"
+	item_select_related = ('owner', 'site')
+	item_prefetch_related = ('tags', 'location')
+	item_keyset_ordering = ('start_datetime', 'pk')
 	
 	def get_reverse_params(self, obj):
 		if isinstance(obj, User):
@@ -239,46 +360,50 @@ class CalendarView(FeedView):
 			)
 		return urlpatterns
 	
+	def get_validator_stamps(self):
+		return [get_modification_stamp(self.get_event_queryset())]
+	
 	# Basic QuerySet fetchers.
 	def get_event_queryset(self):
 		return self.calendar.events.all()
 	
-	def get_timespan_queryset(self, year, month=None, day=None):
-		qs = self.get_event_queryset()
-		# See python documentation for the min/max values.
-		if year and month and day:
-			year, month, day = int(year), int(month), int(day)
-			start_datetime = datetime.datetime(year, month, day, 0, 0)
-			end_datetime = datetime.datetime(year, month, day, 23, 59)
-		elif year and month:
-			year, month = int(year), int(month)
-			start_datetime = datetime.datetime(year, month, 1, 0, 0)
-			end_datetime = datetime.datetime(year, month, calendar.monthrange(year, month)[1], 23, 59)
+	def get_timespan(self, year, month=None, day=None):
+		"""Returns the (``start``, ``end``) datetimes of the given year, month or day. ``end`` is the first moment after the timespan."""
+		year = int(year)
+		if month and day:
+			start = datetime.datetime(year, int(month), int(day))
+			end = start + datetime.timedelta(days=1)
+		elif month:
+			start = datetime.datetime(year, int(month), 1)
+			end = start + datetime.timedelta(days=calendar.monthrange(year, int(month))[1])
 		else:
-			year = int(year)
-			start_datetime = datetime.datetime(year, 1, 1, 0, 0)
-			end_datetime = datetime.datetime(year, 12, 31, 23, 59)
-		
-		return qs.exclude(end_date__lt=start_datetime, end_time__lt=start_datetime).exclude(start_date__gt=end_datetime, start_time__gt=end_datetime, start_time__isnull=False).exclude(start_time__isnull=True, start_date__gt=end_datetime)
+			start = datetime.datetime(year, 1, 1)
+			end = datetime.datetime(year + 1, 1, 1)
+		return start, end
+	
+	def get_timespan_queryset(self, year, month=None, day=None):
+		"""Returns the events from :meth:`get_event_queryset` with occurrences in the given year, month or day. A recurring event is returned once, however often it occurs, and not at all if none of its occurrences fall in the timespan."""
+		return self.get_event_queryset().occurring(*self.get_timespan(year, month, day))
+	
+	def get_timespan_occurrences(self, year, month=None, day=None):
+		"""Returns a list of the :class:`.Occurrence`\ s of the events from :meth:`get_timespan_queryset` which overlap the given year, month or day, in order. Recurring events are only expanded within the timespan."""
+		start, end = self.get_timespan(year, month, day)
+		occurrences = []
+		for event in self.get_event_queryset().overlapping(start, end):
+			occurrences.extend(event.get_occurrences(start, end))
+		occurrences.sort(key=lambda occurrence: occurrence.start_datetime)
+		return occurrences
 	
 	def get_tag_queryset(self):
-		return Tag.objects.filter(events__calendars=self.calendar).distinct()
+		"""Returns a :class:`QuerySet` of the :class:`.Tag`\ s used by the :attr:`calendar`'s events, each annotated with the number of those events which use it as ``count``."""
+		return Tag.objects.filter(events__calendars=self.calendar).annotate(count=models.Count('events', distinct=True))
 	
 	def get_location_querysets(self):
-		# Potential bottleneck?
-		location_map = {}
-		locations = Event.objects.values_list('location_content_type', 'location_pk')
-		
-		for ct, pk in locations:
-			location_map.setdefault(ct, []).append(pk)
-		
-		location_cts = ContentType.objects.in_bulk(location_map.keys())
+		"""Returns a dictionary mapping location :class:`ContentType`\ s to :class:`QuerySet`\ s of the locations of the :attr:`calendar`'s events, as found by :meth:`Calendar.get_location_pks`."""
 		location_querysets = {}
-		
-		for ct_pk, pks in location_map.items():
-			ct = location_cts[ct_pk]
+		for ct_pk, pks in self.calendar.get_location_pks().items():
+			ct = ContentType.objects.get_for_id(ct_pk)
 			location_querysets[ct] = ct.model_class()._default_manager.filter(pk__in=pks)
-		
 		return location_querysets
 	
 	def get_owner_queryset(self):
@@ -293,7 +418,8 @@ class CalendarView(FeedView):
 		context.update({
 			'year': year,
 			'month': month,
-			'day': day
+			'day': day,
+			'occurrences': lambda: self.get_timespan_occurrences(year, month, day)
 		})
 		return self.get_timespan_queryset(year, month, day), context
 	
@@ -323,9 +449,7 @@ class CalendarView(FeedView):
 			if slug and slug not in found_slugs:
 				raise Http404
 
-		events = self.get_event_queryset()
-		for tag in tags:
-			events = events.filter(tags=tag)
+		events = filter_by_all(self.get_event_queryset(), 'tags', tags)
 		
 		context = extra_context or {}
 		context.update({'tags': tags})
@@ -363,7 +487,7 @@ class CalendarView(FeedView):
 	
 	# Archive Views.
 	def tag_archive_view(self, request, extra_context=None):
-		tags = self.get_tag_queryset()
+		tags = get_tag_list(self.get_tag_queryset(), self.calendar)
 		context = self.get_context()
 		context.update(extra_context or {})
 		context.update({
@@ -393,13 +517,7 @@ class CalendarView(FeedView):
 	# Process page items
 	def process_page_items(self, request, items):
 		if self.events_per_page:
-			page_num = request.GET.get('page', 1)
-			paginator, paginated_page, items = paginate(items, self.events_per_page, page_num)
-			item_context = {
-				'paginator': paginator,
-				'paginated_page': paginated_page,
-				self.item_context_var: items
-			}
+			items, item_context = self.paginate_items(request, items, self.events_per_page)
 		else:
 			item_context = {
 				self.item_context_var: items
@@ -446,7 +564,7 @@ class CalendarView(FeedView):
 		return item.created
 	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
+		return [tag.name for tag in get_prefetched(item, 'tags')]
 	
 	def item_extra_kwargs(self, item):
 		return {
@@ -455,6 +573,7 @@ class CalendarView(FeedView):
 			'last_modified': item.last_modified,
 			# Is forcing unicode enough, or should we look for a "custom method"?
 			'location': force_unicode(item.location),
+			'rrule': item.get_rrule(),
 		}
 	
 	def __unicode__(self):
@@ -462,4 +581,29 @@ class CalendarView(FeedView):
 
 field = CalendarView._meta.get_field('feed_type')
 field._choices += ((ICALENDAR, 'iCalendar'),)
-field.default = ICALENDAR
\ No newline at end of file
+field.default = ICALENDAR
+
+
+def clear_calendar_location_cache(sender, instance, **kwargs):
+	if isinstance(instance, Calendar):
+		calendar_pks = [instance.pk]
+	else:
+		calendar_pks = instance.calendars.values_list('pk', flat=True)
+	cache.delete_many([CALENDAR_LOCATIONS_CACHE_KEY % pk for pk in calendar_pks])
+
+
+def clear_calendar_location_cache_for_events(sender, instance, action, reverse, pk_set, **kwargs):
+	if action in ('post_add', 'post_remove') and reverse:
+		cache.delete_many([CALENDAR_LOCATIONS_CACHE_KEY % pk for pk in pk_set])
+	elif action in ('post_add', 'post_remove', 'pre_clear'):
+		clear_calendar_location_cache(sender, instance)
+
+
+models.signals.post_save.connect(clear_calendar_location_cache, sender=Event)
+models.signals.pre_delete.connect(clear_calendar_location_cache, sender=Event)
+models.signals.m2m_changed.connect(clear_calendar_location_cache_for_events, sender=Calendar.events.through)
+
+
+register_feed_model(Event, 'calendars')
+register_feed_model(Calendar, 'self')
+register_feed_model(CalendarView, 'calendar')
\ No newline at end of file
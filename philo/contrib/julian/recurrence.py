@@ -0,0 +1,198 @@
+"""
+Expansion of the simple recurrence rules which can be attached to :class:`.Event`\ s. A rule repeats an event every ``interval`` days, weeks, months or years, optionally limited to ``count`` occurrences or to occurrences starting on or before an ``until`` date - a subset of the ``RRULE`` property of :rfc:`5545#section-3.3.10`. As in :rfc:`5545`, monthly and yearly occurrences which would fall on a date that doesn't exist (such as February 30th) are skipped and not counted.
+
+"""
+import calendar
+import datetime
+from fractions import gcd
+
+
+DAILY = 'DAILY'
+WEEKLY = 'WEEKLY'
+MONTHLY = 'MONTHLY'
+YEARLY = 'YEARLY'
+FREQUENCY_CHOICES = (
+	(DAILY, 'Daily'),
+	(WEEKLY, 'Weekly'),
+	(MONTHLY, 'Monthly'),
+	(YEARLY, 'Yearly'),
+)
+
+
+def _total_seconds(delta):
+	return delta.days * 86400 + delta.seconds
+
+
+def _get_step_days(frequency, interval):
+	return interval * (frequency == WEEKLY and 7 or 1)
+
+
+def _get_max_n(start, frequency, interval):
+	# The last repetition which starts before the end of the largest year a date can have.
+	if frequency in (DAILY, WEEKLY):
+		return (datetime.date.max - start.date()).days // _get_step_days(frequency, interval)
+	if frequency == MONTHLY:
+		return ((datetime.MAXYEAR - start.year) * 12 + 12 - start.month) // interval
+	return (datetime.MAXYEAR - start.year) // interval
+
+
+def _is_valid(start, frequency, interval, n):
+	# Whether the nth repetition falls on a date which exists, worked out without building it.
+	if frequency == MONTHLY:
+		months = start.month - 1 + n * interval
+		year, month = start.year + months // 12, months % 12 + 1
+	elif frequency == YEARLY:
+		year, month = start.year + n * interval, start.month
+	else:
+		return True
+	if start.day <= 28:
+		return True
+	return start.day <= (month == 2 and (calendar.isleap(year) and 29 or 28) or calendar.mdays[month])
+
+
+def _get_nth_valid(start, frequency, interval, k):
+	# The n of the kth (counting from 0) repetition which isn't skipped. Which repetitions are
+	# skipped repeats every 400 years, so only one such period ever needs to be checked.
+	if frequency in (DAILY, WEEKLY) or start.day <= 28:
+		return k
+	period = frequency == MONTHLY and 4800 or 400
+	period = period // gcd(interval, period)
+	valid = [n for n in xrange(period) if _is_valid(start, frequency, interval, n)]
+	full, rest = divmod(k, len(valid))
+	return full * period + valid[rest]
+
+
+def get_nth_start(start, frequency, interval, n):
+	"""Returns the start of the ``n``\ th repetition of a rule beginning at ``start``, or ``None`` if it would fall on a date which doesn't exist."""
+	if frequency == DAILY:
+		return start + datetime.timedelta(days=n * interval)
+	if frequency == WEEKLY:
+		return start + datetime.timedelta(weeks=n * interval)
+	try:
+		if frequency == MONTHLY:
+			months = start.month - 1 + n * interval
+			return start.replace(year=start.year + months // 12, month=months % 12 + 1)
+		if frequency == YEARLY:
+			return start.replace(year=start.year + n * interval)
+	except ValueError:
+		return None
+	raise ValueError("Unknown recurrence frequency: %s" % frequency)
+
+
+def iter_starts(start, frequency, interval=1, count=None, until=None, after=None):
+	"""
+	Yields the start :class:`datetime`\ s of the occurrences of a rule in order, beginning with ``start`` itself. Rules without a ``count`` or ``until`` repeat until the largest year a :class:`datetime` can have, so callers should stop iterating once they have passed the window they are interested in.
+	
+	:param after: If given, occurrences which start before this :class:`datetime` may be skipped without being generated. Daily and weekly rules jump straight to it.
+	
+	"""
+	interval = interval or 1
+	n = produced = 0
+	if after is not None and after > start and frequency in (DAILY, WEEKLY):
+		step = _total_seconds(datetime.timedelta(days=_get_step_days(frequency, interval)))
+		# Every daily and weekly repetition is valid, so skipped ones still count.
+		n = produced = _total_seconds(after - start) // step
+	
+	max_n = _get_max_n(start, frequency, interval)
+	while n <= max_n:
+		candidate = get_nth_start(start, frequency, interval, n)
+		n += 1
+		if candidate is None:
+			continue
+		if until is not None and candidate.date() > until:
+			return
+		if count is not None and produced >= count:
+			return
+		produced += 1
+		yield candidate
+
+
+def get_last_start(start, frequency, interval=1, count=None, until=None):
+	"""Returns the start of the last occurrence of a rule which is limited by ``count``, ``until`` or both, or ``None`` if the limits leave no occurrences. The occurrences in between are never generated."""
+	interval = interval or 1
+	last = _get_max_n(start, frequency, interval)
+	
+	if count is not None:
+		if count < 1:
+			return None
+		last = min(last, _get_nth_valid(start, frequency, interval, count - 1))
+	
+	if until is not None:
+		if until < start.date():
+			return None
+		if frequency in (DAILY, WEEKLY):
+			n = (until - start.date()).days // _get_step_days(frequency, interval)
+		elif frequency == MONTHLY:
+			n = ((until.year - start.year) * 12 + until.month - start.month) // interval
+		else:
+			n = (until.year - start.year) // interval
+		last = min(last, n)
+	
+	# Step back over a repetition which starts later on the until date's month or year, and over skipped dates.
+	while last >= 0:
+		if _is_valid(start, frequency, interval, last):
+			candidate = get_nth_start(start, frequency, interval, last)
+			if until is None or candidate.date() <= until:
+				return candidate
+		last -= 1
+	return None
+
+
+def format_rrule(start, frequency, interval=1, count=None, until=None, all_day=False):
+	"""Returns the value of an :rfc:`5545` ``RRULE`` property for a rule. ``UNTIL`` is written as a DATE for all-day events and as the last moment of the ``until`` date otherwise, since :rfc:`5545` requires it to have the same type as ``DTSTART``."""
+	parts = ['FREQ=%s' % frequency]
+	if interval and interval > 1:
+		parts.append('INTERVAL=%d' % interval)
+	if count is not None:
+		parts.append('COUNT=%d' % count)
+	if until is not None:
+		if all_day:
+			parts.append('UNTIL=%s' % until.strftime('%Y%m%d'))
+		else:
+			parts.append('UNTIL=%sT235959' % until.strftime('%Y%m%d'))
+	return ';'.join(parts)
+
+
+class Occurrence(object):
+	"""
+	A single occurrence of an :class:`.Event`, which behaves like the :class:`.Event` itself except that its dates and times are those of the occurrence.
+	
+	"""
+	def __init__(self, event, start_datetime, end_datetime):
+		self.event = event
+		self.start_datetime = start_datetime
+		self.end_datetime = end_datetime
+	
+	def __getattr__(self, name):
+		if name == 'event':
+			raise AttributeError(name)
+		return getattr(self.event, name)
+	
+	@property
+	def start_date(self):
+		return self.start_datetime.date()
+	
+	@property
+	def end_date(self):
+		if self.event.end_time is None:
+			# All-day occurrences end at midnight after their last day.
+			return (self.end_datetime - datetime.timedelta(days=1)).date()
+		return self.end_datetime.date()
+	
+	def get_start(self):
+		return self.event.start_time is None and self.start_date or self.start_datetime
+	
+	def get_end(self):
+		return self.event.end_time is None and self.end_date or self.end_datetime
+	
+	def __eq__(self, other):
+		return isinstance(other, Occurrence) and (self.event, self.start_datetime) == (other.event, other.start_datetime)
+	
+	def __ne__(self, other):
+		return not self == other
+	
+	def __unicode__(self):
+		return u"%s (%s)" % (self.event, self.get_start())
+	
+	def __repr__(self):
+		return "<Occurrence: %s>" % unicode(self).encode('utf-8')
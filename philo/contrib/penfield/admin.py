@@ -56,7 +56,7 @@ class BlogViewAdmin(EntityAdmin):
 			'fields': ('entry_archive_page', 'tag_archive_page')
 		}),
 		('General Settings', {
-			'fields': ('entry_permalink_style', 'entry_permalink_base', 'tag_permalink_base', 'entries_per_page'),
+			'fields': ('entry_permalink_style', 'entry_permalink_base', 'tag_permalink_base', 'entries_per_page', 'cursor_pagination'),
 			'classes': COLLAPSE_CLASSES
 		}),
 		('Feed Settings', {
@@ -128,6 +128,10 @@ class NewsletterViewAdmin(EntityAdmin):
 			'fields': ('article_permalink_style', 'article_permalink_base', 'issue_permalink_base'),
 			'classes': COLLAPSE_CLASSES
 		}),
+		('General Settings', {
+			'fields': ('articles_per_page', 'cursor_pagination'),
+			'classes': COLLAPSE_CLASSES
+		}),
 		('Feeds', {
 			'fields': ( 'feeds_enabled', 'feed_suffix', 'feed_type', 'feed_length', 'item_title_template', 'item_description_template',),
 			'classes': COLLAPSE_CLASSES
@@ -0,0 +1,135 @@
+"""
+Date archive indexes for :class:`.Blog`\ s and :class:`.Newsletter`\ s. An index counts the entries or articles posted on each day, from which the years, months and days of an archive can be listed without querying the database again. Each index is built with a single query which counts the items per day in the database. If :setting:`PHILO_ARCHIVE_CACHE_TIMEOUT` is set, indexes are kept in django's cache for that many seconds, under a key which includes a generation counter that is incremented whenever an entry or article is saved or deleted.
+
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, connections
+from django.db.backends.util import typecast_timestamp
+
+
+__all__ = ('ArchiveIndex', 'get_archive_index', 'clear_archive_index', 'register_archive_model')
+
+
+ARCHIVE_CACHE_KEY = 'philo_archive:%s.%s:%s'
+ARCHIVE_GENERATION_KEY = 'philo_archive_generation:%s.%s:%s'
+KINDS = ('year', 'month', 'day')
+
+
+def truncate_date(date, kind):
+	"""Returns a :class:`datetime` for the start of the year, month or day which contains ``date``, like the values returned by :meth:`QuerySet.dates`."""
+	return datetime(date.year, kind == 'year' and 1 or date.month, kind == 'day' and date.day or 1)
+
+
+class ArchiveIndex(object):
+	"""Counts the items posted on each day."""
+	def __init__(self, counts=None):
+		#: A dictionary mapping :class:`datetime`\ s for days to the number of items posted on them.
+		self.counts = counts or {}
+	
+	def add(self, date, delta=1):
+		"""Adds ``delta`` items posted at ``date`` to the index."""
+		day = truncate_date(date, 'day')
+		count = self.counts.get(day, 0) + delta
+		if count > 0:
+			self.counts[day] = count
+		else:
+			self.counts.pop(day, None)
+	
+	def get_counts(self, kind):
+		"""Returns a list of (``date``, ``count``) tuples for each year, month or day - depending on ``kind`` - on which items were posted, newest first."""
+		counts = {}
+		for day, count in self.counts.iteritems():
+			date = truncate_date(day, kind)
+			counts[date] = counts.get(date, 0) + count
+		return sorted(counts.items(), reverse=True)
+	
+	def get_dates(self, kind):
+		"""Returns a list of :class:`datetime`\ s for each year, month or day - depending on ``kind`` - on which items were posted, newest first."""
+		return [date for date, count in self.get_counts(kind)]
+
+
+def get_generation_key(model, parent_pk):
+	return ARCHIVE_GENERATION_KEY % (model._meta.app_label, model._meta.object_name.lower(), parent_pk)
+
+
+def get_archive_key(model, parent_pk):
+	generation = cache.get(get_generation_key(model, parent_pk), 0)
+	return ARCHIVE_CACHE_KEY % (model._meta.app_label, model._meta.object_name.lower(), '%s:%s' % (parent_pk, generation))
+
+
+def get_day_counts(queryset, date_field='date'):
+	"""Returns a list of (``day``, ``count``) tuples for the days on which the items in ``queryset`` were posted, counted by the database."""
+	connection = connections[queryset.db]
+	column = '%s.%s' % (connection.ops.quote_name(queryset.model._meta.db_table), connection.ops.quote_name(queryset.model._meta.get_field(date_field).column))
+	rows = queryset.order_by().extra(select={'archive_day': connection.ops.date_trunc_sql('day', column)}).values('archive_day').annotate(archive_count=models.Count('pk'))
+	
+	counts = []
+	for row in rows:
+		day = row['archive_day']
+		if isinstance(day, basestring):
+			# Some backends, such as sqlite, return the truncated date as a string.
+			day = typecast_timestamp(day)
+		counts.append((truncate_date(day, 'day'), row['archive_count']))
+	return counts
+
+
+def get_archive_index(queryset, parent_pk, date_field='date'):
+	"""Returns an :class:`ArchiveIndex` of the items in ``queryset``, which should be all the items which belong to the object with the primary key ``parent_pk``."""
+	timeout = getattr(settings, 'PHILO_ARCHIVE_CACHE_TIMEOUT', None)
+	if timeout:
+		key = get_archive_key(queryset.model, parent_pk)
+		index = cache.get(key)
+		if index is not None:
+			return index
+	
+	index = ArchiveIndex()
+	for day, count in get_day_counts(queryset, date_field):
+		index.add(day, count)
+	
+	if timeout:
+		cache.set(key, index, timeout)
+	return index
+
+
+def clear_archive_index(model, parent_pk):
+	"""Invalidates the cached :class:`ArchiveIndex` for the items of ``model`` which belong to the object with the primary key ``parent_pk``. A generation counter is incremented rather than the index being deleted, so that an index which was built from the old items can't be cached after the change."""
+	if parent_pk is None:
+		return
+	key = get_generation_key(model, parent_pk)
+	try:
+		cache.incr(key)
+	except ValueError:
+		cache.set(key, 1)
+
+
+def register_archive_model(model, parent_field, date_field='date'):
+	"""Invalidates the cached :class:`ArchiveIndex`\ es for instances of ``model`` whenever one is saved or deleted. ``parent_field`` is the name of the :class:`ForeignKey` to the object which the indexes belong to, and ``date_field`` the name of the field with the date at which instances are posted."""
+	parent_attname = model._meta.get_field(parent_field).attname
+	
+	def remember_archive_date(sender, instance, raw=False, **kwargs):
+		instance._archive_date = None
+		if not raw and instance.pk is not None and getattr(settings, 'PHILO_ARCHIVE_CACHE_TIMEOUT', None):
+			try:
+				instance._archive_date = model._default_manager.filter(pk=instance.pk).values_list(parent_attname, date_field)[0]
+			except IndexError:
+				pass
+	
+	def clear_on_save(sender, instance, raw=False, **kwargs):
+		old = getattr(instance, '_archive_date', None)
+		new = (getattr(instance, parent_attname), getattr(instance, date_field))
+		if old == new:
+			return
+		if old is not None and old[0] != new[0]:
+			clear_archive_index(model, old[0])
+		clear_archive_index(model, new[0])
+	
+	def clear_on_delete(sender, instance, **kwargs):
+		clear_archive_index(model, getattr(instance, parent_attname))
+	
+	# The receivers are closures, so they must be strongly referenced to stay connected.
+	models.signals.pre_save.connect(remember_archive_date, sender=model, weak=False)
+	models.signals.post_save.connect(clear_on_save, sender=model, weak=False)
+	models.signals.post_delete.connect(clear_on_delete, sender=model, weak=False)
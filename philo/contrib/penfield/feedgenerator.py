@@ -0,0 +1,70 @@
+from StringIO import StringIO
+
+from django.utils import feedgenerator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+
+# Written in place of the items while the rest of a streaming feed is serialized.
+ITEMS_MARKER = u'\x00philo-feed-items\x00'
+
+
+class StreamingFeedMixin(object):
+	"""
+	A mixin for :class:`django.utils.feedgenerator.SyndicationFeed` subclasses which can be serialized a few items at a time, so that the serialized feed never has to be held in memory as a whole. Only serialization is chunked: every item is added to the feed before the first chunk is written, so the items themselves - and the memory they use - still scale with the length of the feed. Subclasses must implement :meth:`write_frame` and :meth:`write_current_items`.
+	
+	"""
+	def write_frame(self, encoding):
+		"""Returns a (``head``, ``tail``) tuple of the serialized feed before and after its items."""
+		raise NotImplementedError
+	
+	def write_current_items(self, encoding):
+		"""Returns the serialized form of the items which have been added to the feed."""
+		raise NotImplementedError
+	
+	def prepare_response(self, response):
+		"""Sets any headers which the feed needs on the :class:`HttpResponse` it will be written to."""
+		pass
+	
+	def iter_write(self, encoding, chunk_size=100):
+		"""
+		Returns an iterator over the serialized feed, which serializes the feed's items ``chunk_size`` at a time. All of the items must have been added to the feed already, and are kept until the iterator is exhausted; only their serialized form is produced a chunk at a time. The header and footer are serialized before the iterator is returned.
+		
+		"""
+		head, tail = self.write_frame(encoding)
+		items = self.items
+		
+		def chunks():
+			yield head
+			try:
+				for i in range(0, len(items), chunk_size):
+					self.items = items[i:i + chunk_size]
+					yield self.write_current_items(encoding)
+			finally:
+				self.items = items
+			yield tail
+		
+		return chunks()
+
+
+class StreamingXMLFeedMixin(StreamingFeedMixin):
+	"""Implements streaming for :class:`SyndicationFeed`\ s which are serialized with a :class:`SimplerXMLGenerator` and write their items with a ``write_items`` method, such as :class:`~django.utils.feedgenerator.Atom1Feed` and :class:`~django.utils.feedgenerator.Rss201rev2Feed`."""
+	def write_frame(self, encoding):
+		self.write_items = lambda handler: handler.ignorableWhitespace(ITEMS_MARKER)
+		try:
+			head, tail = self.writeString(encoding).split(ITEMS_MARKER.encode(encoding))
+		finally:
+			del self.write_items
+		return head, tail
+	
+	def write_current_items(self, encoding):
+		s = StringIO()
+		self.write_items(SimplerXMLGenerator(s, encoding))
+		return s.getvalue()
+
+
+class Atom1Feed(StreamingXMLFeedMixin, feedgenerator.Atom1Feed):
+	pass
+
+
+class Rss201rev2Feed(StreamingXMLFeedMixin, feedgenerator.Rss201rev2Feed):
+	pass
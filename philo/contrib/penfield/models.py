@@ -4,20 +4,28 @@ from django.conf import settings
 from django.conf.urls.defaults import url, patterns, include
 from django.contrib.sites.models import Site, RequestSite
 from django.contrib.syndication.views import add_domain
+from django.core.cache import cache
 from django.db import models
-from django.http import Http404, HttpResponse
+from django.db.models.fields.related import add_lazy_relation
+from django.db.models.query import QuerySet
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.template import RequestContext, Template as DjangoTemplate
 from django.utils import feedgenerator, tzinfo
 from django.utils.datastructures import SortedDict
+from django.utils.hashcompat import md5_constructor
 from django.utils.encoding import smart_unicode, force_unicode
 from django.utils.html import escape
 
+from philo.contrib.penfield.archive import KINDS, get_archive_index, register_archive_model
 from philo.contrib.penfield.exceptions import HttpNotAcceptable
+from philo.contrib.penfield.feedgenerator import Atom1Feed, Rss201rev2Feed, StreamingFeedMixin
 from philo.contrib.penfield.middleware import http_not_acceptable
 from philo.exceptions import ViewCanNotProvideSubpath
 from philo.models import Tag, Entity, MultiView, Page, register_value_model, Template
+from philo.models.nodes import get_current_site
+from philo.models.pages import get_page_validators, get_modification_stamp
 from philo.models.fields import TemplateField
-from philo.utils import paginate
+from philo.utils import paginate, keyset_paginate, is_not_modified, set_validators, prefetch_related_objects, get_prefetched, filter_by_all
 
 try:
 	import mimeparse
@@ -25,16 +33,149 @@ except:
 	mimeparse = None
 
 
-ATOM = feedgenerator.Atom1Feed.mime_type
-RSS = feedgenerator.Rss201rev2Feed.mime_type
+ATOM = Atom1Feed.mime_type
+RSS = Rss201rev2Feed.mime_type
 FEEDS = SortedDict([
-	(ATOM, feedgenerator.Atom1Feed),
-	(RSS, feedgenerator.Rss201rev2Feed),
+	(ATOM, Atom1Feed),
+	(RSS, Rss201rev2Feed),
 ])
 FEED_CHOICES = (
 	(ATOM, "Atom"),
 	(RSS, "RSS"),
 )
+FEED_CACHE_KEY = 'philo_feed:%s'
+FEED_GENERATION_KEY = FEED_CACHE_KEY % 'generation'
+FEED_OWNER_GENERATION_KEY = FEED_CACHE_KEY % 'generation:%s.%s:%s'
+#: A dictionary mapping the models registered with :func:`register_feed_model` to their ``owner_field``.
+FEED_MODELS = {}
+TAG_CACHE_KEY = 'philo_tags:%s:%s.%s:%s'
+
+
+def get_owner_generation_key(model, pk):
+	return FEED_OWNER_GENERATION_KEY % (model._meta.app_label, model._meta.object_name.lower(), pk)
+
+
+def get_feed_generation(owner):
+	"""Returns the current generation of the feed cache for the feeds of ``owner`` - for example, a :class:`Blog` - as a tuple of the generation shared by all feeds and the generation of ``owner``'s feeds. The generation is part of the keys of ``owner``'s cached feeds and tag lists."""
+	keys = [FEED_GENERATION_KEY, get_owner_generation_key(owner.__class__, owner.pk)]
+	generations = cache.get_many(keys)
+	return tuple([generations.get(key, 0) for key in keys])
+
+
+def increment_feed_generations(keys):
+	for key in keys:
+		try:
+			cache.incr(key)
+		except ValueError:
+			cache.set(key, 1)
+
+
+def get_feed_owner_keys(instance):
+	"""Returns a list of the generation keys of the feeds which ``instance`` can appear in, according to the ``owner_field`` its model was registered with, or ``None`` if it can appear in any feed."""
+	for model, owner_field in FEED_MODELS.items():
+		if isinstance(instance, model):
+			break
+	else:
+		return []
+	
+	if owner_field is None:
+		return None
+	if owner_field == 'self':
+		return [get_owner_generation_key(model, instance.pk)]
+	
+	try:
+		field = model._meta.get_field(owner_field)
+	except models.FieldDoesNotExist:
+		field = None
+	if isinstance(field, models.ForeignKey):
+		pk = getattr(instance, field.attname)
+		return pk is not None and [get_owner_generation_key(field.rel.to, pk)] or []
+	
+	# A forward or reverse many-to-many relation.
+	related = getattr(instance, owner_field)
+	return [get_owner_generation_key(related.model, pk) for pk in related.values_list('pk', flat=True)]
+
+
+def clear_feed_cache(sender, instance, **kwargs):
+	"""Invalidates the cached feeds which ``instance`` can appear in - or all cached feeds - by incrementing their feed cache generation."""
+	keys = get_feed_owner_keys(instance)
+	if keys is None:
+		keys = [FEED_GENERATION_KEY]
+	# Include the owners the instance had before it was saved or deleted.
+	keys = set(keys) | getattr(instance, '_feed_owner_keys', set())
+	increment_feed_generations(keys)
+
+
+def remember_feed_owners_on_save(sender, instance, raw=False, **kwargs):
+	instance._feed_owner_keys = set()
+	owner_field = FEED_MODELS[sender]
+	if raw or owner_field in (None, 'self') or instance.pk is None:
+		return
+	try:
+		field = sender._meta.get_field(owner_field)
+	except models.FieldDoesNotExist:
+		return
+	# Many-to-many owners don't change when an instance is saved.
+	if isinstance(field, models.ForeignKey):
+		pks = sender._default_manager.filter(pk=instance.pk).values_list(field.attname, flat=True)
+		instance._feed_owner_keys = set([get_owner_generation_key(field.rel.to, pk) for pk in pks if pk is not None])
+
+
+def remember_feed_owners_on_delete(sender, instance, **kwargs):
+	# Many-to-many relations are gone by the time post_delete is sent.
+	instance._feed_owner_keys = set(get_feed_owner_keys(instance) or ())
+
+
+def clear_feed_cache_for_relations(sender, instance, action, model, pk_set, **kwargs):
+	if action not in ('post_add', 'post_remove', 'post_clear'):
+		return
+	if isinstance(instance, tuple(FEED_MODELS)):
+		clear_feed_cache(sender, instance)
+	if FEED_MODELS.get(model) == 'self':
+		if pk_set is None:
+			# The owners which were cleared aren't known any more.
+			increment_feed_generations([FEED_GENERATION_KEY])
+		else:
+			increment_feed_generations([get_owner_generation_key(model, pk) for pk in pk_set])
+
+
+def register_feed_model(model, owner_field=None):
+	"""
+	Registers ``model`` as one whose instances - or relationships - can change the contents of a feed, so that saving or deleting an instance, or changing its many-to-many relationships, invalidates cached feeds.
+	
+	:param owner_field: The name of the :class:`ForeignKey` or :class:`ManyToManyField` - or the accessor of the reverse many-to-many relation - from ``model`` to the objects whose feeds its instances appear in, such as a :class:`Blog`. Only the feeds of those objects are invalidated. If ``owner_field`` is ``'self'``, each instance owns its feeds; if it is ``None``, instances can appear in any feed, and all cached feeds are invalidated.
+	
+	"""
+	if model in FEED_MODELS:
+		return
+	FEED_MODELS[model] = owner_field
+	models.signals.pre_save.connect(remember_feed_owners_on_save, sender=model)
+	models.signals.post_save.connect(clear_feed_cache, sender=model)
+	models.signals.pre_delete.connect(remember_feed_owners_on_delete, sender=model)
+	models.signals.post_delete.connect(clear_feed_cache, sender=model)
+
+
+models.signals.m2m_changed.connect(clear_feed_cache_for_relations)
+# Tag names are used as feed categories, and templates can render the
+# titles and descriptions of items.
+register_feed_model(Tag)
+register_feed_model(Template)
+
+
+def get_tag_list(queryset, owner):
+	"""Returns a list of the :class:`.Tag`\ s in ``queryset``, which should be the tags used within ``owner``. If :setting:`PHILO_TAG_CACHE_TIMEOUT` is set, the list is kept in django's cache for that many seconds, or until the feeds of ``owner`` are invalidated (see :func:`register_feed_model`)."""
+	timeout = getattr(settings, 'PHILO_TAG_CACHE_TIMEOUT', None)
+	if timeout:
+		cache_key = TAG_CACHE_KEY % ('%s.%s' % get_feed_generation(owner), owner._meta.app_label, owner._meta.object_name.lower(), owner.pk)
+		tags = cache.get(cache_key)
+		if tags is not None:
+			return tags
+	
+	tags = list(queryset)
+	
+	if timeout:
+		cache.set(cache_key, tags, timeout)
+	return tags
 
 
 class FeedView(MultiView):
@@ -56,10 +197,21 @@ class FeedView(MultiView):
 	#: A :class:`ForeignKey` to a :class:`.Template` which can be used to render the description of each item in the feed.
 	item_description_template = models.ForeignKey(Template, blank=True, null=True, related_name="%(app_label)s_%(class)s_description_related")
 	
+	#: A :class:`BooleanField` - whether paginated item lists should be split with :func:`.keyset_paginate` instead of :func:`.paginate`. Pages are then linked with cursors rather than numbers, and the items are never counted. Default: ``False``.
+	cursor_pagination = models.BooleanField(default=False, help_text="Link pages of items with next and previous cursors instead of page numbers, so that the items never have to be counted.")
+	
 	#: The name of the context variable to be populated with the items managed by the :class:`FeedView`.
 	item_context_var = 'items'
 	#: The attribute on a subclass of :class:`FeedView` which will contain the main object of a feed (such as a :class:`Blog`.)
 	object_attr = 'object'
+	#: The names of related fields which the item hooks use, to be passed to :meth:`~django.db.models.query.QuerySet.select_related` when the items of a feed are fetched.
+	item_select_related = ()
+	#: The names of :class:`ManyToManyField`\ s or :class:`GenericForeignKey`\ s which the item hooks use, to be fetched in bulk with :func:`.prefetch_related_objects` when the items of a feed are fetched.
+	item_prefetch_related = ()
+	#: The number of items which are serialized at a time when a feed is streamed. This bounds the size of each chunk of the response, not the number of items held in memory.
+	item_chunk_size = 100
+	#: The field names which items are ordered by when they are paginated with :attr:`cursor_pagination`. They must uniquely identify an item.
+	item_keyset_ordering = ('-pk',)
 	
 	#: A description of the feeds served by the :class:`FeedView`. This is a required part of the :class:`django.contrib.syndication.view.Feed` API.
 	description = ""
@@ -96,13 +248,49 @@ class FeedView(MultiView):
 		)
 		return urlpatterns
 	
+	def get_validator_stamps(self):
+		"""Returns an iterable of (``last_modified``, ``count``) pairs for the items managed by the :class:`FeedView`, to be included in its conditional GET validators. By default, returns an empty tuple."""
+		return ()
+	
+	def get_validators(self, request, extra_context=None):
+		"""If :setting:`PHILO_CONDITIONAL_VIEWS` is ``True``, returns the results of :func:`.get_page_validators` for all :class:`.Page`\ s used by the :class:`FeedView`, extended with :meth:`get_validator_stamps` and with the feed cache generation of the object returned by :meth:`get_object`, which changes whenever that object or anything registered as belonging to it is saved (see :func:`register_feed_model`)."""
+		if not getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False):
+			return None, None
+		page_pks = [field.value_from_object(self) for field in self._meta.fields if isinstance(field, models.ForeignKey) and issubclass(field.rel.to, Page)]
+		stamps = list(self.get_validator_stamps())
+		stamps.append(get_feed_generation(self.get_object(request)))
+		return get_page_validators(request, [pk for pk in page_pks if pk is not None], self, stamps)
+	
+	def get_feed_validators(self, request, feed_type, generation):
+		"""
+		If :setting:`PHILO_CONDITIONAL_VIEWS` is ``True``, returns an (``etag``, ``last_modified``) tuple for a feed of type ``feed_type`` served at ``request``'s full path; otherwise, or if :meth:`get_validator_stamps` is empty, returns ``(None, None)``. The ETag is derived from :meth:`get_validator_stamps` - that is, from the newest of the items managed by the :class:`FeedView` - and from the item title and description templates, the :class:`FeedView`'s own field values and the feed cache ``generation``. Related objects such as tags and authors are only covered by the generation, so no Last-Modified date is given.
+		
+		"""
+		if not getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False):
+			return None, None
+		
+		stamps = list(self.get_validator_stamps())
+		if not stamps:
+			return None, None
+		
+		template_pks = [pk for pk in (self.item_title_template_id, self.item_description_template_id) if pk is not None]
+		if template_pks:
+			stamps.append(get_modification_stamp(Template.objects.filter(pk__in=template_pks)))
+		
+		bits = [
+			generation, stamps, feed_type.mime_type,
+			request.get_host(), request.is_secure(), request.get_full_path(),
+			self._meta.app_label, self._meta.object_name, [field.value_from_object(self) for field in self._meta.fields]
+		]
+		return md5_constructor(repr(bits)).hexdigest(), None
+	
 	def get_object(self, request, **kwargs):
 		"""By default, returns the object stored in the attribute named by :attr:`object_attr`. This can be overridden for subclasses that publish different data for different URL parameters. It is part of the :class:`django.contrib.syndication.views.Feed` API."""
 		return getattr(self, self.object_attr)
 	
 	def feed_view(self, get_items_attr, reverse_name):
 		"""
-		Returns a view function that renders a list of items as a feed.
+		Returns a view function that renders a list of items as a feed. The feed is served with the validators from :meth:`get_feed_validators`, if any, so that clients which already have the current version get a 304 response. If :setting:`PHILO_FEED_CACHE_TIMEOUT` is set, the serialized feed is also kept in django's cache for that many seconds, or until the feeds of the object returned by :meth:`get_object` are invalidated (see :func:`register_feed_model`).
 		
 		:param get_items_attr: A callable or the name of a callable on the :class:`FeedView` that will return a (items, extra_context) tuple when called with view arguments.
 		:param reverse_name: The name which can be used reverse this feed using the :class:`FeedView` as the urlconf.
@@ -113,17 +301,67 @@ class FeedView(MultiView):
 		get_items = callable(get_items_attr) and get_items_attr or getattr(self, get_items_attr)
 		
 		def inner(request, extra_context=None, *args, **kwargs):
-			obj = self.get_object(request, *args, **kwargs)
-			feed = self.get_feed(obj, request, reverse_name)
-			items, xxx = get_items(request, extra_context=extra_context, *args, **kwargs)
-			self.populate_feed(feed, items, request)
+			feed_type = self.get_feed_type(request)
+			generation = get_feed_generation(self.get_object(request, *args, **kwargs))
+			etag, last_modified = self.get_feed_validators(request, feed_type, generation)
+			if is_not_modified(request, etag, last_modified):
+				response = HttpResponseNotModified()
+				set_validators(response, etag, last_modified)
+				return response
+			
+			timeout = getattr(settings, 'PHILO_FEED_CACHE_TIMEOUT', None)
+			if timeout:
+				cache_key = FEED_CACHE_KEY % md5_constructor(repr([
+					generation, etag, feed_type.mime_type,
+					request.get_host(), request.is_secure(), request.get_full_path(),
+					self._meta.app_label, self._meta.object_name, self.pk
+				])).hexdigest()
+				content = cache.get(cache_key)
+			else:
+				content = None
+			
+			if content is not None:
+				content, headers = content
+				response = HttpResponse(content, mimetype=feed_type.mime_type)
+				for header, value in headers:
+					response[header] = value
+			else:
+				feed, items = self.build_feed(request, get_items, reverse_name, extra_context, *args, **kwargs)
+				if self.can_stream_feed(feed, items):
+					response = HttpResponse(self.stream_feed(feed, items, request), mimetype=feed.mime_type)
+					feed.prepare_response(response)
+				else:
+					self.populate_feed(feed, items, request)
+					response = HttpResponse(mimetype=feed.mime_type)
+					feed.write(response, 'utf-8')
+					if timeout:
+						headers = [(header, value) for header, value in response.items() if header.lower() != 'content-type']
+						cache.set(cache_key, (response.content, headers), timeout)
 			
-			response = HttpResponse(mimetype=feed.mime_type)
-			feed.write(response, 'utf-8')
+			set_validators(response, etag, last_modified)
 			return response
 		
 		return inner
 	
+	def build_feed(self, request, get_items, reverse_name, extra_context=None, *args, **kwargs):
+		"""Returns a (``feed``, ``items``) tuple of an unpopulated feed as returned by :meth:`get_feed` and the items returned by ``get_items``. This is called by the view function from :meth:`feed_view` whenever the feed isn't cached."""
+		obj = self.get_object(request, *args, **kwargs)
+		feed = self.get_feed(obj, request, reverse_name)
+		items, xxx = get_items(request, extra_context=extra_context, *args, **kwargs)
+		return feed, items
+	
+	def can_stream_feed(self, feed, items):
+		"""Returns ``True`` if ``feed`` should be written with :meth:`stream_feed` - that is, if :attr:`feed_length` is blank and the feed supports streaming."""
+		return self.feed_length is None and isinstance(feed, StreamingFeedMixin)
+	
+	def stream_feed(self, feed, items, request):
+		"""
+		Populates ``feed`` with all of the ``items`` and returns an iterator over the serialized feed, which serializes the items :attr:`item_chunk_size` at a time. This keeps the serialized feed out of memory, but not the items, which are all loaded before the first byte is sent. Every query - including those made by the item hooks and templates - is run before this method returns, so that none are run while the response is being sent, after the request's transaction and database connection may already have been closed.
+		
+		"""
+		self.populate_feed(feed, items, request)
+		return feed.iter_write('utf-8', self.item_chunk_size)
+	
 	def page_view(self, get_items_attr, page_attr):
 		"""
 		:param get_items_attr: A callable or the name of a callable on the :class:`FeedView` that will return a (items, extra_context) tuple when called with view arguments.
@@ -156,6 +394,23 @@ class FeedView(MultiView):
 		}
 		return items, item_context
 	
+	def paginate_items(self, request, items, per_page):
+		"""
+		Splits ``items`` into pages of ``per_page`` items for :meth:`process_page_items`, and returns the items on the requested page along with a context containing them as :attr:`item_context_var`, as well as ``paginator`` and ``paginated_page``. Normally the page is chosen by number with the ``page`` GET parameter. If :attr:`cursor_pagination` is set and ``items`` is a :class:`QuerySet`, it is chosen with the ``cursor`` GET parameter instead, and ``paginated_page`` is a :class:`.KeysetPage`; ``paginator`` is then ``None``.
+		
+		"""
+		if self.cursor_pagination and isinstance(items, QuerySet):
+			paginator = None
+			paginated_page, items = keyset_paginate(items, per_page, self.item_keyset_ordering, request.GET.get('cursor'))
+		else:
+			paginator, paginated_page, items = paginate(items, per_page, request.GET.get('page', 1))
+		item_context = {
+			'paginator': paginator,
+			'paginated_page': paginated_page,
+			self.item_context_var: items
+		}
+		return items, item_context
+	
 	def get_feed_type(self, request):
 		"""
 		Intelligently chooses a feed type for a given request. Tries to return :attr:`feed_type`, but if the Accept header does not include that mimetype, tries to return the best match from the feed types that are offered by the :class:`FeedView`. If none of the offered feed types are accepted by the :class:`HttpRequest`, then this method will raise :exc:`philo.contrib.penfield.exceptions.HttpNotAcceptable`.
@@ -185,7 +440,7 @@ class FeedView(MultiView):
 		
 		"""
 		try:
-			current_site = Site.objects.get_current()
+			current_site = get_current_site(request)
 		except Site.DoesNotExist:
 			current_site = RequestSite(request)
 		
@@ -215,8 +470,22 @@ class FeedView(MultiView):
 		)
 		return feed
 	
+	def get_feed_items(self, items):
+		"""Returns a list of at most :attr:`feed_length` of the ``items``, fetched with :attr:`item_select_related` and :attr:`item_prefetch_related` so that the item hooks don't need a query per item."""
+		if isinstance(items, QuerySet) and self.item_select_related:
+			items = items.select_related(*self.item_select_related)
+		if self.feed_length is not None:
+			items = items[:self.feed_length]
+		return prefetch_related_objects(list(items), *self.item_prefetch_related)
+	
 	def populate_feed(self, feed, items, request):
 		"""Populates a :class:`django.utils.feedgenerator.DefaultFeed` instance as is returned by :meth:`get_feed` with the passed-in ``items``."""
+		add_item = self.get_item_adder(feed, request)
+		for item in self.get_feed_items(items):
+			add_item(item)
+	
+	def get_item_adder(self, feed, request):
+		"""Returns a function which adds a single item to ``feed``. Everything which is the same for all items, such as the item templates and the base URL of ``request.node``, is prepared only once."""
 		if self.item_title_template:
 			title_template = DjangoTemplate(self.item_title_template.code)
 		else:
@@ -226,16 +495,13 @@ class FeedView(MultiView):
 		else:
 			description_template = None
 		
-		node = request.node
+		construct_url = request.node.get_url_constructor(request=request, with_domain=True, secure=request.is_secure())
 		try:
-			current_site = Site.objects.get_current()
+			current_site = get_current_site(request)
 		except Site.DoesNotExist:
 			current_site = RequestSite(request)
 		
-		if self.feed_length is not None:
-			items = items[:self.feed_length]
-		
-		for item in items:
+		def add_item(item):
 			if title_template is not None:
 				title = title_template.render(RequestContext(request, {'obj': item}))
 			else:
@@ -245,7 +511,7 @@ class FeedView(MultiView):
 			else:
 				description = self.__get_dynamic_attr('item_description', item)
 			
-			link = node.construct_url(self.reverse(obj=item), with_domain=True, request=request, secure=request.is_secure())
+			link = construct_url(self.reverse(obj=item))
 			
 			enc = None
 			enc_url = self.__get_dynamic_attr('item_enclosure_url', item)
@@ -285,6 +551,7 @@ class FeedView(MultiView):
 				item_copyright = self.__get_dynamic_attr('item_copyright', item),
 				**self.item_extra_kwargs(item)
 			)
+		return add_item
 	
 	def __get_dynamic_attr(self, attname, obj, default=None):
 		try:
@@ -337,17 +604,24 @@ class Blog(Entity):
 	
 	@property
 	def entry_tags(self):
-		"""Returns a :class:`QuerySet` of :class:`.Tag`\ s that are used on any entries in this blog."""
-		return Tag.objects.filter(blogentries__blog=self).distinct()
+		"""Returns a :class:`QuerySet` of :class:`.Tag`\ s that are used on any entries in this blog. Each :class:`.Tag` is annotated with the number of entries in this blog which use it as ``count``."""
+		return Tag.objects.filter(blogentries__blog=self).annotate(count=models.Count('blogentries', distinct=True))
 	
 	@property
 	def entry_dates(self):
-		"""Returns a dictionary of date :class:`QuerySet`\ s for years, months, and days for which there are entries."""
-		dates = {'year': self.entries.dates('date', 'year', order='DESC'), 'month': self.entries.dates('date', 'month', order='DESC'), 'day': self.entries.dates('date', 'day', order='DESC')}
-		return dates
+		"""Returns a dictionary of lists of :class:`datetime`\ s for the years, months, and days for which there are entries, newest first."""
+		index = get_archive_index(self.entries.all(), self.pk)
+		return dict([(kind, index.get_dates(kind)) for kind in KINDS])
+	
+	@property
+	def entry_date_counts(self):
+		"""Like :attr:`entry_dates`, but each list contains (``date``, ``count``) tuples with the number of entries posted in that year, month or day."""
+		index = get_archive_index(self.entries.all(), self.pk)
+		return dict([(kind, index.get_counts(kind)) for kind in KINDS])
 
 
 register_value_model(Blog)
+register_feed_model(Blog, 'self')
 
 
 class BlogEntry(Entity):
@@ -376,6 +650,9 @@ class BlogEntry(Entity):
 	#: :class:`.Tag`\ s for this :class:`BlogEntry`.
 	tags = models.ManyToManyField(Tag, related_name='blogentries', blank=True, null=True)
 	
+	#: The time at which the :class:`BlogEntry` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
+	
 	def save(self, *args, **kwargs):
 		if self.date is None:
 			self.date = datetime.now()
@@ -391,6 +668,10 @@ class BlogEntry(Entity):
 
 
 register_value_model(BlogEntry)
+register_feed_model(BlogEntry, 'blog')
+# Authors' names are shown in feeds. The person model may not be loaded yet.
+add_lazy_relation(BlogEntry, None, getattr(settings, 'PHILO_PERSON_MODULE', 'auth.User'), lambda field, model, cls: register_feed_model(model))
+register_archive_model(BlogEntry, 'blog')
 
 
 class BlogView(FeedView):
@@ -438,13 +719,16 @@ class BlogView(FeedView):
 	
 	item_context_var = 'entries'
 	object_attr = 'blog'
+	item_select_related = ('author',)
+	item_prefetch_related = ('tags',)
+	item_keyset_ordering = ('-date', '-pk')
 	
 	def __unicode__(self):
 		return u'BlogView for %s' % self.blog.title
 	
 	def get_reverse_params(self, obj):
 		if isinstance(obj, BlogEntry):
-			if obj.blog == self.blog:
+			if obj.blog_id == self.blog_id:
 				kwargs = {'slug': obj.slug}
 				if self.entry_permalink_style in 'DMY':
 					kwargs.update({'year': str(obj.date.year).zfill(4)})
@@ -515,6 +799,9 @@ class BlogView(FeedView):
 		"""Returns the default :class:`QuerySet` of :class:`BlogEntry` instances for the :class:`BlogView`."""
 		return self.blog.entries.all()
 	
+	def get_validator_stamps(self):
+		return [get_modification_stamp(self.get_entry_queryset())]
+	
 	def get_tag_queryset(self):
 		"""Returns the default :class:`QuerySet` of :class:`.Tag`\ s for the :class:`BlogView`'s :meth:`get_entries_by_tag` and :meth:`tag_archive_view`."""
 		return self.blog.entry_tags
@@ -553,9 +840,7 @@ class BlogView(FeedView):
 			if slug and slug not in found_slugs:
 				raise Http404
 
-		entries = self.get_entry_queryset()
-		for tag in tags:
-			entries = entries.filter(tags=tag)
+		entries = filter_by_all(self.get_entry_queryset(), 'tags', tags)
 		
 		context = extra_context or {}
 		context.update({'tags': tags})
@@ -581,50 +866,35 @@ class BlogView(FeedView):
 		return self.entry_page.render_to_response(request, extra_context=context)
 	
 	def tag_archive_view(self, request, extra_context=None):
-		"""Renders :attr:`tag_archive_page` with the result of :meth:`get_tag_queryset` added to the context."""
+		"""Renders :attr:`tag_archive_page` with a list of the :class:`.Tag`\ s from :meth:`get_tag_queryset` - as returned by :func:`get_tag_list` - added to the context."""
 		if not self.tag_archive_page:
 			raise Http404
 		context = self.get_context()
 		context.update(extra_context or {})
 		context.update({
-			'tags': self.get_tag_queryset()
+			'tags': get_tag_list(self.get_tag_queryset(), self.blog)
 		})
 		return self.tag_archive_page.render_to_response(request, extra_context=context)
 	
-	def feed_view(self, get_items_attr, reverse_name):
-		"""Overrides :meth:`FeedView.feed_view` to add :class:`.Tag`\ s to the feed as categories."""
-		get_items = callable(get_items_attr) and get_items_attr or getattr(self, get_items_attr)
+	def build_feed(self, request, get_items, reverse_name, extra_context=None, *args, **kwargs):
+		"""Overrides :meth:`FeedView.build_feed` to add :class:`.Tag`\ s to the feed as categories."""
+		obj = self.get_object(request, *args, **kwargs)
+		feed = self.get_feed(obj, request, reverse_name)
+		items, extra_context = get_items(request, extra_context=extra_context, *args, **kwargs)
 		
-		def inner(request, extra_context=None, *args, **kwargs):
-			obj = self.get_object(request, *args, **kwargs)
-			feed = self.get_feed(obj, request, reverse_name)
-			items, extra_context = get_items(request, extra_context=extra_context, *args, **kwargs)
-			self.populate_feed(feed, items, request)
-			
-			if 'tags' in extra_context:
-				tags = extra_context['tags']
-				feed.feed['link'] = request.node.construct_url(self.reverse(obj=tags), with_domain=True, request=request, secure=request.is_secure())
-			else:
-				tags = obj.entry_tags
-			
-			feed.feed['categories'] = [tag.name for tag in tags]
-			
-			response = HttpResponse(mimetype=feed.mime_type)
-			feed.write(response, 'utf-8')
-			return response
+		if 'tags' in extra_context:
+			tags = extra_context['tags']
+			feed.feed['link'] = request.node.construct_url(self.reverse(obj=tags), with_domain=True, request=request, secure=request.is_secure())
+		else:
+			tags = obj.entry_tags
 		
-		return inner
+		feed.feed['categories'] = [tag.name for tag in tags]
+		return feed, items
 	
 	def process_page_items(self, request, items):
 		"""Overrides :meth:`FeedView.process_page_items` to add pagination."""
 		if self.entries_per_page:
-			page_num = request.GET.get('page', 1)
-			paginator, paginated_page, items = paginate(items, self.entries_per_page, page_num)
-			item_context = {
-				'paginator': paginator,
-				'paginated_page': paginated_page,
-				self.item_context_var: items
-			}
+			items, item_context = self.paginate_items(request, items, self.entries_per_page)
 		else:
 			item_context = {
 				self.item_context_var: items
@@ -647,7 +917,10 @@ class BlogView(FeedView):
 		return item.date
 	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
+		return [tag.name for tag in get_prefetched(item, 'tags')]
+
+
+register_feed_model(BlogView, 'blog')
 
 
 class Newsletter(Entity):
@@ -659,9 +932,22 @@ class Newsletter(Entity):
 	
 	def __unicode__(self):
 		return self.title
+	
+	@property
+	def article_dates(self):
+		"""Returns a dictionary of lists of :class:`datetime`\ s for the years, months, and days for which there are articles, newest first."""
+		index = get_archive_index(self.articles.all(), self.pk)
+		return dict([(kind, index.get_dates(kind)) for kind in KINDS])
+	
+	@property
+	def article_date_counts(self):
+		"""Like :attr:`article_dates`, but each list contains (``date``, ``count``) tuples with the number of articles published in that year, month or day."""
+		index = get_archive_index(self.articles.all(), self.pk)
+		return dict([(kind, index.get_counts(kind)) for kind in KINDS])
 
 
 register_value_model(Newsletter)
+register_feed_model(Newsletter, 'self')
 
 
 class NewsletterArticle(Entity):
@@ -682,6 +968,8 @@ class NewsletterArticle(Entity):
 	full_text = TemplateField(db_index=True)
 	#: A :class:`ManyToManyField` to :class:`.Tag`\ s for the :class:`NewsletterArticle`.
 	tags = models.ManyToManyField(Tag, related_name='newsletterarticles', blank=True, null=True)
+	#: The time at which the :class:`NewsletterArticle` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	def save(self, *args, **kwargs):
 		if self.date is None:
@@ -698,6 +986,8 @@ class NewsletterArticle(Entity):
 
 
 register_value_model(NewsletterArticle)
+register_feed_model(NewsletterArticle, 'newsletter')
+register_archive_model(NewsletterArticle, 'newsletter')
 
 
 class NewsletterIssue(Entity):
@@ -722,6 +1012,7 @@ class NewsletterIssue(Entity):
 
 
 register_value_model(NewsletterIssue)
+register_feed_model(NewsletterIssue, 'newsletter')
 
 
 class NewsletterView(FeedView):
@@ -758,16 +1049,20 @@ class NewsletterView(FeedView):
 	article_permalink_base = models.CharField(max_length=255, blank=False, default='articles')
 	#: This will be used as the base subpath for issue detail pages and the issue archive page.
 	issue_permalink_base = models.CharField(max_length=255, blank=False, default='issues')
+	#: This number will be passed directly into pagination for :class:`NewsletterArticle` list pages. Pagination will be disabled if this is left blank.
+	articles_per_page = models.PositiveIntegerField(blank=True, null=True)
 	
 	item_context_var = 'articles'
 	object_attr = 'newsletter'
+	item_prefetch_related = ('tags', 'authors')
+	item_keyset_ordering = ('-date', '-pk')
 	
 	def __unicode__(self):
 		return "NewsletterView for %s" % self.newsletter.__unicode__()
 	
 	def get_reverse_params(self, obj):
 		if isinstance(obj, NewsletterArticle):
-			if obj.newsletter == self.newsletter:
+			if obj.newsletter_id == self.newsletter_id:
 				kwargs = {'slug': obj.slug}
 				if self.article_permalink_style in 'DMY':
 					kwargs.update({'year': str(obj.date.year).zfill(4)})
@@ -834,6 +1129,9 @@ class NewsletterView(FeedView):
 		"""Returns the default :class:`QuerySet` of :class:`NewsletterArticle` instances for the :class:`NewsletterView`."""
 		return self.newsletter.articles.all()
 	
+	def get_validator_stamps(self):
+		return [get_modification_stamp(self.get_article_queryset())]
+	
 	def get_issue_queryset(self):
 		"""Returns the default :class:`QuerySet` of :class:`NewsletterIssue` instances for the :class:`NewsletterView`."""
 		return self.newsletter.issues.all()
@@ -890,6 +1188,16 @@ class NewsletterView(FeedView):
 		})
 		return self.issue_archive_page.render_to_response(request, extra_context=context)
 	
+	def process_page_items(self, request, items):
+		"""Overrides :meth:`FeedView.process_page_items` to add pagination."""
+		if self.articles_per_page:
+			items, item_context = self.paginate_items(request, items, self.articles_per_page)
+		else:
+			item_context = {
+				self.item_context_var: items
+			}
+		return items, item_context
+	
 	def title(self, obj):
 		return obj.title
 	
@@ -900,7 +1208,7 @@ class NewsletterView(FeedView):
 		return item.full_text
 	
 	def item_author_name(self, item):
-		authors = list(item.authors.all())
+		authors = get_prefetched(item, 'authors')
 		if len(authors) > 1:
 			return "%s and %s" % (", ".join([author.get_full_name() for author in authors[:-1]]), authors[-1].get_full_name())
 		elif authors:
@@ -912,4 +1220,7 @@ class NewsletterView(FeedView):
 		return item.date
 	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
\ No newline at end of file
+		return [tag.name for tag in get_prefetched(item, 'tags')]
+
+
+register_feed_model(NewsletterView, 'newsletter')
@@ -0,0 +1,209 @@
+"""
+Backends for the navigation cache maintained by :class:`.NavigationManager`. The backend is chosen with the :setting:`PHILO_NAVIGATION_CACHE_BACKEND` setting, which should be the import path of a :class:`BaseNavigationCache` subclass. The default is :class:`LocalNavigationCache`.
+
+"""
+import itertools
+import threading
+
+from django.conf import settings
+from django.core.cache import cache, get_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+
+__all__ = ('BaseNavigationCache', 'LocalNavigationCache', 'SharedNavigationCache', 'get_navigation_cache')
+
+
+class BaseNavigationCache(object):
+	"""
+	Stores navigation caches - dictionaries mapping navigation keys to cached navigation structures - for :class:`.Node`\ s. Each instance is bound to a single database alias.
+	
+	"""
+	def __init__(self, db):
+		self.db = db
+	
+	def get(self, node):
+		"""Returns the cached navigation for the :class:`.Node`, or ``None`` if it is not cached."""
+		raise NotImplementedError
+	
+	def set(self, node, value):
+		"""Stores ``value`` as the cached navigation for the :class:`.Node`."""
+		raise NotImplementedError
+	
+	def delete(self, node):
+		"""Invalidates the cached navigation for the :class:`.Node` and all its descendants."""
+		raise NotImplementedError
+	
+	def clear(self):
+		"""Invalidates all cached navigation."""
+		raise NotImplementedError
+	
+	def get_many(self, pks, tree_id):
+		"""Returns a dictionary mapping the primary keys of :class:`.Node`\ s in the tree ``tree_id`` to their cached navigation, leaving out :class:`.Node`\ s which aren't cached. Only primary keys are needed, so large subtrees don't have to be loaded from the database."""
+		raise NotImplementedError
+	
+	def set_many(self, mapping, tree_id):
+		"""Stores cached navigation for each :class:`.Node` in a dictionary mapping the primary keys of :class:`.Node`\ s in the tree ``tree_id`` to navigation."""
+		raise NotImplementedError
+	
+	def get_targets_generation(self):
+		"""Returns a value which changes whenever :meth:`invalidate_targets` is called."""
+		raise NotImplementedError
+	
+	def invalidate_targets(self):
+		"""Marks the target nodes of all cached navigation as out of date."""
+		raise NotImplementedError
+
+
+class LocalNavigationCache(BaseNavigationCache):
+	"""
+	A per-process cache which holds at most :setting:`PHILO_NAVIGATION_CACHE_SIZE` entries (default: 1000). When it is full, the least recently used quarter of the entries is discarded. Invalidations of cached navigation are only seen by the process which makes them, but the targets generation is kept in django's default cache, so that every process which shares that cache notices when target nodes change. Access is serialized with a lock, so the cache can be shared by the threads of a process.
+	
+	"""
+	def __init__(self, db):
+		super(LocalNavigationCache, self).__init__(db)
+		self.max_entries = getattr(settings, 'PHILO_NAVIGATION_CACHE_SIZE', 1000)
+		self._cache = {}
+		self._used = {}
+		self._counter = itertools.count()
+		self._targets_key = 'philo_navigation:%s:targets' % db
+		self._lock = threading.Lock()
+	
+	def get(self, node):
+		self._lock.acquire()
+		try:
+			value = self._cache.get(node.pk)
+			if value is not None:
+				self._used[node.pk] = self._counter.next()
+			return value
+		finally:
+			self._lock.release()
+	
+	def set(self, node, value):
+		self.set_many({node.pk: value}, None)
+	
+	def get_many(self, pks, tree_id):
+		self._lock.acquire()
+		try:
+			return dict([(pk, self._cache[pk]) for pk in pks if pk in self._cache])
+		finally:
+			self._lock.release()
+	
+	def set_many(self, mapping, tree_id):
+		self._lock.acquire()
+		try:
+			for pk, value in mapping.items():
+				if pk not in self._cache and len(self._cache) >= self.max_entries:
+					self._cull()
+				self._cache[pk] = value
+				self._used[pk] = self._counter.next()
+		finally:
+			self._lock.release()
+	
+	def _cull(self):
+		# Must be called with the lock held.
+		lru = sorted(self._used, key=self._used.get)
+		for pk in lru[:max(len(lru) / 4, 1)]:
+			self._cache.pop(pk, None)
+			self._used.pop(pk, None)
+	
+	def delete(self, node):
+		if not self._cache:
+			return
+		
+		pks = list(node.get_descendants(include_self=True).values_list('pk', flat=True))
+		self._lock.acquire()
+		try:
+			for pk in pks:
+				self._cache.pop(pk, None)
+				self._used.pop(pk, None)
+		finally:
+			self._lock.release()
+	
+	def clear(self):
+		self._lock.acquire()
+		try:
+			self._cache.clear()
+			self._used.clear()
+		finally:
+			self._lock.release()
+	
+	def get_targets_generation(self):
+		return cache.get(self._targets_key, 0)
+	
+	def invalidate_targets(self):
+		try:
+			cache.incr(self._targets_key)
+		except ValueError:
+			cache.set(self._targets_key, 1)
+
+
+class SharedNavigationCache(BaseNavigationCache):
+	"""
+	Stores navigation in the django cache named by :setting:`PHILO_NAVIGATION_CACHE_ALIAS` (default: ``'default'``) so that it is shared by all processes, with a timeout of :setting:`PHILO_NAVIGATION_CACHE_TIMEOUT` seconds (default: the cache's own timeout).
+	
+	Entries are never deleted directly. Instead, each key includes a generation counter for the whole cache and one for the :class:`.Node`'s tree; invalidation increments a counter, which makes every entry stored under the old generation unreachable in every process at once.
+	
+	"""
+	def __init__(self, db):
+		super(SharedNavigationCache, self).__init__(db)
+		self.cache = get_cache(getattr(settings, 'PHILO_NAVIGATION_CACHE_ALIAS', 'default'))
+		self.timeout = getattr(settings, 'PHILO_NAVIGATION_CACHE_TIMEOUT', None)
+		self.prefix = 'philo_navigation:%s' % db
+	
+	def _generation_key(self, tree_id=None):
+		if tree_id is None:
+			return '%s:generation' % self.prefix
+		return '%s:generation:%s' % (self.prefix, tree_id)
+	
+	def _incr(self, key):
+		try:
+			self.cache.incr(key)
+		except ValueError:
+			self.cache.set(key, 1)
+	
+	def _get_keys(self, pks, tree_id):
+		generations = self.cache.get_many([self._generation_key(), self._generation_key(tree_id)])
+		prefix = '%s:%s:%s' % (self.prefix, generations.get(self._generation_key(), 0), generations.get(self._generation_key(tree_id), 0))
+		return dict([(pk, '%s:%s' % (prefix, pk)) for pk in pks])
+	
+	def _get_key(self, node):
+		return self._get_keys([node.pk], getattr(node, node._mptt_meta.tree_id_attr))[node.pk]
+	
+	def get(self, node):
+		return self.cache.get(self._get_key(node))
+	
+	def set(self, node, value):
+		self.cache.set(self._get_key(node), value, self.timeout)
+	
+	def get_many(self, pks, tree_id):
+		keys = self._get_keys(pks, tree_id)
+		values = self.cache.get_many(keys.values())
+		return dict([(pk, values[key]) for pk, key in keys.items() if key in values])
+	
+	def set_many(self, mapping, tree_id):
+		keys = self._get_keys(mapping.keys(), tree_id)
+		self.cache.set_many(dict([(keys[pk], value) for pk, value in mapping.items()]), self.timeout)
+	
+	def delete(self, node):
+		self._incr(self._generation_key(getattr(node, node._mptt_meta.tree_id_attr)))
+	
+	def clear(self):
+		self._incr(self._generation_key())
+	
+	def get_targets_generation(self):
+		return self.cache.get('%s:targets' % self.prefix, 0)
+	
+	def invalidate_targets(self):
+		self._incr('%s:targets' % self.prefix)
+
+
+def get_navigation_cache(db):
+	"""Returns an instance of the backend named by :setting:`PHILO_NAVIGATION_CACHE_BACKEND` for the given database alias."""
+	path = getattr(settings, 'PHILO_NAVIGATION_CACHE_BACKEND', 'philo.contrib.shipherd.cache.LocalNavigationCache')
+	module, attr = path.rsplit('.', 1)
+	try:
+		backend = getattr(import_module(module), attr)
+	except (ImportError, AttributeError), e:
+		raise ImproperlyConfigured('Error loading navigation cache backend %s: "%s"' % (path, e))
+	return backend(db)
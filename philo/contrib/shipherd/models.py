@@ -1,14 +1,17 @@
 #encoding: utf-8
 from UserDict import DictMixin
 
+from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import NoReverseMatch
 from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models
 from django.forms.models import model_to_dict
 
+from philo.contrib.shipherd.cache import get_navigation_cache
+from philo.exceptions import AncestorDoesNotExist, ViewCanNotProvideSubpath
 from philo.models.base import TreeEntity, TreeManager, Entity
-from philo.models.nodes import Node, TargetURLModel
+from philo.models.nodes import Node, TargetURLModel, get_current_site
 
 
 DEFAULT_NAVIGATION_DEPTH = 3
@@ -56,11 +59,11 @@ class NavigationCacheQuerySet(models.query.QuerySet):
 
 class NavigationManager(models.Manager):
 	"""
-	Since navigation on a site will be hit frequently, is relatively costly to compute, and is changed relatively infrequently, the NavigationManager maintains a cache which maps nodes to navigations.
+	Since navigation on a site will be hit frequently, is relatively costly to compute, and is changed relatively infrequently, the NavigationManager maintains a cache which maps nodes to navigations. The cache is stored in a backend from :mod:`philo.contrib.shipherd.cache`, chosen with the :setting:`PHILO_NAVIGATION_CACHE_BACKEND` setting.
 	
 	"""
 	use_for_related = True
-	_cache = {}
+	_caches = {}
 	
 	def get_query_set(self):
 		"""
@@ -69,68 +72,81 @@ class NavigationManager(models.Manager):
 		"""
 		return NavigationCacheQuerySet(self.model, using=self._db)
 	
+	@property
+	def cache(self):
+		"""The :class:`~philo.contrib.shipherd.cache.BaseNavigationCache` instance for the manager's database."""
+		caches = self.__class__._caches
+		if self.db not in caches:
+			caches[self.db] = get_navigation_cache(self.db)
+		return caches[self.db]
+	
 	def get_cache_for(self, node, update_targets=True):
-		"""Returns the navigation cache for a given :class:`.Node`. If update_targets is ``True``, then :meth:`update_targets_for` will be run with the :class:`.Node`."""
-		created = False
-		if not self.has_cache_for(node):
-			self.create_cache_for(node)
-			created = True
+		"""Returns the navigation cache for a given :class:`.Node`. If update_targets is ``True``, then :meth:`update_targets_for` will be run with the :class:`.Node` if any target :class:`.Node` has changed since the cache's targets were last updated."""
+		cache = self.cache.get(node)
+		if cache is None:
+			cache = self.create_cache_for(node)
 		
-		if update_targets and not created:
-			self.update_targets_for(node)
+		if update_targets:
+			generation = self.cache.get_targets_generation()
+			for entry in cache.values():
+				if entry.get('targets_generation') != generation:
+					self.update_targets_for(node, cache)
+					self.cache.set(node, cache)
+					break
 		
-		return self.__class__._cache[self.db][node]
+		return cache
 	
 	def has_cache_for(self, node):
 		"""Returns ``True`` if a cache exists for the :class:`.Node` and ``False`` otherwise."""
-		return self.db in self.__class__._cache and node in self.__class__._cache[self.db]
+		return self.cache.get(node) is not None
 	
 	def create_cache_for(self, node):
-		"""This method loops through the :class:`.Node`\ s ancestors and caches all unique navigation keys."""
+		"""This method loops through the :class:`.Node`\ s ancestors and caches all unique navigation keys. Returns the cache for the :class:`.Node`."""
 		ancestors = node.get_ancestors(ascending=True, include_self=True)
 		
 		nodes_to_cache = []
 		
-		for node in ancestors:
-			if self.has_cache_for(node):
-				cache = self.get_cache_for(node).copy()
+		for ancestor in ancestors:
+			cache = self.cache.get(ancestor)
+			if cache is not None:
 				break
-			else:
-				nodes_to_cache.insert(0, node)
+			nodes_to_cache.insert(0, ancestor)
 		else:
 			cache = {}
 		
-		for node in nodes_to_cache:
+		for ancestor in nodes_to_cache:
 			cache = cache.copy()
-			cache.update(self._build_cache_for(node))
-			self.__class__._cache.setdefault(self.db, {})[node] = cache
+			cache.update(self._build_cache_for(ancestor))
+			self.cache.set(ancestor, cache)
+		
+		return cache
 	
-	def _build_cache_for(self, node):
+	def _build_cache_for(self, node, key=None):
 		cache = {}
 		tree_id_attr = NavigationItem._mptt_meta.tree_id_attr
 		level_attr = NavigationItem._mptt_meta.level_attr
 		
-		for navigation in node.navigation_set.all():
+		navigations = node.navigation_set.all()
+		if key is not None:
+			navigations = navigations.filter(key=key)
+		
+		for navigation in navigations:
 			tree_ids = navigation.roots.values_list(tree_id_attr)
 			items = list(NavigationItem.objects.filter(**{'%s__in' % tree_id_attr: tree_ids, '%s__lt' % level_attr: navigation.depth}).order_by('order', 'lft'))
+			items_by_pk = dict([(item.pk, item) for item in items])
 			
 			root_items = []
 			
 			for item in items:
 				item._is_cached = True
-				
-				if not hasattr(item, '_cached_children'):
-					item._cached_children = []
-				
-				if item.parent:
-					# alternatively, if I don't want to force it to a list, I could keep track of
-					# instances where the parent hasn't yet been met and do this step later for them.
-					# delayed action.
-					item.parent = items[items.index(item.parent)]
-					if not hasattr(item.parent, '_cached_children'):
-						item.parent._cached_children = []
+				item._cached_children = []
+			
+			for item in items:
+				if item.parent_id is not None:
+					item.parent = items_by_pk[item.parent_id]
 					item.parent._cached_children.append(item)
 				else:
+					item.navigation = navigation
 					root_items.append(item)
 			
 			cache[navigation.key] = {
@@ -141,38 +157,123 @@ class NavigationManager(models.Manager):
 		
 		return cache
 	
-	def clear_cache_for(self, node):
-		"""Clear the cache for the :class:`.Node` and all its descendants. The navigation for this node has probably changed, and it isn't worth it to figure out which descendants were actually affected by this."""
-		if not self.has_cache_for(node):
-			# Already cleared.
+	def update_cache_for(self, node, key):
+		"""
+		Rebuilds the cached navigation for ``key`` on the :class:`.Node` and patches it into the caches of the :class:`.Node`'s descendants which inherit it, leaving their other navigations - and descendants which define their own navigation for ``key`` - untouched. If the :class:`.Node` no longer has a navigation for ``key``, the navigation inherited from its ancestors (if any) takes its place.
+		
+		"""
+		entry = self._build_cache_for(node, key).get(key)
+		if entry is not None:
+			self.update_targets_for(node, {key: entry})
+		elif node.parent_id is not None:
+			entry = self.get_cache_for(node.parent).get(key)
+		
+		tree_id = getattr(node, node._mptt_meta.tree_id_attr)
+		pks = list(node.get_descendants(include_self=True).values_list('pk', flat=True))
+		caches = self.cache.get_many(pks, tree_id)
+		if not caches:
 			return
 		
-		descendants = node.get_descendants(include_self=True)
-		cache = self.__class__._cache[self.db]
-		for node in descendants:
-			cache.pop(node, None)
-	
-	def update_targets_for(self, node):
-		"""Manually updates the target nodes for the :class:`.Node`'s cache in case something's changed there. This is a less complex operation than rebuilding the :class:`.Node`'s cache."""
-		caches = self.__class__._cache[self.db][node].values()
+		# Descendants whose navigation for this key comes from a node below this one are unaffected.
+		inner_pks = set(pks)
+		inner_pks.discard(node.pk)
+		
+		for cache in caches.values():
+			current = cache.get(key)
+			if current is not None and current['navigation'].node_id in inner_pks:
+				continue
+			if entry is None:
+				cache.pop(key, None)
+			else:
+				cache[key] = entry
+		
+		self.cache.set_many(caches, tree_id)
+	
+	def clear_cache_for(self, node):
+		"""Clear the cache for the :class:`.Node` and all its descendants. The navigation for this node has probably changed, and it isn't worth it to figure out which descendants were actually affected by this."""
+		self.cache.delete(node)
+	
+	def update_targets_for(self, node, cache=None):
+		"""Manually updates the target nodes and precomputed :attr:`~NavigationItem.target_url`\ s for the :class:`.Node`'s cache in case something's changed there. This is a less complex operation than rebuilding the :class:`.Node`'s cache, and takes a fixed number of queries however many items the navigation has."""
+		if cache is None:
+			cache = self.get_cache_for(node, update_targets=False)
+		caches = cache.values()
+		generation = self.cache.get_targets_generation()
 		
 		target_pks = set()
 		
 		for cache in caches:
-			target_pks |= set([item.target_node_id for item in cache['items']])
+			target_pks.add(cache['navigation'].node_id)
+			target_pks |= set([item.target_node_id for item in cache['items'] if item.target_node_id])
 		
-		# A distinct query is not strictly necessary. TODO: benchmark the efficiency
-		# with/without distinct.
-		targets = list(Node.objects.filter(pk__in=target_pks).distinct())
+		targets = dict([(target.pk, target) for target in Node.objects.prefetch_views(Node.objects.filter(pk__in=target_pks))])
+		
+		try:
+			root = get_current_site().root_node
+		except Site.DoesNotExist:
+			root = None
+		Node.objects.get_paths(targets.values(), root=root)
 		
 		for cache in caches:
+			navigation = cache['navigation']
+			if navigation.node_id in targets:
+				navigation.node = targets[navigation.node_id]
 			for item in cache['items']:
-				if item.target_node_id:
-					item.target_node = targets[targets.index(item.target_node)]
+				if item.target_node_id in targets:
+					item.target_node = targets[item.target_node_id]
+				item._target_url = None
+				try:
+					item._target_url = item.get_target_url()
+				except (NoReverseMatch, ViewCanNotProvideSubpath, AncestorDoesNotExist):
+					# Leave the error to be raised when the target url is accessed.
+					pass
+			cache['targets_generation'] = generation
+			cache.pop('rendered', None)
+			cache.pop('rendered_generation', None)
+	
+	def get_active_items(self, request, node, key):
+		"""
+		Returns a tuple of sets (``active``, ``active_ancestors``) holding the primary keys of the items in the :class:`.Node`'s navigation for ``key`` which are active for the request and of the items which have active descendants. Both sets are computed in one pass over the cached items and are remembered on the request, so that rendering a navigation doesn't re-evaluate :meth:`NavigationItem.is_active` for every subtree.
+		
+		"""
+		cache = self.get_cache_for(node, update_targets=False)[key]
+		navigation = cache['navigation']
+		memo = request.__dict__.setdefault('_navigation_active_items', {})
+		
+		if navigation.pk not in memo:
+			host_node = navigation.node
+			active, active_ancestors = set(), set()
+			
+			for item in cache['items']:
+				if not item.is_active(request, host_node):
+					continue
+				active.add(item.pk)
+				while item.parent_id is not None and item.parent_id not in active_ancestors:
+					active_ancestors.add(item.parent_id)
+					item = item.parent
+			
+			memo[navigation.pk] = active, active_ancestors
+		
+		return memo[navigation.pk]
 	
 	def clear_cache(self):
 		"""Clears the manager's entire navigation cache."""
-		self.__class__._cache.pop(self.db, None)
+		self.cache.clear()
+	
+	def clear_targets(self):
+		"""Marks the target nodes of every cached navigation as out of date, so that :meth:`update_targets_for` will be run for each cache the next time it is used."""
+		self.cache.invalidate_targets()
+
+
+def clear_navigation_targets(sender, instance, **kwargs):
+	Navigation.objects.db_manager(kwargs.get('using')).clear_targets()
+
+
+models.signals.post_save.connect(clear_navigation_targets, sender=Node)
+models.signals.post_delete.connect(clear_navigation_targets, sender=Node)
+# Target urls are relative to the current site's root node.
+models.signals.post_save.connect(clear_navigation_targets, sender=Site)
+models.signals.post_delete.connect(clear_navigation_targets, sender=Site)
 
 
 class Navigation(Entity):
@@ -204,12 +305,16 @@ class Navigation(Entity):
 		super(Navigation, self).save(*args, **kwargs)
 		
 		if self._has_changed():
-			Navigation.objects.clear_cache_for(self.node)
+			old_node_pk, old_key = self._initial_data['node'], self._initial_data['key']
+			Navigation.objects.update_cache_for(self.node, self.key)
+			if old_node_pk is not None and (old_node_pk, old_key) != (self.node_id, self.key):
+				for old_node in Node.objects.filter(pk=old_node_pk):
+					Navigation.objects.update_cache_for(old_node, old_key)
 			self._initial_data = model_to_dict(self)
 	
 	def delete(self, *args, **kwargs):
 		super(Navigation, self).delete(*args, **kwargs)
-		Navigation.objects.clear_cache_for(self.node)
+		Navigation.objects.update_cache_for(self.node, self.key)
 	
 	class Meta:
 		unique_together = ('node', 'key')
@@ -248,8 +353,8 @@ class NavigationItem(TreeEntity, TargetURLModel):
 		if bool(self.parent) == bool(self.navigation):
 			raise ValidationError("Exactly one of `parent` and `navigation` must be defined.")
 	
-	def is_active(self, request):
-		"""Returns ``True`` if the :class:`NavigationItem` is considered active for a given request and ``False`` otherwise."""
+	def is_active(self, request, host_node=None):
+		"""Returns ``True`` if the :class:`NavigationItem` is considered active for a given request and ``False`` otherwise. ``host_node`` is the :class:`.Node` which the item's :class:`Navigation` is attached to; it will be looked up if it is not provided."""
 		if self.target_url == request.path:
 			# Handle the `default` case where the target_url and requested path
 			# are identical.
@@ -265,20 +370,48 @@ class NavigationItem(TreeEntity, TargetURLModel):
 			# the same as the request path, check whether the target node is an ancestor
 			# of the requested node. If so, this is active unless the target node
 			# is the same as the ``host node`` for this navigation structure.
-			try:
-				host_node = self.get_root().navigation.node
-			except AttributeError:
-				pass
-			else:
-				if self.target_node != host_node and self.target_node.is_ancestor_of(request.node):
-					return True
+			if host_node is None:
+				try:
+					host_node = self.get_root().navigation.node
+				except AttributeError:
+					return False
+			if self.target_node != host_node and self.target_node.is_ancestor_of(request.node):
+				return True
 		
 		return False
 	
-	def has_active_descendants(self, request):
+	def get_root(self):
+		"""If the :class:`NavigationItem` was loaded by the navigation cache, follows the cached parents to the root item without querying the database. Otherwise, behaves as usual."""
+		if self._is_cached:
+			item = self
+			while item.parent_id is not None:
+				item = item.parent
+			return item
+		return super(NavigationItem, self).get_root()
+	
+	def get_target_url(self):
+		"""Returns the target url precomputed by :meth:`NavigationManager.update_targets_for` if there is one, and otherwise calculates it."""
+		target_url = getattr(self, '_target_url', None)
+		if target_url is not None:
+			return target_url
+		return super(NavigationItem, self).get_target_url()
+	target_url = property(get_target_url)
+	
+	def get_children(self):
+		"""If the :class:`NavigationItem` was loaded by the navigation cache, returns its cached children (which are limited to the :class:`Navigation`'s :attr:`~Navigation.depth`) without querying the database. Otherwise, behaves as usual."""
+		if self._is_cached:
+			return self._cached_children
+		return super(NavigationItem, self).get_children()
+	
+	def has_active_descendants(self, request, host_node=None):
 		"""Returns ``True`` if the :class:`NavigationItem` has active descendants and ``False`` otherwise."""
+		if host_node is None:
+			try:
+				host_node = self.get_root().navigation.node
+			except AttributeError:
+				pass
 		for child in self.get_children():
-			if child.is_active(request) or child.has_active_descendants(request):
+			if child.is_active(request, host_node) or child.has_active_descendants(request, host_node):
 				return True
 		return False
 	
@@ -289,10 +422,10 @@ class NavigationItem(TreeEntity, TargetURLModel):
 	
 	def _clear_cache(self):
 		try:
-			root = self.get_root()
-			if self.get_level() < root.navigation.depth:
-				Navigation.objects.clear_cache_for(self.get_root().navigation.node)
-		except AttributeError:
+			navigation = self.get_root().navigation
+			if self.get_level() < navigation.depth:
+				Navigation.objects.update_cache_for(navigation.node, navigation.key)
+		except (AttributeError, NavigationItem.DoesNotExist):
 			pass
 	
 	def save(self, *args, **kwargs):
@@ -1,5 +1,7 @@
 from django import template, VERSION as django_version
 from django.conf import settings
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 from django.utils.safestring import mark_safe
 from philo.contrib.shipherd.models import Navigation
 from philo.models import Node
@@ -11,11 +13,13 @@ register = template.Library()
 
 
 class LazyNavigationRecurser(object):
-	def __init__(self, template_nodes, items, context, request):
+	def __init__(self, template_nodes, items, context, request, active, active_ancestors):
 		self.template_nodes = template_nodes
 		self.items = items
 		self.context = context
 		self.request = request
+		self.active = active
+		self.active_ancestors = active_ancestors
 	
 	def __call__(self):
 		items = self.items
@@ -53,12 +57,12 @@ class LazyNavigationRecurser(object):
 			
 			# Set on loop_dict and context for backwards-compatibility.
 			# Eventually only allow access through the loop_dict.
-			loop_dict['active'] = context['active'] = item.is_active(request)
-			loop_dict['active_descendants'] = context['active_descendants'] = item.has_active_descendants(request)
+			loop_dict['active'] = context['active'] = item.pk in self.active
+			loop_dict['active_descendants'] = context['active_descendants'] = item.pk in self.active_ancestors
 			
 			# Set these directly in the context for easy access.
 			context['item'] = item
-			context['children'] = self.__class__(self.template_nodes, item.get_children(), context, request)
+			context['children'] = self.__class__(self.template_nodes, item.get_children(), context, request, self.active, self.active_ancestors)
 			
 			# Then render the nodelist bit by bit.
 			for node in self.template_nodes:
@@ -68,10 +72,11 @@ class LazyNavigationRecurser(object):
 
 
 class RecurseNavigationNode(template.Node):
-	def __init__(self, template_nodes, instance_var, key_var):
+	def __init__(self, template_nodes, instance_var, key_var, fragment_hash=None):
 		self.template_nodes = template_nodes
 		self.instance_var = instance_var
 		self.key_var = key_var
+		self.fragment_hash = fragment_hash
 	
 	def render(self, context):
 		try:
@@ -92,10 +97,30 @@ class RecurseNavigationNode(template.Node):
 		
 		try:
 			items = instance.navigation[key]
-		except:
+		except (AttributeError, KeyError):
+			# The instance isn't a node or has no navigation for the key.
 			return settings.TEMPLATE_STRING_IF_INVALID
 		
-		return LazyNavigationRecurser(self.template_nodes, items, context, request)()
+		active, active_ancestors = Navigation.objects.get_active_items(request, instance, key)
+		
+		if self.fragment_hash is None or not getattr(settings, 'PHILO_NAVIGATION_RENDER_CACHE', False):
+			return LazyNavigationRecurser(self.template_nodes, items, context, request, active, active_ancestors)()
+		
+		# The rendered output is stored alongside the navigation in the navigation cache,
+		# so it is discarded whenever the navigation or its targets change. The targets
+		# generation is shared by all processes, so check it rather than relying on
+		# this process having refreshed the targets.
+		cache = Navigation.objects.get_cache_for(instance, update_targets=False)
+		generation = Navigation.objects.cache.get_targets_generation()
+		if cache[key].get('rendered_generation') != generation:
+			cache[key]['rendered'] = {}
+			cache[key]['rendered_generation'] = generation
+		rendered = cache[key]['rendered']
+		cache_key = (self.fragment_hash, frozenset(active))
+		if cache_key not in rendered:
+			rendered[cache_key] = LazyNavigationRecurser(self.template_nodes, items, context, request, active, active_ancestors)()
+			Navigation.objects.cache.set(instance, cache)
+		return rendered[cache_key]
 
 
 @register.tag
@@ -126,6 +151,8 @@ def recursenavigation(parser, token):
 		``navloop.active_descendants``  True if the item has active descendants for this request
 		==============================  ================================================
 	
+	If :setting:`PHILO_NAVIGATION_RENDER_CACHE` is ``True``, the output of each :ttag:`recursenavigation` block is cached along with the navigation, keyed by the block's source and the set of active items. This is only safe if the block uses nothing from the context besides the variables listed above, since other context variables aren't part of the key.
+	
 	Example::
 	
 		<ul>
@@ -148,9 +175,14 @@ def recursenavigation(parser, token):
 	instance_var = parser.compile_filter(bits[1])
 	key_var = parser.compile_filter(bits[2])
 	
+	tokens = parser.tokens[:]
 	template_nodes = parser.parse(('endrecursenavigation',))
 	token = parser.delete_first_token()
-	return RecurseNavigationNode(template_nodes, instance_var, key_var)
+	
+	# Fingerprint the source of the block so that rendered output can be cached per block.
+	fragment = tokens[:len(tokens) - len(parser.tokens)]
+	fragment_hash = md5_constructor(smart_str(u''.join([u'%s:%s|' % (t.token_type, t.contents) for t in fragment]))).hexdigest()
+	return RecurseNavigationNode(template_nodes, instance_var, key_var, fragment_hash)
 
 
 @register.filter
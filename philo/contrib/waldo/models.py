@@ -17,7 +17,6 @@ from django.contrib.auth import authenticate, login, views as auth_views
 from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm, PasswordChangeForm
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator as password_token_generator
-from django.contrib.sites.models import Site
 from django.core.mail import EmailMultiAlternatives, send_mail
 from django.db import models
 from django.http import Http404, HttpResponseRedirect
@@ -29,6 +28,7 @@ from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect
 
 from philo.models import MultiView, Page
+from philo.models.nodes import get_current_site
 from philo.contrib.waldo.forms import WaldoAuthenticationForm, RegistrationForm, UserAccountForm
 from philo.contrib.waldo.tokens import registration_token_generator, email_token_generator
 
@@ -208,7 +208,7 @@ class PasswordMultiView(LoginMultiView):
 		
 		"""
 		text_content = page.render_to_string(extra_context=extra_context)
-		from_email = 'noreply@%s' % Site.objects.get_current().domain
+		from_email = 'noreply@%s' % get_current_site().domain
 		
 		if page.template.mimetype == 'text/html':
 			msg = EmailMultiAlternatives(subject, striptags(text_content), from_email, [email])
@@ -239,7 +239,7 @@ class PasswordMultiView(LoginMultiView):
 		if request.method == 'POST':
 			form = self.password_reset_form(request.POST)
 			if form.is_valid():
-				current_site = Site.objects.get_current()
+				current_site = get_current_site(request)
 				for user in form.users_cache:
 					context = {
 						'link': self.make_confirmation_link('password_reset_confirm', token_generator, user, request.node, secure=request.is_secure()),
@@ -350,7 +350,7 @@ class RegistrationMultiView(PasswordMultiView):
 			form = self.registration_form(request.POST)
 			if form.is_valid():
 				user = form.save()
-				current_site = Site.objects.get_current()
+				current_site = get_current_site(request)
 				context = {
 					'link': self.make_confirmation_link('register_confirm', token_generator, user, request.node, secure=request.is_secure()),
 					'user': user,
@@ -454,7 +454,7 @@ class AccountMultiView(RegistrationMultiView):
 					
 					email = form.cleaned_data.pop('email')
 					
-					current_site = Site.objects.get_current()
+					current_site = get_current_site(request)
 					
 					context = {
 						'link': self.make_confirmation_link('email_change_confirm', token_generator, request.user, request.node, token_args=[email], reverse_kwargs={'email': email.replace('@', '+')}, secure=request.is_secure()),
@@ -3,6 +3,7 @@ from django.contrib.sites.models import Site
 from django.http import Http404
 
 from philo.models import Node, View
+from philo.models.nodes import get_current_site
 
 
 class LazyNode(object):
@@ -12,7 +13,7 @@ class LazyNode(object):
 		
 		if not hasattr(request, '_found_node'):
 			try:
-				current_site = Site.objects.get_current()
+				current_site = get_current_site(request)
 			except Site.DoesNotExist:
 				current_site = None
 			
@@ -261,6 +261,8 @@ class Attribute(models.Model):
 	
 	#: :class:`CharField` containing a key (up to 255 characters) consisting of alphanumeric characters and underscores.
 	key = models.CharField(max_length=255, validators=[RegexValidator("\w+")], help_text="Must contain one or more alphanumeric characters or underscores.", db_index=True)
+	#: The time at which the :class:`Attribute` was last saved. Used to compute validators for conditional GETs.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	def __unicode__(self):
 		return u'"%s": %s' % (self.key, self.value)
@@ -443,6 +445,53 @@ class TreeManager(models.Manager):
 		# of the path, since short paths are more likely, but how far forward? It would
 		# need to shift depending on len(segments) - perhaps logarithmically?
 		return find_obj(segments, len(segments)/2 or len(segments))
+	
+	def get_paths(self, objs, root=None, pathsep='/', field='slug'):
+		"""
+		Computes the paths of several objects at once, fetching all of their ancestors in a single query. Each object's path is also remembered on the object, so that later calls to its :meth:`~TreeModel.get_path` with the same arguments don't hit the database.
+		
+		:param objs: An iterable of instances of the manager's model.
+		:param root: Only return paths since this object. Objects which are not descendants of ``root`` are left out of the result.
+		:param pathsep: The path separator to use when constructing the paths.
+		:param field: The field to pull path information from for each ancestor.
+		:returns: A dictionary mapping the primary key of each object to its path.
+		
+		"""
+		opts = self.model._mptt_meta
+		tree_id_attr, left_attr, right_attr, level_attr = opts.tree_id_attr, opts.left_attr, opts.right_attr, opts.level_attr
+		
+		objs = list(objs)
+		paths = {}
+		pending = []
+		for obj in objs:
+			if root == obj:
+				paths[obj.pk] = ''
+			elif root is None or obj.is_descendant_of(root):
+				pending.append(obj)
+		
+		if pending:
+			q = models.Q()
+			for obj in pending:
+				q |= models.Q(**{
+					tree_id_attr: getattr(obj, tree_id_attr),
+					'%s__lte' % left_attr: getattr(obj, left_attr),
+					'%s__gte' % right_attr: getattr(obj, right_attr)
+				})
+			ancestors = self.filter(q)
+			if root is not None:
+				ancestors = ancestors.filter(**{'%s__gt' % level_attr: getattr(root, level_attr)})
+			ancestors = list(ancestors.order_by(tree_id_attr, left_attr))
+			
+			for obj in pending:
+				tree_id, left, right = getattr(obj, tree_id_attr), getattr(obj, left_attr), getattr(obj, right_attr)
+				paths[obj.pk] = pathsep.join([getattr(ancestor, field, '?') for ancestor in ancestors if getattr(ancestor, tree_id_attr) == tree_id and getattr(ancestor, left_attr) <= left and getattr(ancestor, right_attr) >= right])
+		
+		cache_key = (getattr(root, 'pk', None), pathsep, field)
+		for obj in objs:
+			if obj.pk in paths:
+				obj.__dict__.setdefault('_path_cache', {})[cache_key] = paths[obj.pk]
+		
+		return paths
 
 
 class TreeModel(MPTTModel):
@@ -462,6 +511,13 @@ class TreeModel(MPTTModel):
 		if root == self:
 			return ''
 		
+		path_cache = getattr(self, '_path_cache', None)
+		if path_cache:
+			try:
+				return path_cache[(getattr(root, 'pk', None), pathsep, field)]
+			except KeyError:
+				pass
+		
 		if root is not None and not self.is_descendant_of(root):
 			raise AncestorDoesNotExist(root)
 		
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.core.cache import cache
+from django.db import models, connections
 
 from philo.models.base import value_content_type_limiter, register_value_model
 from philo.utils import fattr
@@ -9,6 +11,10 @@ from philo.utils import fattr
 __all__ = ('Collection', 'CollectionMember')
 
 
+COLLECTION_CACHE_KEY = 'philo_collection_members:%s'
+COLLECTION_GENERATION_KEY = 'philo_collection_generation:%s'
+
+
 class Collection(models.Model):
 	"""
 	Collections are curated ordered groupings of arbitrary models.
@@ -24,6 +30,32 @@ class Collection(models.Model):
 		"""Returns the number of items in the collection."""
 		return self.members.count()
 	
+	def get_members(self, model=None):
+		"""
+		Returns the collection's members: if ``model`` is given, the results of :meth:`members.with_model <CollectionMemberManager.with_model>` - a queryset in index order - and otherwise the results of :meth:`members.get_members <CollectionMemberManager.get_members>`. If :setting:`PHILO_COLLECTION_CACHE_TIMEOUT` is set, the results are kept in django's cache for that many seconds, or until the collection or one of its members is saved or deleted. Each save or delete increments a generation counter which is part of the cache key, so results computed before the change can never be stored where later requests will find them. Changes to the member instances themselves are not tracked, so they may be stale for up to the timeout.
+		
+		"""
+		timeout = getattr(settings, 'PHILO_COLLECTION_CACHE_TIMEOUT', None)
+		if not timeout:
+			return self._get_members(model)
+		
+		generation = cache.get(COLLECTION_GENERATION_KEY % self.pk, 0)
+		model_key = model is not None and ContentType.objects.get_for_model(model).pk or None
+		cache_key = COLLECTION_CACHE_KEY % '%s:%s:%s' % (self.pk, generation, model_key)
+		members = cache.get(cache_key)
+		if members is None:
+			members = self._get_members(model)
+			cache.set(cache_key, members, timeout)
+		return members
+	
+	def _get_members(self, model):
+		if model is None:
+			return self.members.get_members()
+		members = self.members.with_model(model)
+		# Evaluate the queryset so that its results are cached along with it.
+		len(members)
+		return members
+	
 	def __unicode__(self):
 		return self.name
 	
@@ -36,7 +68,7 @@ class CollectionMemberManager(models.Manager):
 
 	def with_model(self, model):
 		"""
-		Given a model class or instance, returns a queryset of all instances of that model which have collection members in this manager's scope.
+		Given a model class or instance, returns a queryset of all instances of that model which have collection members in this manager's scope, ordered by the members' :attr:`~CollectionMember.index`. The members' object ids are fetched when this method is called, so that the ordering can be added to the queryset.
 		
 		Example::
 		
@@ -49,7 +81,56 @@ class CollectionMemberManager(models.Manager):
 			[<User: user1>, <User: user2>]
 		
 		"""
-		return model._default_manager.filter(pk__in=self.filter(member_content_type=ContentType.objects.get_for_model(model)).values_list('member_object_id', flat=True))
+		object_ids = self.filter(member_content_type=ContentType.objects.get_for_model(model)).order_by('index', 'pk').values_list('member_object_id', flat=True)
+		
+		positions = {}
+		for object_id in object_ids:
+			positions.setdefault(object_id, len(positions))
+		
+		queryset = model._default_manager.using(self.db)
+		if not positions:
+			return queryset.none()
+		
+		qn = connections[self.db].ops.quote_name
+		pk_column = '%s.%s' % (qn(model._meta.db_table), qn(model._meta.pk.column))
+		index = 'CASE %s %s END' % (pk_column, ' '.join(['WHEN %d THEN %d' % item for item in positions.items()]))
+		return queryset.filter(pk__in=positions.keys()).extra(select={'_collection_index': index}, order_by=['_collection_index'])
+	
+	def get_members(self, model=None):
+		"""
+		Returns a list of the member instances of the collection members in this manager's scope, ordered by :attr:`~CollectionMember.index`. Members are loaded with one query per content type, and members whose instances no longer exist are left out. If ``model`` (a model class or instance) is given, only members of that model are returned.
+		
+		Example::
+		
+			>>> collection.members.get_members()
+			[<User: user1>, <Recipe: Spam & Eggs>, <User: user2>]
+			>>> collection.members.get_members(User)
+			[<User: user1>, <User: user2>]
+		
+		"""
+		members = self.all()
+		if model is not None:
+			members = members.filter(member_content_type=ContentType.objects.get_for_model(model))
+		members = list(members.order_by('index', 'pk'))
+		
+		object_ids = {}
+		for member in members:
+			object_ids.setdefault(member.member_content_type_id, []).append(member.member_object_id)
+		
+		instances = {}
+		for ct_id, ids in object_ids.items():
+			model_class = ContentType.objects.get_for_id(ct_id).model_class()
+			if model_class is not None:
+				instances[ct_id] = model_class._default_manager.using(self.db).in_bulk(ids)
+		
+		cache_attr = CollectionMember.member.cache_attr
+		results = []
+		for member in members:
+			instance = instances.get(member.member_content_type_id, {}).get(member.member_object_id)
+			if instance is not None:
+				setattr(member, cache_attr, instance)
+				results.append(instance)
+		return results
 
 
 class CollectionMember(models.Model):
@@ -75,4 +156,19 @@ class CollectionMember(models.Model):
 		app_label = 'philo'
 
 
+def clear_collection_cache(sender, instance, **kwargs):
+	collection_id = isinstance(instance, Collection) and instance.pk or instance.collection_id
+	key = COLLECTION_GENERATION_KEY % collection_id
+	try:
+		cache.incr(key)
+	except ValueError:
+		cache.set(key, 1)
+
+
+models.signals.post_save.connect(clear_collection_cache, sender=Collection)
+models.signals.post_delete.connect(clear_collection_cache, sender=Collection)
+models.signals.post_save.connect(clear_collection_cache, sender=CollectionMember)
+models.signals.post_delete.connect(clear_collection_cache, sender=CollectionMember)
+
+
 register_value_model(Collection)
\ No newline at end of file
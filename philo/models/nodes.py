@@ -1,5 +1,6 @@
 from inspect import getargspec
 
+from django.conf import settings
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site, RequestSite
@@ -7,13 +8,14 @@ from django.core.exceptions import ValidationError
 from django.core.servers.basehttp import FileWrapper
 from django.core.urlresolvers import resolve, clear_url_caches, reverse, NoReverseMatch
 from django.db import models
-from django.http import HttpResponse, HttpResponseServerError, HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseServerError, HttpResponseRedirect, HttpResponseNotModified, Http404
 from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 
 from philo.exceptions import MIDDLEWARE_NOT_CONFIGURED, ViewCanNotProvideSubpath, ViewDoesNotProvideSubpaths
-from philo.models.base import TreeEntity, Entity, register_value_model
+from philo.models.base import TreeEntity, TreeManager, Entity, register_value_model
 from philo.models.fields import JSONField
-from philo.utils import ContentTypeSubclassLimiter
+from philo.utils import ContentTypeSubclassLimiter, is_not_modified, if_range_matches, set_validators
 from philo.utils.entities import LazyPassthroughAttributeMapper
 from philo.signals import view_about_to_render, view_finished_rendering
 
@@ -24,11 +26,45 @@ __all__ = ('Node', 'View', 'MultiView', 'Redirect', 'File')
 _view_content_type_limiter = ContentTypeSubclassLimiter(None)
 
 
+class NodeManager(TreeManager):
+	def prefetch_views(self, nodes):
+		"""
+		Given an iterable of :class:`Node`\ s, fetches their :attr:`~Node.view`\ s with one query per view content type and caches them on the :class:`Node`\ s, so that later access to :attr:`Node.view` (for example through :attr:`~Node.accepts_subpath` or :meth:`~Node.handles_subpath`) will not cause any further queries. This is useful for lists of nodes such as navigations or sitemaps.
+		
+		:returns: A list of the :class:`Node`\ s.
+		
+		"""
+		nodes = list(nodes)
+		cache_attr = Node.view.cache_attr
+		
+		view_pks = {}
+		for node in nodes:
+			if not hasattr(node, cache_attr):
+				view_pks.setdefault(node.view_content_type_id, set()).add(node.view_object_id)
+		
+		views = {}
+		for ct_pk, pks in view_pks.items():
+			model = ContentType.objects.get_for_id(ct_pk).model_class()
+			if model is None:
+				continue
+			for pk, view in model._default_manager.using(self.db).in_bulk(list(pks)).items():
+				views[ct_pk, pk] = view
+		
+		for node in nodes:
+			if not hasattr(node, cache_attr):
+				setattr(node, cache_attr, views.get((node.view_content_type_id, node.view_object_id)))
+		
+		return nodes
+
+
 class Node(TreeEntity):
 	"""
 	:class:`Node`\ s are the basic building blocks of a website using Philo. They define the URL hierarchy and connect each URL to a :class:`View` subclass instance which is used to generate an HttpResponse.
 	
 	"""
+	#: A :class:`NodeManager` instance.
+	objects = NodeManager()
+	
 	view_content_type = models.ForeignKey(ContentType, related_name='node_view_set', limit_choices_to=_view_content_type_limiter)
 	view_object_id = models.PositiveIntegerField()
 	#: :class:`GenericForeignKey` to a non-abstract subclass of :class:`View`
@@ -70,7 +106,7 @@ class Node(TreeEntity):
 		- :class:`~philo.exceptions.AncestorDoesNotExist` if the root node of the site isn't an ancestor of the node constructing the URL.
 		
 		:param string subpath: The subpath to be constructed beyond beyond the node's URL.
-		:param request: :class:`HttpRequest` instance. Will be used to construct a :class:`RequestSite` if :meth:`Site.objects.get_current` fails.
+		:param request: :class:`HttpRequest` instance. Will be used to cache the current :class:`Site` for the rest of the request (see :func:`get_current_site`) and to construct a :class:`RequestSite` if no :class:`Site` can be found.
 		:param with_domain: Whether the constructed URL should include a domain name and protocol.
 		:param secure: Whether the protocol, if included, should be http:// or https://.
 		:returns: A constructed url for accessing the given subpath of the current node instance.
@@ -80,7 +116,7 @@ class Node(TreeEntity):
 		root_url = reverse('philo-root')
 		
 		try:
-			current_site = Site.objects.get_current()
+			current_site = get_current_site(request)
 		except Site.DoesNotExist:
 			if request is not None:
 				current_site = RequestSite(request)
@@ -104,6 +140,20 @@ class Node(TreeEntity):
 		
 		return '%s%s%s%s' % (domain, root_url, path, subpath)
 	
+	def get_url_constructor(self, request=None, with_domain=False, secure=False):
+		"""
+		Returns a function which takes a subpath and returns the same URL as :meth:`construct_url` would for that subpath and the given arguments. The node's own URL is only computed once, which makes this suitable for building many URLs under the same node - for example, the links of a feed.
+		
+		"""
+		base_url = self.construct_url('', request=request, with_domain=with_domain, secure=secure)
+		has_path = not base_url.endswith('/')
+		
+		def construct_url(subpath="/"):
+			if not has_path or subpath == "/":
+				subpath = subpath[1:]
+			return base_url + subpath
+		return construct_url
+	
 	class Meta:
 		app_label = 'philo'
 
@@ -112,6 +162,32 @@ class Node(TreeEntity):
 models.ForeignKey(Node, related_name='sites', null=True, blank=True).contribute_to_class(Site, 'root_node')
 
 
+def get_current_site(request=None):
+	"""
+	Returns the current :class:`Site` with its ``root_node`` fetched in the same query. If a ``request`` is passed in, the result is cached on the request, so that routing and url construction only hit the database once per request.
+	
+	The root node is never cached for longer than a request: its tree fields change whenever a :class:`Node` is added or moved anywhere in its tree, possibly by another process.
+	
+	:raises Site.DoesNotExist: if there is no :class:`Site` for the current :setting:`SITE_ID`.
+	
+	"""
+	if request is not None and hasattr(request, '_cached_current_site'):
+		if request._cached_current_site is None:
+			raise Site.DoesNotExist('Site matching query does not exist.')
+		return request._cached_current_site
+	
+	try:
+		current_site = Site.objects.select_related('root_node').get(pk=settings.SITE_ID)
+	except Site.DoesNotExist:
+		if request is not None:
+			request._cached_current_site = None
+		raise
+	
+	if request is not None:
+		request._cached_current_site = current_site
+	return current_site
+
+
 class View(Entity):
 	"""
 	:class:`View` is an abstract model that represents an item which can be "rendered", generally in response to an :class:`HttpRequest`.
@@ -185,6 +261,8 @@ class View(Entity):
 		Renders the :class:`View` as an :class:`HttpResponse`. This will raise :const:`~philo.exceptions.MIDDLEWARE_NOT_CONFIGURED` if the `request` doesn't have an attached :class:`Node`. This can happen if the :class:`~philo.middleware.RequestNodeMiddleware` is not in :setting:`settings.MIDDLEWARE_CLASSES` or if it is not functioning correctly.
 		
 		:meth:`render_to_response` will send the :data:`~philo.signals.view_about_to_render` signal, then call :meth:`actually_render_to_response`, and finally send the :data:`~philo.signals.view_finished_rendering` signal before returning the ``response``.
+		
+		If this is the first :class:`View` to render for a GET or HEAD request, the validators from :meth:`get_validators` will be checked against the request's conditional headers first; if they match, an :class:`HttpResponseNotModified` will be returned instead of calling :meth:`actually_render_to_response`. Otherwise they will be added to the response.
 
 		"""
 		if not hasattr(request, 'node'):
@@ -192,10 +270,30 @@ class View(Entity):
 		
 		extra_context = extra_context or {}
 		view_about_to_render.send(sender=self, request=request, extra_context=extra_context)
-		response = self.actually_render_to_response(request, extra_context)
+		
+		# Only the outermost view for a request gets to decide on validators;
+		# views rendered by it (such as a MultiView's pages) are covered by them.
+		etag = last_modified = None
+		if request.method in ('GET', 'HEAD') and not getattr(request, '_validators_checked', False):
+			request._validators_checked = True
+			etag, last_modified = self.get_validators(request, extra_context)
+		
+		if is_not_modified(request, etag, last_modified):
+			response = HttpResponseNotModified()
+		else:
+			response = self.actually_render_to_response(request, extra_context)
+		set_validators(response, etag, last_modified)
+		
 		view_finished_rendering.send(sender=self, response=response)
 		return response
 	
+	def get_validators(self, request, extra_context=None):
+		"""
+		Hook for providing cheap validators for conditional GETs. Should return an (``etag``, ``last_modified``) tuple, where ``etag`` is an unquoted string and ``last_modified`` is a :class:`datetime`; either may be ``None``. The validators must change whenever the rendered response would, since a match means :meth:`actually_render_to_response` will not be called at all. By default, returns ``(None, None)``, which disables conditional GETs for the :class:`View`.
+		
+		"""
+		return None, None
+	
 	def actually_render_to_response(self, request, extra_context=None):
 		"""Concrete subclasses must override this method to provide the business logic for turning a ``request`` and ``extra_context`` into an :class:`HttpResponse`."""
 		raise NotImplementedError('View subclasses must implement actually_render_to_response.')
@@ -368,17 +466,123 @@ class Redirect(TargetURLModel, View):
 		app_label = 'philo'
 
 
+def _file_range_iterator(f, start, length, chunk_size):
+	"""Yields ``length`` bytes of ``f`` starting at ``start`` in chunks of at most ``chunk_size`` bytes, then closes the file."""
+	try:
+		f.seek(start)
+		while length > 0:
+			chunk = f.read(min(chunk_size, length))
+			if not chunk:
+				break
+			length -= len(chunk)
+			yield chunk
+	finally:
+		f.close()
+
+
 class File(View):
 	"""Stores an arbitrary file."""
+	#: The number of bytes which will be read at a time when streaming a file. Default: :setting:`PHILO_FILE_CHUNK_SIZE` or 64KB.
+	chunk_size = getattr(settings, 'PHILO_FILE_CHUNK_SIZE', 64 * 1024)
+	#: If set to ``'X-Sendfile'`` or ``'X-Accel-Redirect'``, the file's bytes will not be served by django; instead, an empty response with the given header will be returned so that the front-end server can stream the file. Default: :setting:`PHILO_FILE_SENDFILE` or ``None``.
+	sendfile = getattr(settings, 'PHILO_FILE_SENDFILE', None)
+	#: The internal url prefix which will be prepended to the file's name for the ``X-Accel-Redirect`` header. Default: :setting:`PHILO_FILE_ACCEL_REDIRECT_PREFIX` or :setting:`MEDIA_URL`.
+	accel_redirect_prefix = getattr(settings, 'PHILO_FILE_ACCEL_REDIRECT_PREFIX', settings.MEDIA_URL)
+	
 	#: Defines the mimetype of the uploaded file. This will not be validated.
 	mimetype = models.CharField(max_length=255)
 	#: Contains the uploaded file. Files are uploaded to ``philo/files/%Y/%m/%d``.
 	file = models.FileField(upload_to='philo/files/%Y/%m/%d')
 	
+	def get_last_modified(self):
+		"""Returns the modification time of the stored file as a :class:`datetime`, or ``None`` if the storage can't provide it."""
+		if not hasattr(self, '_last_modified'):
+			try:
+				self._last_modified = self.file.storage.modified_time(self.file.name)
+			except (NotImplementedError, EnvironmentError):
+				self._last_modified = None
+		return self._last_modified
+	
+	def get_etag(self):
+		"""Returns an ETag for the stored file based on its name, size, and (if available) modification time."""
+		return md5_constructor(smart_str('%s:%s:%s' % (self.file.name, self.file.size, self.get_last_modified()))).hexdigest()
+	
+	def get_validators(self, request, extra_context=None):
+		"""Returns the results of :meth:`get_etag` and :meth:`get_last_modified`."""
+		return self.get_etag(), self.get_last_modified()
+	
+	def get_byte_range(self, request, size):
+		"""
+		Parses the request's ``Range`` header and returns a (``start``, ``end``) tuple of inclusive byte offsets, or ``None`` if the whole file should be served. Only single byte ranges are supported; anything else is served in full, as :rfc:`2616` allows.
+		
+		:raises ValueError: if the requested range can't be satisfied.
+		
+		"""
+		header = request.META.get('HTTP_RANGE', '')
+		if not header.startswith('bytes=') or ',' in header:
+			return None
+		
+		# An If-Range which doesn't match means the client's copy is stale; send everything.
+		if not if_range_matches(request, self.get_etag(), self.get_last_modified()):
+			return None
+		
+		try:
+			start, end = header[6:].strip().split('-')
+			if not start:
+				# A suffix range: the last n bytes.
+				start, end = max(size - int(end), 0), size - 1
+			else:
+				start, end = int(start), end and min(int(end), size - 1) or size - 1
+		except ValueError:
+			return None
+		
+		if start > end or start >= size:
+			raise ValueError("Unsatisfiable range: %s" % header)
+		return start, end
+	
 	def actually_render_to_response(self, request, extra_context=None):
-		wrapper = FileWrapper(self.file)
-		response = HttpResponse(wrapper, content_type=self.mimetype)
-		response['Content-Length'] = self.file.size
+		"""
+		Returns a streaming response for the file. Single byte ``Range`` requests are answered with a 206. If :attr:`sendfile` is set, the front-end server is asked to send the file instead. The :class:`File` answers conditional GETs itself as well, so that it honours its validators even when it is rendered by another view rather than being the outermost view of the request.
+		
+		"""
+		etag, last_modified = self.get_validators(request, extra_context)
+		if is_not_modified(request, etag, last_modified):
+			response = HttpResponseNotModified()
+		else:
+			response = self.render_file(request)
+		set_validators(response, etag, last_modified)
+		return response
+	
+	def render_file(self, request):
+		"""Returns a response with the file's contents - or part of them - for :meth:`actually_render_to_response`."""
+		if self.sendfile:
+			response = HttpResponse(content_type=self.mimetype)
+			if self.sendfile == 'X-Accel-Redirect':
+				response[self.sendfile] = smart_str(self.accel_redirect_prefix + self.file.name)
+			else:
+				response[self.sendfile] = smart_str(self.file.path)
+			return response
+		
+		size = self.file.size
+		byte_range = None
+		if request.method == 'GET':
+			try:
+				byte_range = self.get_byte_range(request, size)
+			except ValueError:
+				response = HttpResponse(status=416)
+				response['Content-Range'] = 'bytes */%d' % size
+				return response
+		
+		self.file.open('rb')
+		if byte_range is None:
+			response = HttpResponse(FileWrapper(self.file, self.chunk_size), content_type=self.mimetype)
+			response['Content-Length'] = size
+		else:
+			start, end = byte_range
+			response = HttpResponse(_file_range_iterator(self.file, start, end - start + 1, self.chunk_size), content_type=self.mimetype, status=206)
+			response['Content-Length'] = end - start + 1
+			response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+		response['Accept-Ranges'] = 'bytes'
 		return response
 	
 	class Meta:
@@ -4,26 +4,31 @@
 
 """
 
+import datetime
+
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.http import HttpResponse
 from django.template import TemplateDoesNotExist, Context, RequestContext, Template as DjangoTemplate, TextNode, VariableNode
 from django.template.loader_tags import BlockNode, ExtendsNode, BlockContext
 from django.utils.datastructures import SortedDict
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 
-from philo.models.base import TreeModel, register_value_model
+from philo.models.base import TreeModel, Attribute, JSONValue, ForeignKeyValue, ManyToManyValue, register_value_model
 from philo.models.fields import TemplateField
-from philo.models.nodes import View
+from philo.models.nodes import Node, View
 from philo.signals import page_about_to_render_to_string, page_finished_rendering_to_string
 from philo.templatetags.containers import ContainerNode
 from philo.utils import fattr
 from philo.validators import LOADED_TEMPLATE_ATTR
 
 
-__all__ = ('Template', 'Page', 'Contentlet', 'ContentReference')
+__all__ = ('Template', 'Page', 'Contentlet', 'ContentReference', 'get_modification_stamp', 'get_page_validators')
 
 
 class LazyContainerFinder(object):
@@ -78,6 +83,100 @@ class LazyContainerFinder(object):
 			self.initialized = True
 
 
+def get_modification_stamp(queryset):
+	"""Returns a (``last_modified``, ``count``) pair for ``queryset``, whose model must have a ``last_modified`` field, in a single aggregate query."""
+	stamp = queryset.aggregate(last_modified=models.Max('last_modified'), count=models.Count('pk'))
+	return stamp['last_modified'], stamp['count']
+
+
+VALIDATOR_CACHE_KEY = 'philo_validators:%s'
+VALIDATOR_GENERATION_KEY = VALIDATOR_CACHE_KEY % 'generation'
+
+
+def clear_validator_cache(sender, instance, **kwargs):
+	"""Invalidates all cached page modification stamps by incrementing the validator cache generation."""
+	try:
+		cache.incr(VALIDATOR_GENERATION_KEY)
+	except ValueError:
+		cache.set(VALIDATOR_GENERATION_KEY, 1)
+
+
+def touch_value_attributes(sender, instance, **kwargs):
+	"""Updates the modification stamp of the :class:`.Attribute`\ s whose value is ``instance`` and invalidates the cached page modification stamps, since changes to an :class:`.AttributeValue` don't save its :class:`.Attribute`."""
+	instance.attribute_set.update(last_modified=datetime.datetime.now())
+	clear_validator_cache(sender, instance)
+
+
+def touch_many_to_many_value_attributes(sender, instance, action, reverse, pk_set, **kwargs):
+	"""Like :func:`touch_value_attributes`, for changes to the :class:`.ForeignKeyValue`\ s of a :class:`.ManyToManyValue`."""
+	if not action.startswith('post_'):
+		return
+	if not reverse:
+		touch_value_attributes(sender, instance)
+	else:
+		content_type = ContentType.objects.get_for_model(ManyToManyValue)
+		attributes = Attribute.objects.filter(value_content_type=content_type)
+		if pk_set is not None:
+			attributes = attributes.filter(value_object_id__in=pk_set)
+		attributes.update(last_modified=datetime.datetime.now())
+		clear_validator_cache(sender, instance)
+
+
+def get_page_stamps(request, page_pks):
+	attribute_q = models.Q(entity_content_type=ContentType.objects.get_for_model(Page), entity_object_id__in=page_pks)
+	node = getattr(request, 'node', None)
+	if node is not None:
+		opts = node._mptt_meta
+		ancestors = Node.objects.filter(**{
+			opts.tree_id_attr: getattr(node, opts.tree_id_attr),
+			'%s__lte' % opts.left_attr: getattr(node, opts.left_attr),
+			'%s__gte' % opts.right_attr: getattr(node, opts.right_attr),
+		}).values('pk')
+		attribute_q |= models.Q(entity_content_type=ContentType.objects.get_for_model(Node), entity_object_id__in=ancestors)
+	
+	return [
+		get_modification_stamp(Page.objects.filter(pk__in=page_pks)),
+		get_modification_stamp(Template.objects.all()),
+		get_modification_stamp(Contentlet.objects.filter(page__in=page_pks)),
+		get_modification_stamp(ContentReference.objects.filter(page__in=page_pks)),
+		get_modification_stamp(Attribute.objects.filter(attribute_q)),
+	]
+
+
+def get_page_validators(request, page_pks, instance=None, extra_stamps=()):
+	"""
+	Computes an (``etag``, ``last_modified``) tuple for a response built from the :class:`Page`\ s with the given primary keys. The ETag covers the modification stamps and counts of those :class:`Page`\ s, of all :class:`Template`\ s (since templates can extend or include each other by name), of the :class:`Page`\ s' :class:`Contentlet`\ s and :class:`ContentReference`\ s, and of the :class:`.Attribute`\ s of the :class:`Page`\ s and of ``request.node`` and its ancestors, as well as the field values of ``instance`` and the requesting user.
+	
+	``last_modified`` is always ``None``: deletions and changes to ``instance`` alter the ETag but leave no modification time behind, so a ``Last-Modified`` header would let clients which only send ``If-Modified-Since`` keep a stale copy.
+	
+	The stamps cost a handful of aggregate queries. They are kept in django's cache - for :setting:`PHILO_CONDITIONAL_VIEWS_CACHE_TIMEOUT` seconds if that is set, or the cache's default timeout otherwise - until a :class:`Template`, :class:`Page`, :class:`Contentlet`, :class:`ContentReference`, :class:`.Attribute`, :class:`.AttributeValue` or :class:`.Node` is saved or deleted. Use a cache backend which is shared between processes, or other processes may serve 304s for changed pages until the timeout.
+	
+	Changes that leave no stamp - such as edits to filesystem templates, to objects referenced by :class:`ContentReference`\ s, or to other objects the templates pull in - are not detected, which is why :setting:`PHILO_CONDITIONAL_VIEWS` is opt-in.
+	
+	:param page_pks: An iterable of :class:`Page` primary keys.
+	:param instance: A model instance (usually the :class:`.View` being rendered) whose field values should be part of the ETag.
+	:param extra_stamps: An iterable of (``last_modified``, ``count``) pairs for any other data the response depends on.
+	
+	"""
+	page_pks = sorted(page_pks)
+	node = getattr(request, 'node', None)
+	cache_key = VALIDATOR_CACHE_KEY % md5_constructor(repr([cache.get(VALIDATOR_GENERATION_KEY, 0), page_pks, getattr(node, 'pk', None)])).hexdigest()
+	stamps = cache.get(cache_key)
+	if stamps is None:
+		stamps = get_page_stamps(request, page_pks)
+		cache.set(cache_key, stamps, getattr(settings, 'PHILO_CONDITIONAL_VIEWS_CACHE_TIMEOUT', None))
+	stamps = stamps + list(extra_stamps)
+	
+	bits = [stamps]
+	if instance is not None:
+		bits.append([getattr(instance, field.attname) for field in instance._meta.fields])
+	user = getattr(request, 'user', None)
+	if user is not None and user.is_authenticated():
+		bits.append(user.pk)
+	
+	return md5_constructor(smart_str(repr(bits))).hexdigest(), None
+
+
 class Template(TreeModel):
 	"""Represents a database-driven django template."""
 	#: The name of the template. Used for organization and debugging.
@@ -88,6 +187,8 @@ class Template(TreeModel):
 	mimetype = models.CharField(max_length=255, default=getattr(settings, 'DEFAULT_CONTENT_TYPE', 'text/html'))
 	#: An insecure :class:`~philo.models.fields.TemplateField` containing the django template code for this template.
 	code = TemplateField(secure=False, verbose_name='django template code')
+	#: The time at which the :class:`Template` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	@property
 	def containers(self):
@@ -158,6 +259,8 @@ class Page(View):
 	template = models.ForeignKey(Template, related_name='pages')
 	#: The name of this page. Chances are this will be used for organization - i.e. finding the page in a list of pages - rather than for display.
 	title = models.CharField(max_length=255)
+	#: The time at which the :class:`Page` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	def get_containers(self):
 		"""
@@ -190,6 +293,12 @@ class Page(View):
 		page_finished_rendering_to_string.send(sender=self, string=string)
 		return string
 	
+	def get_validators(self, request, extra_context=None):
+		"""If :setting:`PHILO_CONDITIONAL_VIEWS` is ``True``, returns the results of :func:`get_page_validators` for this :class:`Page`. Otherwise conditional GETs are disabled."""
+		if not getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False):
+			return None, None
+		return get_page_validators(request, [self.pk], self)
+	
 	def actually_render_to_response(self, request, extra_context=None):
 		"""Returns an :class:`HttpResponse` with the content of the :meth:`render_to_string` method and the mimetype set to the :attr:`~Template.mimetype` of the related :class:`Template`."""
 		return HttpResponse(self.render_to_string(request, extra_context), mimetype=self.template.mimetype)
@@ -235,6 +344,8 @@ class Contentlet(models.Model):
 	name = models.CharField(max_length=255, db_index=True)
 	#: A secure :class:`~philo.models.fields.TemplateField` holding the content for this :class:`Contentlet`. Note that actually using this field as a template requires use of the :ttag:`include_string` template tag.
 	content = TemplateField()
+	#: The time at which the :class:`Contentlet` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	def __unicode__(self):
 		"""Returns the value of the :attr:`name` field."""
@@ -254,6 +365,8 @@ class ContentReference(models.Model):
 	content_id = models.PositiveIntegerField(verbose_name='Content ID', blank=True, null=True)
 	#: A :class:`GenericForeignKey` to a model instance. The content type of this instance is defined by the :ttag:`container` tag which defines this :class:`ContentReference`.
 	content = generic.GenericForeignKey('content_type', 'content_id')
+	#: The time at which the :class:`ContentReference` was last saved.
+	last_modified = models.DateTimeField(auto_now=True)
 	
 	def __unicode__(self):
 		"""Returns the value of the :attr:`name` field."""
@@ -264,4 +377,14 @@ class ContentReference(models.Model):
 
 
 register_value_model(Template)
-register_value_model(Page)
\ No newline at end of file
+register_value_model(Page)
+
+
+for model in (Template, Page, Contentlet, ContentReference, Attribute, Node):
+	models.signals.post_save.connect(clear_validator_cache, sender=model)
+	models.signals.post_delete.connect(clear_validator_cache, sender=model)
+
+for model in (JSONValue, ForeignKeyValue, ManyToManyValue):
+	models.signals.post_save.connect(touch_value_attributes, sender=model)
+	models.signals.post_delete.connect(touch_value_attributes, sender=model)
+models.signals.m2m_changed.connect(touch_many_to_many_value_attributes, sender=ManyToManyValue.values.through)
\ No newline at end of file
@@ -7,6 +7,8 @@ from django import template
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
+from philo.models.collections import Collection
+
 
 register = template.Library()
 
@@ -20,16 +22,20 @@ class MembersofNode(template.Node):
 	def render(self, context):
 		try:
 			collection = self.collection.resolve(context)
+		except template.VariableDoesNotExist:
+			return ''
+		
+		if isinstance(collection, Collection):
+			context[self.as_var] = collection.get_members(self.model)
+		elif hasattr(collection, 'members'):
 			context[self.as_var] = collection.members.with_model(self.model)
-		except:
-			pass
 		return ''
 
 
 @register.tag
 def membersof(parser, token):
 	"""
-	Given a collection and a content type, sets the results of :meth:`collection.members.with_model <.CollectionMemberManager.with_model>` as a variable in the context.
+	Given a collection and a content type, sets the results of :meth:`collection.members.with_model <.CollectionMemberManager.with_model>` - a queryset of the collection's members of that type, in index order - as a variable in the context. The results are cached if :setting:`PHILO_COLLECTION_CACHE_TIMEOUT` is set (see :meth:`.Collection.get_members`).
 	
 	Usage::
 	
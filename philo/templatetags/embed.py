@@ -5,6 +5,7 @@ The embed template tags are automatically included as builtins if :mod:`philo` i
 from django import template
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
 from django.template.loader_tags import ExtendsNode, BlockContext, BLOCK_CONTEXT_KEY, TextNode, BlockNode
 
 from philo.utils import LOADED_TEMPLATE_ATTR
@@ -15,10 +16,26 @@ EMBED_CONTEXT_KEY = 'embed_context'
 
 
 class EmbedContext(object):
-	"Inspired by django.template.loader_tags.BlockContext."
+	"""
+	Inspired by django.template.loader_tags.BlockContext. Keeps a stack of embed nodes per content type, along with the position of each node in its stack and, for each position, the position of the nearest node at or below it which can define a template. This lets :meth:`get_embed_template` find the template for a node without scanning or copying the stack.
+	
+	"""
 	def __init__(self):
 		self.embeds = {}
 		self.rendered = []
+		self._positions = {}
+		self._definers = {}
+	
+	def _index(self, content_type):
+		embeds = self.embeds[content_type]
+		positions = self._positions[content_type] = {}
+		definers = self._definers[content_type] = []
+		last = None
+		for i, embed in enumerate(embeds):
+			positions[embed] = i
+			if embed.may_define_template():
+				last = i
+			definers.append(last)
 	
 	def add_embeds(self, embeds):
 		for content_type, embed_list in embeds.iteritems():
@@ -26,37 +43,64 @@ class EmbedContext(object):
 				self.embeds[content_type] = embed_list + self.embeds[content_type]
 			else:
 				self.embeds[content_type] = embed_list
+			self._index(content_type)
+	
+	def add_embed(self, content_type, embed):
+		"""Pushes ``embed`` onto the stack for ``content_type`` unless it is already there."""
+		if content_type not in self.embeds:
+			self.embeds[content_type] = []
+			self._positions[content_type] = {}
+			self._definers[content_type] = []
+		
+		positions = self._positions[content_type]
+		if embed in positions:
+			return
+		
+		embeds, definers = self.embeds[content_type], self._definers[content_type]
+		positions[embed] = len(embeds)
+		if embed.may_define_template():
+			definers.append(len(embeds))
+		elif definers:
+			definers.append(definers[-1])
+		else:
+			definers.append(None)
+		embeds.append(embed)
+	
+	def _find_template(self, content_type, position, context):
+		# Walks down the template-defining nodes at or below ``position``.
+		embeds, definers = self.embeds[content_type], self._definers[content_type]
+		while position >= 0:
+			index = definers[position]
+			if index is None:
+				break
+			template = embeds[index].get_template(context)
+			if template:
+				return template
+			position = index - 1
+		return None
 	
 	def get_embed_template(self, embed, context):
 		"""To return a template for an embed node, find the node's position in the stack
 		and then progress up the stack until a template-defining node is found
 		"""
 		ct = embed.get_content_type(context)
-		embeds = self.embeds[ct]
-		embeds = embeds[:embeds.index(embed)][::-1]
-		for e in embeds:
-			template = e.get_template(context)
-			if template:
-				return template
+		template = self._find_template(ct, self._positions[ct][embed] - 1, context)
+		if template:
+			return template
 		
 		# No template was found in the current render_context - but perhaps one level up? Or more?
 		# We may be in an inclusion tag.
 		self_found = False
 		for context_dict in context.render_context.dicts[::-1]:
+			embed_context = context_dict.get(EMBED_CONTEXT_KEY)
 			if not self_found:
-				if self in context_dict.values():
-					self_found = True
-					continue
-			elif EMBED_CONTEXT_KEY not in context_dict:
-				continue
-			else:
-				embed_context = context_dict[EMBED_CONTEXT_KEY]
+				self_found = embed_context is self
+			elif embed_context is not None and ct in embed_context.embeds:
 				# We can tell where we are in the list of embeds by which have already been rendered.
-				embeds = embed_context.embeds[ct][:len(embed_context.rendered)][::-1]
-				for e in embeds:
-					template = e.get_template(context)
-					if template:
-						return template
+				position = min(len(embed_context.rendered), len(embed_context.embeds[ct])) - 1
+				template = embed_context._find_template(ct, position, context)
+				if template:
+					return template
 		
 		raise IndexError
 
@@ -129,8 +173,75 @@ ExtendsNode.__init__ = extends_node_init
 ExtendsNode.render = render_extends_node
 
 
+class EmbedLoader(object):
+	"""
+	Collects the :ttag:`embed` nodes which refer to instances by primary key as a template is parsed, so that the instances can be loaded with one query per content type instead of one query per node. Instances for constant primary keys are loaded once, the first time any of them is needed - or, if :setting:`TEMPLATE_DEBUG` is ``True``, as soon as the node is parsed, so that missing instances are reported at parse time; instances for variable primary keys are loaded once per render of the template. Instances of content types whose models no longer exist are treated as missing.
+	
+	"""
+	def __init__(self):
+		self.constant_nodes = []
+		self.variable_nodes = []
+	
+	def add(self, node):
+		node.loader = self
+		if isinstance(node, EmbedNode):
+			self.variable_nodes.append(node)
+		else:
+			self.constant_nodes.append(node)
+	
+	def _load(self, pks_by_ct):
+		instances = {}
+		for ct, pks in pks_by_ct.items():
+			model = ct.model_class()
+			if model is None:
+				bulk = {}
+			else:
+				bulk = model._default_manager.in_bulk(pks)
+			for pk in pks:
+				instances[ct, pk] = bulk.get(pk, False)
+		return instances
+	
+	def load_constant_instances(self):
+		pks_by_ct = {}
+		for node in self.constant_nodes:
+			if node._instance is None:
+				pks_by_ct.setdefault(node.content_type, set()).add(int(node._object_pk))
+		
+		instances = self._load(pks_by_ct)
+		
+		for node in self.constant_nodes:
+			if node._instance is None:
+				instance = instances[node.content_type, int(node._object_pk)]
+				if instance is False and settings.TEMPLATE_DEBUG:
+					raise getattr(node.content_type.model_class(), 'DoesNotExist', ObjectDoesNotExist)
+				node._instance = instance
+	
+	def get_variable_instances(self, context):
+		"""Returns a dictionary mapping (content type, pk) tuples to instances (or ``False`` for missing instances) for the variable nodes, loading every instance whose primary key can be resolved in ``context`` the first time it is called for a render."""
+		if self not in context.render_context:
+			pks_by_ct = {}
+			for node in self.variable_nodes:
+				try:
+					pk = int(node.object_pk.resolve(context))
+				except (template.VariableDoesNotExist, TypeError, ValueError):
+					continue
+				pks_by_ct.setdefault(node.content_type, set()).add(pk)
+			context.render_context[self] = self._load(pks_by_ct)
+		return context.render_context[self]
+
+
+def get_embed_loader(parser):
+	"""Returns the :class:`EmbedLoader` for a template parser, creating it if necessary."""
+	if not hasattr(parser, '_embed_loader'):
+		parser._embed_loader = EmbedLoader()
+	return parser._embed_loader
+
+
 class ConstantEmbedNode(template.Node):
-	"""Analogous to the ConstantIncludeNode, this node precompiles several variables necessary for correct rendering - namely the referenced instance or the included template."""
+	"""Analogous to the ConstantIncludeNode, this node precompiles several variables necessary for correct rendering - namely the referenced instance or the included template. If the node was added to an :class:`EmbedLoader`, the instance is loaded along with the instances of the template's other embed nodes the first time it is needed."""
+	#: The :class:`EmbedLoader` which will load the node's instance, if any.
+	loader = None
+	
 	def __init__(self, content_type, object_pk=None, template_name=None, kwargs=None):
 		assert template_name is not None or object_pk is not None
 		self.content_type = content_type
@@ -140,21 +251,30 @@ class ConstantEmbedNode(template.Node):
 			kwargs[k] = v
 		self.kwargs = kwargs
 		
-		if object_pk is not None:
-			self.instance = self.compile_instance(object_pk)
-		else:
-			self.instance = None
+		self._object_pk = object_pk
+		self._instance = None
 		
 		if template_name is not None:
 			self.template = self.compile_template(template_name[1:-1])
 		else:
 			self.template = None
 	
+	@property
+	def instance(self):
+		if self._object_pk is not None and self._instance is None:
+			if self.loader is not None:
+				self.loader.load_constant_instances()
+			else:
+				self._instance = self.compile_instance(self._object_pk)
+		return self._instance
+	
 	def compile_instance(self, object_pk):
 		model = self.content_type.model_class()
 		try:
+			if model is None:
+				raise ObjectDoesNotExist
 			return model.objects.get(pk=object_pk)
-		except model.DoesNotExist:
+		except ObjectDoesNotExist:
 			if not hasattr(self, 'object_pk') and settings.TEMPLATE_DEBUG:
 				# Then it's a constant node.
 				raise
@@ -175,6 +295,10 @@ class ConstantEmbedNode(template.Node):
 	def get_template(self, context):
 		return self.template
 	
+	def may_define_template(self):
+		"""Returns ``True`` if :meth:`get_template` might return a template for this node."""
+		return bool(self.template)
+	
 	def get_content_type(self, context):
 		return self.content_type
 	
@@ -183,11 +307,7 @@ class ConstantEmbedNode(template.Node):
 			context.render_context[EMBED_CONTEXT_KEY] = EmbedContext()
 		embed_context = context.render_context[EMBED_CONTEXT_KEY]
 		
-		ct = self.get_content_type(context)
-		if ct not in embed_context.embeds:
-			embed_context.embeds[ct] = [self]
-		elif self not in embed_context.embeds[ct]:
-			embed_context.embeds[ct].append(self)
+		embed_context.add_embed(self.get_content_type(context), self)
 	
 	def mark_rendered_for(self, context):
 		context.render_context[EMBED_CONTEXT_KEY].rendered.append(self)
@@ -246,30 +366,52 @@ class EmbedNode(ConstantEmbedNode):
 	def get_instance(self, context):
 		if self.object_pk is None:
 			return None
-		return self.compile_instance(self.object_pk.resolve(context))
+		object_pk = self.object_pk.resolve(context)
+		if self.loader is None:
+			return self.compile_instance(object_pk)
+		
+		instances = self.loader.get_variable_instances(context)
+		try:
+			key = self.content_type, int(object_pk)
+		except (TypeError, ValueError):
+			return self.compile_instance(object_pk)
+		if key not in instances:
+			# For example, the pk might come from a loop variable.
+			instances[key] = self.compile_instance(object_pk)
+		return instances[key]
 	
 	def get_template(self, context):
 		if self.template_name is None:
 			return None
 		return self.compile_template(self.template_name.resolve(context))
+	
+	def may_define_template(self):
+		return self.template_name is not None
 
 
 class InstanceEmbedNode(EmbedNode):
 	def __init__(self, instance, kwargs=None):
-		self.instance = instance
+		self.instance_var = instance
 		self.kwargs = kwargs or {}
+		self._content_types = {}
 	
 	def get_template(self, context):
 		return None
 	
+	def may_define_template(self):
+		return False
+	
 	def get_instance(self, context):
-		return self.instance.resolve(context)
+		return self.instance_var.resolve(context)
 	
 	def get_content_type(self, context):
 		instance = self.get_instance(context)
 		if not instance:
 			return None
-		return ContentType.objects.get_for_model(instance)
+		cls = instance.__class__
+		if cls not in self._content_types:
+			self._content_types[cls] = ContentType.objects.get_for_model(instance)
+		return self._content_types[cls]
 
 
 def get_embedded(self):
@@ -285,7 +427,7 @@ def parse_content_type(bit, tagname):
 	except ValueError:
 		raise template.TemplateSyntaxError('"%s" template tag expects the first argument to be of the form app_label.model' % tagname)
 	try:
-		ct = ContentType.objects.get(app_label=app_label, model=model)
+		ct = ContentType.objects.get_by_natural_key(app_label, model)
 	except ContentType.DoesNotExist:
 		raise template.TemplateSyntaxError('"%s" template tag requires an argument of the form app_label.model which refers to an installed content type (see django.contrib.contenttypes)' % tagname)
 	return ct
@@ -345,6 +487,11 @@ def embed(parser, token):
 	try:
 		int(pk)
 	except ValueError:
-		return EmbedNode(ct, object_pk=parser.compile_filter(pk), kwargs=kwargs)
+		node = EmbedNode(ct, object_pk=parser.compile_filter(pk), kwargs=kwargs)
 	else:
-		return ConstantEmbedNode(ct, object_pk=pk, kwargs=kwargs)
\ No newline at end of file
+		node = ConstantEmbedNode(ct, object_pk=pk, kwargs=kwargs)
+	get_embed_loader(parser).add(node)
+	if settings.TEMPLATE_DEBUG and isinstance(node, ConstantEmbedNode) and not isinstance(node, EmbedNode):
+		# Report missing instances while the template is parsed.
+		node.instance
+	return node
\ No newline at end of file
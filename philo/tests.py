@@ -1,17 +1,49 @@
+import datetime
+import shutil
 import sys
+import tempfile
 import traceback
 
 from django import template
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpRequest
+from django.utils.http import urlencode
 from django.db import connection
+from django.db.models.query import QuerySet
 from django.template import loader
 from django.template.loaders import cached
 from django.test import TestCase
-from django.test.utils import setup_test_template_loader
+from django.test.utils import setup_test_template_loader, restore_template_loaders
 
+from philo.contrib.julian.feedgenerator import ICalendarFeed, escape_text, fold_line, format_property
+from philo.contrib.julian.models import Calendar, CalendarView, Event, Location
+from philo.contrib.julian.recurrence import iter_starts
 from philo.contrib.penfield.models import Blog, BlogView, BlogEntry
+from philo.contrib.shipherd.cache import LocalNavigationCache, SharedNavigationCache
+from philo.contrib.shipherd.models import Navigation, NavigationItem
 from philo.exceptions import AncestorDoesNotExist
-from philo.models import Node, Page, Template
+from philo.models import Node, Page, Template, Redirect, File, Tag, Collection, CollectionMember, value_content_type_limiter
+from philo.models.base import attribute_value_limiter, Attribute, JSONValue
+from philo.models.nodes import get_current_site
+from philo.utils import paginate, keyset_paginate
+
+
+def count_queries(func, *args, **kwargs):
+	"""Returns the number of queries run by calling ``func`` with the given arguments. Unlike :meth:`TestCase.assertNumQueries`, this can be used to compare two runs."""
+	old_debug = settings.DEBUG
+	settings.DEBUG = True
+	try:
+		queries = len(connection.queries)
+		func(*args, **kwargs)
+		return len(connection.queries) - queries
+	finally:
+		settings.DEBUG = old_debug
 
 
 class TemplateTestCase(TestCase):
@@ -223,3 +255,770 @@ class TreePathTestCase(TestCase):
 		self.assertQueryLimit(1, 'second/third', root, callable=third.get_path)
 		self.assertQueryLimit(1, e, third, callable=second2.get_path)
 		self.assertQueryLimit(1, '? - ?', root, ' - ', 'title', callable=third.get_path)
+
+
+class SiteRootCacheTestCase(TestCase):
+	def setUp(self):
+		redirect = Redirect.objects.create(url_or_subpath='http://example.com/')
+		self.root = Node.objects.create(slug='root', view=redirect)
+		self.site = Site.objects.get_current()
+		self.site.root_node = self.root
+		self.site.save()
+	
+	def test_get_current_site(self):
+		request = HttpRequest()
+		self.assertEqual(count_queries(get_current_site, request), 1)
+		self.assertEqual(count_queries(get_current_site, request), 0)
+		
+		site = get_current_site(request)
+		self.assertEqual(count_queries(lambda: site.root_node), 0)
+		self.assertEqual(site.root_node, self.root)
+	
+	def test_tree_changes(self):
+		get_current_site(HttpRequest())
+		Node.objects.create(slug='child', parent=self.root, view=self.root.view)
+		# The root's tree fields are never kept beyond a request.
+		self.assertEqual(get_current_site(HttpRequest()).root_node.get_descendant_count(), 1)
+		self.assertEqual(get_current_site().root_node.get_descendant_count(), 1)
+
+
+class ContentTypeLimiterTestCase(TestCase):
+	def test_registry_limiter(self):
+		tag_ct = ContentType.objects.get_for_model(Tag)
+		collection_ct = ContentType.objects.get_for_model(Collection)
+		self.assertTrue(tag_ct in value_content_type_limiter)
+		self.assertTrue(tag_ct.pk in value_content_type_limiter.pks)
+		
+		value_content_type_limiter.unregister_class(Collection)
+		try:
+			self.assertFalse(collection_ct in value_content_type_limiter)
+		finally:
+			value_content_type_limiter.register_class(Collection)
+		self.assertTrue(collection_ct in value_content_type_limiter)
+	
+	def test_subclass_limiter(self):
+		self.assertTrue(ContentType.objects.get_for_model(JSONValue) in attribute_value_limiter)
+		self.assertFalse(ContentType.objects.get_for_model(Tag) in attribute_value_limiter)
+		self.assertEqual(set(ContentType.objects.filter(attribute_value_limiter.q_object()).values_list('pk', flat=True)), attribute_value_limiter.pks)
+
+
+class NodeViewPrefetchTestCase(TestCase):
+	def setUp(self):
+		redirect = Redirect.objects.create(url_or_subpath='http://example.com/')
+		template = Template.objects.create(name='blank', code='')
+		page = Page.objects.create(template=template, title='blank')
+		self.root = Node.objects.create(slug='root', view=redirect)
+		Node.objects.create(slug='first', parent=self.root, view=page)
+		Node.objects.create(slug='second', parent=self.root, view=page)
+		# Start from a known ContentType cache, holding exactly the view types.
+		ContentType.objects.clear_cache()
+		ContentType.objects.get_for_model(Redirect)
+		ContentType.objects.get_for_model(Page)
+	
+	def test_prefetch_views(self):
+		nodes = list(self.root.get_descendants(include_self=True))
+		# One query per view content type.
+		self.assertNumQueries(2, Node.objects.prefetch_views, nodes)
+		self.assertNumQueries(0, lambda: [(node.view, node.accepts_subpath) for node in nodes])
+		self.assertNumQueries(0, Node.objects.prefetch_views, nodes)
+
+
+class FileViewTestCase(TestCase):
+	def setUp(self):
+		self.field = File._meta.get_field('file')
+		self.old_storage = self.field.storage
+		self.location = tempfile.mkdtemp()
+		self.field.storage = FileSystemStorage(location=self.location)
+		
+		self.view = File(mimetype='text/plain')
+		self.view.file.save('test.txt', ContentFile('0123456789'), save=False)
+	
+	def tearDown(self):
+		self.field.storage = self.old_storage
+		shutil.rmtree(self.location)
+	
+	def get(self, **meta):
+		request = HttpRequest()
+		request.method = 'GET'
+		request.META.update(meta)
+		request.node = None
+		response = self.view.render_to_response(request)
+		return response, ''.join(response)
+	
+	def test_full(self):
+		response, content = self.get()
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(content, '0123456789')
+		self.assertEqual(response['Content-Length'], '10')
+		self.assertEqual(response['Accept-Ranges'], 'bytes')
+	
+	def test_conditional(self):
+		response, content = self.get()
+		response, content = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(content, '')
+		
+		response, content = self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+		self.assertEqual(response.status_code, 304)
+		
+		response, content = self.get(HTTP_IF_NONE_MATCH='"stale"')
+		self.assertEqual(response.status_code, 200)
+	
+	def test_conditional_when_wrapped(self):
+		etag = self.get()[0]['ETag']
+		# Simulate another view having rendered first and checked its own validators.
+		request = HttpRequest()
+		request.method = 'GET'
+		request.META['HTTP_IF_NONE_MATCH'] = etag
+		request.node = None
+		request._validators_checked = True
+		response = self.view.render_to_response(request)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+	
+	def test_range(self):
+		response, content = self.get(HTTP_RANGE='bytes=2-4')
+		self.assertEqual(response.status_code, 206)
+		self.assertEqual(content, '234')
+		self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+		
+		response, content = self.get(HTTP_RANGE='bytes=7-')
+		self.assertEqual(content, '789')
+		
+		response, content = self.get(HTTP_RANGE='bytes=-2')
+		self.assertEqual(content, '89')
+		
+		response, content = self.get(HTTP_RANGE='bytes=20-30')
+		self.assertEqual(response.status_code, 416)
+		
+		response, content = self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(content, '0123456789')
+	
+	def test_sendfile(self):
+		self.view.sendfile = 'X-Sendfile'
+		response, content = self.get()
+		self.assertEqual(content, '')
+		self.assertEqual(response['X-Sendfile'], self.view.file.path)
+
+
+class PageValidatorsTestCase(TestCase):
+	def setUp(self):
+		self.old_setting = getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False)
+		settings.PHILO_CONDITIONAL_VIEWS = True
+		self.template = Template.objects.create(name='Validators', slug='validators', code='{% container body %}')
+		self.page = Page.objects.create(title='Validators', template=self.template)
+		self.page.contentlets.create(name='body', content='Hello')
+		self.request = HttpRequest()
+		self.request.method = 'GET'
+		self.request.node = Node.objects.create(slug='validators', view=self.page)
+	
+	def tearDown(self):
+		settings.PHILO_CONDITIONAL_VIEWS = self.old_setting
+	
+	def test_validators(self):
+		etag, last_modified = self.page.get_validators(self.request)
+		self.assertTrue(etag)
+		# Deletions leave no modification time, so only an ETag is sent.
+		self.assertEqual(last_modified, None)
+		# The stamps are cached until a page, template, contentlet, etc. changes.
+		self.assertNumQueries(0, self.page.get_validators, self.request)
+		self.assertEqual(self.page.get_validators(self.request), (etag, None))
+		
+		contentlet = self.page.contentlets.create(name='other', content='World')
+		new_etag = self.page.get_validators(self.request)[0]
+		self.assertNotEqual(new_etag, etag)
+		contentlet.delete()
+		self.assertNotEqual(self.page.get_validators(self.request)[0], new_etag)
+	
+	def test_attribute_values(self):
+		value = JSONValue.objects.create(value='"Hello"')
+		Attribute.objects.create(entity=self.page, key='greeting', value=value)
+		etag = self.page.get_validators(self.request)[0]
+		# Changing a value doesn't save its attribute.
+		value.value = '"World"'
+		value.save()
+		self.assertNotEqual(self.page.get_validators(self.request)[0], etag)
+	
+	def test_not_modified(self):
+		response = self.page.render_to_response(self.request)
+		self.assertEqual(response.status_code, 200)
+		
+		self.request.META['HTTP_IF_NONE_MATCH'] = response['ETag']
+		del self.request._validators_checked
+		self.assertEqual(self.page.render_to_response(self.request).status_code, 304)
+	
+	def test_disabled(self):
+		settings.PHILO_CONDITIONAL_VIEWS = False
+		self.assertEqual(self.page.get_validators(self.request), (None, None))
+
+
+class FeedCacheTestCase(TestCase):
+	def setUp(self):
+		self.old_timeout = getattr(settings, 'PHILO_FEED_CACHE_TIMEOUT', None)
+		template = Template.objects.create(name='Feed', slug='feed', code='')
+		page = Page.objects.create(title='Feed', template=template)
+		self.blog = Blog.objects.create(title='Feed blog', slug='feed-blog')
+		self.entry = BlogEntry.objects.create(title='Entry', slug='entry', blog=self.blog, author=User.objects.create(username='feeder'), content='Content')
+		self.view = BlogView.objects.create(blog=self.blog, index_page=page, entry_page=page, tag_page=page, entry_permalink_style='D')
+		self.node = Node.objects.create(slug='feedblog', view=self.view)
+	
+	def tearDown(self):
+		settings.PHILO_FEED_CACHE_TIMEOUT = self.old_timeout
+	
+	def get_feed(self, query=None, **meta):
+		request = HttpRequest()
+		request.method = 'GET'
+		request.path = self.node.construct_url('/feed')
+		if query:
+			request.GET.update(query)
+			request.META['QUERY_STRING'] = urlencode(query)
+		request.META.update({'SERVER_NAME': 'testserver', 'SERVER_PORT': '80'}, **meta)
+		request.node = self.node
+		request.node.subpath = '/feed'
+		return self.view.render_to_response(request)
+	
+	def test_not_modified(self):
+		self.assertFalse(self.get_feed().has_header('ETag'))
+		
+		old_setting = getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False)
+		settings.PHILO_CONDITIONAL_VIEWS = True
+		try:
+			response = self.get_feed()
+			self.assertEqual(response.status_code, 200)
+			self.assertFalse(response.has_header('Last-Modified'))
+			etag = response['ETag']
+			self.assertEqual(self.get_feed(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+			
+			self.entry.author.first_name = 'Renamed'
+			self.entry.author.save()
+			self.assertEqual(self.get_feed(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		finally:
+			settings.PHILO_CONDITIONAL_VIEWS = old_setting
+	
+	def test_page_not_modified(self):
+		old_setting = getattr(settings, 'PHILO_CONDITIONAL_VIEWS', False)
+		settings.PHILO_CONDITIONAL_VIEWS = True
+		try:
+			request = HttpRequest()
+			request.method = 'GET'
+			request.node = self.node
+			request.node.subpath = '/'
+			etag = self.view.get_validators(request)[0]
+			request.META['HTTP_IF_NONE_MATCH'] = etag
+			self.assertEqual(self.view.render_to_response(request).status_code, 304)
+			
+			# The page shows the blog's fields, so editing the blog changes the ETag.
+			self.blog.title = 'Renamed blog'
+			self.blog.save()
+			del request._validators_checked
+			response = self.view.render_to_response(request)
+			self.assertEqual(response.status_code, 200)
+			self.assertNotEqual(response['ETag'], etag)
+		finally:
+			settings.PHILO_CONDITIONAL_VIEWS = old_setting
+	
+	def test_cache(self):
+		settings.PHILO_FEED_CACHE_TIMEOUT = 60
+		content = self.get_feed().content
+		self.assertTrue('Entry' in content)
+		# Only the current site and the node's url are fetched for a cached feed.
+		self.assertNumQueries(2, self.get_feed)
+		self.assertEqual(self.get_feed().content, content)
+		self.assertNotEqual(count_queries(self.get_feed, {'page': '2'}), 2)
+		
+		# Changes to another blog's entries leave the feed cached...
+		other = Blog.objects.create(title='Other blog', slug='other-blog')
+		BlogEntry.objects.create(title='Other', slug='other', blog=other, author=self.entry.author, content='')
+		self.assertNumQueries(2, self.get_feed)
+		
+		# ...but moving an entry to this blog doesn't.
+		BlogEntry.objects.filter(slug='other').get().delete()
+		entry = BlogEntry.objects.create(title='Moved', slug='moved', blog=other, author=self.entry.author, content='')
+		self.get_feed()
+		entry.blog = self.blog
+		entry.save()
+		self.assertTrue('Moved' in self.get_feed().content)
+		
+		self.blog.title = 'Renamed blog'
+		self.blog.save()
+		self.assertTrue('Renamed blog' in self.get_feed().content)
+	
+	def test_item_queries(self):
+		# The number of queries needed to build a feed doesn't depend on the number of items.
+		self.get_feed()
+		queries = count_queries(self.get_feed)
+		tags = [Tag.objects.create(name='Tag %d' % i, slug='tag-%d' % i) for i in range(2)]
+		for i in range(5):
+			entry = BlogEntry.objects.create(title='Entry %d' % i, slug='entry-%d' % i, blog=self.blog, author=self.entry.author, content='Content')
+			entry.tags = tags
+		self.assertEqual(count_queries(self.get_feed), queries)
+		self.assertTrue('Tag 1' in self.get_feed().content)
+	
+	def test_streaming(self):
+		for i in range(5):
+			BlogEntry.objects.create(title='Entry %d' % i, slug='entry-%d' % i, blog=self.blog, author=self.entry.author, content='Content')
+		self.view.item_chunk_size = 2
+		content = self.get_feed().content
+		
+		self.view.feed_length = None
+		response = self.get_feed()
+		self.assertFalse(response._is_string)
+		# The database isn't touched once the response is being sent.
+		chunks = []
+		self.assertNumQueries(0, chunks.extend, response)
+		self.assertEqual(''.join(chunks), content)
+
+
+class ArchiveIndexTestCase(TestCase):
+	def setUp(self):
+		self.old_timeout = getattr(settings, 'PHILO_ARCHIVE_CACHE_TIMEOUT', None)
+		settings.PHILO_ARCHIVE_CACHE_TIMEOUT = 60
+		self.blog = Blog.objects.create(title='Archive blog', slug='archive-blog')
+		self.author = User.objects.create(username='archivist')
+	
+	def tearDown(self):
+		settings.PHILO_ARCHIVE_CACHE_TIMEOUT = self.old_timeout
+	
+	def create_entry(self, slug, date):
+		return BlogEntry.objects.create(title=slug, slug=slug, blog=self.blog, author=self.author, content='', date=date)
+	
+	def test_entry_dates(self):
+		first = self.create_entry('first', datetime.datetime(2010, 10, 20, 12))
+		self.create_entry('second', datetime.datetime(2010, 10, 20, 18))
+		self.create_entry('third', datetime.datetime(2011, 2, 1))
+		dates = self.blog.entry_dates
+		self.assertEqual(dates['day'], list(self.blog.entries.dates('date', 'day', order='DESC')))
+		self.assertEqual(dates['year'], [datetime.datetime(2011, 1, 1), datetime.datetime(2010, 1, 1)])
+		self.assertEqual(self.blog.entry_date_counts['month'], [(datetime.datetime(2011, 2, 1), 1), (datetime.datetime(2010, 10, 1), 2)])
+		
+		self.assertNumQueries(0, lambda: self.blog.entry_date_counts)
+		
+		# The cached index is replaced as entries change.
+		self.create_entry('fourth', datetime.datetime(2011, 2, 3))
+		first.date = datetime.datetime(2009, 1, 1)
+		first.save()
+		BlogEntry.objects.get(slug='third').delete()
+		self.assertEqual(self.blog.entry_date_counts['day'], [(datetime.datetime(2011, 2, 3), 1), (datetime.datetime(2010, 10, 20), 1), (datetime.datetime(2009, 1, 1), 1)])
+
+
+class KeysetPaginationTestCase(TestCase):
+	def setUp(self):
+		blog = Blog.objects.create(title='Paged blog', slug='paged-blog')
+		author = User.objects.create(username='pager')
+		for i in range(7):
+			# Pairs of entries share a date, so the pk has to break ties.
+			BlogEntry.objects.create(title=str(i), slug=str(i), blog=blog, author=author, content='', date=datetime.datetime(2011, 1, 1 + i / 2))
+		self.entries = blog.entries.all()
+		self.ordering = ('-date', '-pk')
+		self.expected = list(self.entries.order_by(*self.ordering))
+	
+	def test_pages(self):
+		page, objects = keyset_paginate(self.entries, 3, self.ordering)
+		self.assertEqual(objects, self.expected[:3])
+		self.assertFalse(page.has_previous())
+		
+		page, objects = keyset_paginate(self.entries, 3, self.ordering, page.next_cursor)
+		self.assertEqual(objects, self.expected[3:6])
+		last, objects = keyset_paginate(self.entries, 3, self.ordering, page.next_cursor)
+		self.assertEqual(objects, self.expected[6:])
+		self.assertFalse(last.has_next())
+		
+		page, objects = keyset_paginate(self.entries, 3, self.ordering, last.previous_cursor)
+		self.assertEqual(objects, self.expected[3:6])
+		self.assertTrue(page.has_next() and page.has_previous())
+		page, objects = keyset_paginate(self.entries, 3, self.ordering, page.previous_cursor)
+		self.assertEqual(objects, self.expected[:3])
+		self.assertFalse(page.has_previous())
+		
+		# Invalid cursors give the first page.
+		self.assertEqual(keyset_paginate(self.entries, 3, self.ordering, 'nonsense')[1], self.expected[:3])
+	
+	def test_count_once(self):
+		def get_page():
+			paginator, page, objects = paginate(self.entries.order_by(*self.ordering), 3, 2)
+			self.assertEqual(list(objects), self.expected[3:6])
+		# One count and one select.
+		self.assertNumQueries(2, get_page)
+
+
+class ICalendarFeedTestCase(TestCase):
+	def test_fold_line(self):
+		line = u'DESCRIPTION:' + u'\xe9' * 100
+		folded = fold_line(line)
+		self.assertTrue(folded.endswith('\r\n'))
+		for physical in folded[:-2].split('\r\n'):
+			self.assertTrue(len(physical) <= 75)
+			physical.decode('utf-8')
+		self.assertEqual(folded[:-2].replace('\r\n ', '').decode('utf-8'), line)
+	
+	def test_write(self):
+		feed = ICalendarFeed(title=u'Calendar', link=u'http://example.com/', description=u'Events')
+		feed.add_item(title=u'Lunch, talk; q&a', link=u'http://example.com/lunch', description=u'Line 1\nLine 2', unique_id=u'lunch@example.com', start=datetime.date(2011, 1, 1), end=datetime.datetime(2011, 1, 1, 13, 30), categories=[u'food', u'talks'])
+		content = feed.writeString('utf-8')
+		self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'))
+		self.assertTrue(content.endswith('END:VEVENT\r\nEND:VCALENDAR\r\n'))
+		for line in ('SUMMARY:Lunch\\, talk\\; q&a', 'DESCRIPTION:Line 1\\nLine 2', 'DTSTART;VALUE=DATE:20110101', 'DTEND:20110101T133000', 'CATEGORIES:food,talks', 'URL:http://example.com/lunch'):
+			self.assertTrue('\r\n%s\r\n' % line in content, line)
+	
+	def test_escape_text(self):
+		self.assertEqual(escape_text(u'a\\b;c,d'), u'a\\\\b\\;c\\,d')
+		# Bare carriage returns would end the content line, so every style of line break becomes an escaped newline.
+		self.assertEqual(escape_text(u'1\r\n2\r3\n4'), u'1\\n2\\n3\\n4')
+
+
+class CalendarViewTestCase(TestCase):
+	def setUp(self):
+		template = Template.objects.create(name='Calendar', slug='calendar', code='')
+		page = Page.objects.create(title='Calendar', template=template)
+		self.site = Site.objects.get_current()
+		self.calendar = Calendar.objects.create(name='Calendar', slug='calendar', site=self.site)
+		self.view = CalendarView.objects.create(calendar=self.calendar, index_page=page, event_detail_page=page)
+		self.owner = User.objects.create(username='organizer')
+	
+	def create_event(self, slug, start_date, end_date, start_time=None, end_time=None):
+		event = Event.objects.create(name=slug, slug=slug, start_date=start_date, end_date=end_date, start_time=start_time, end_time=end_time, owner=self.owner, site=self.site)
+		self.calendar.events.add(event)
+		return event
+	
+	def test_timespans(self):
+		new_year = self.create_event('new-year', datetime.date(2010, 12, 31), datetime.date(2011, 1, 1))
+		lunch = self.create_event('lunch', datetime.date(2011, 1, 31), datetime.date(2011, 1, 31), datetime.time(12), datetime.time(13))
+		late = self.create_event('late', datetime.date(2011, 2, 28), datetime.date(2011, 3, 1), datetime.time(23), datetime.time(0))
+		self.assertEqual((late.start_datetime, late.end_datetime), (datetime.datetime(2011, 2, 28, 23), datetime.datetime(2011, 3, 1)))
+		self.assertEqual(new_year.end_datetime, datetime.datetime(2011, 1, 2))
+		
+		def slugs(*args):
+			return set(self.view.get_timespan_queryset(*args).values_list('slug', flat=True))
+		
+		self.assertEqual(slugs('2010'), set(['new-year']))
+		self.assertEqual(slugs('2011'), set(['new-year', 'lunch', 'late']))
+		self.assertEqual(slugs('2011', '01'), set(['new-year', 'lunch']))
+		self.assertEqual(slugs('2011', '01', '02'), set())
+		self.assertEqual(slugs('2011', '02'), set(['late']))
+		self.assertEqual(slugs('2011', '03'), set())
+		self.assertEqual(slugs('2011', '01', '31'), set(['lunch']))
+	
+	def test_recurrence(self):
+		standup = self.create_event('standup', datetime.date(2011, 1, 3), datetime.date(2011, 1, 3), datetime.time(9), datetime.time(10))
+		standup.recurrence_frequency = 'WEEKLY'
+		standup.save()
+		rent = self.create_event('rent', datetime.date(2011, 1, 31), datetime.date(2011, 1, 31))
+		rent.recurrence_frequency = 'MONTHLY'
+		rent.recurrence_count = 3
+		rent.save()
+		# February 31st doesn't exist, so it isn't counted.
+		self.assertEqual(rent.recurrence_end, datetime.datetime(2011, 6, 1))
+		self.assertEqual(standup.recurrence_end, None)
+		self.assertEqual(rent.get_rrule(), 'FREQ=MONTHLY;COUNT=3')
+		self.assertEqual(format_property('rrule', rent.get_rrule()), u'RRULE:FREQ=MONTHLY;COUNT=3')
+		
+		def slugs(*args):
+			return set(self.view.get_timespan_queryset(*args).values_list('slug', flat=True))
+		
+		self.assertEqual(slugs('2012'), set(['standup']))
+		self.assertEqual(slugs('2011', '05'), set(['standup', 'rent']))
+		self.assertEqual(slugs('2011', '06'), set(['standup']))
+		# The weekly standup is on Mondays, so it isn't listed for a Tuesday.
+		self.assertEqual(slugs('2011', '03', '07'), set(['standup']))
+		self.assertEqual(slugs('2011', '03', '08'), set())
+		self.assertEqual(self.view.get_events_by_timespan(None, '2011', '03', '08')[0].count(), 0)
+		
+		occurrences = self.view.get_timespan_occurrences('2011', '05', '31')
+		self.assertEqual([(o.slug, o.get_start()) for o in occurrences], [('rent', datetime.date(2011, 5, 31))])
+		occurrences = self.view.get_timespan_occurrences('2011', '03')
+		self.assertEqual([o.start_date.day for o in occurrences], [7, 14, 21, 28, 31])
+		self.assertEqual(occurrences[0].end_datetime, datetime.datetime(2011, 3, 7, 10))
+		
+		# An event whose limits leave no repetitions only matches its own dates.
+		rent.recurrence_until = datetime.date(2010, 1, 1)
+		self.assertRaises(ValidationError, rent.clean)
+		rent.save()
+		self.assertEqual(rent.recurrence_end, rent.end_datetime)
+		self.assertEqual(slugs('2011', '05'), set(['standup']))
+		
+		# Rules which only skip dates stop at the largest year.
+		self.assertEqual(list(iter_starts(datetime.datetime(2012, 2, 29), 'YEARLY', 4000)), [datetime.datetime(2012, 2, 29), datetime.datetime(6012, 2, 29)])
+	
+	def test_tags(self):
+		music, free = Tag.objects.create(name='Music', slug='music'), Tag.objects.create(name='Free', slug='free')
+		concert = self.create_event('concert', datetime.date(2011, 1, 1), datetime.date(2011, 1, 1))
+		concert.tags.add(music, free)
+		self.create_event('recital', datetime.date(2011, 1, 2), datetime.date(2011, 1, 2)).tags.add(music)
+		# Uses outside the calendar aren't counted.
+		Event.objects.create(name='gig', slug='gig', start_date=datetime.date(2011, 1, 3), end_date=datetime.date(2011, 1, 3), owner=self.owner, site=self.site).tags.add(music)
+		self.assertEqual(sorted([(tag.slug, tag.count) for tag in self.view.get_tag_queryset()]), [('free', 1), ('music', 2)])
+		
+		events, context = self.view.get_events_by_tag(None, 'music+free')
+		self.assertEqual(list(events), [concert])
+		events, context = self.view.get_events_by_tag(None, 'music')
+		self.assertEqual(set(events.values_list('slug', flat=True)), set(['concert', 'recital']))
+	
+	def test_location_querysets(self):
+		old_timeout = getattr(settings, 'PHILO_CALENDAR_CACHE_TIMEOUT', None)
+		settings.PHILO_CALENDAR_CACHE_TIMEOUT = 60
+		try:
+			hall = Location.objects.create(name='Hall', slug='hall')
+			talk = self.create_event('talk', datetime.date(2011, 1, 1), datetime.date(2011, 1, 1))
+			# Events in other calendars are ignored.
+			Event.objects.create(name='elsewhere', slug='elsewhere', start_date=datetime.date(2011, 1, 1), end_date=datetime.date(2011, 1, 1), owner=self.owner, site=self.site, location=Location.objects.create(name='Park', slug='park'))
+			self.assertEqual(self.view.get_location_querysets(), {})
+			
+			talk.location = hall
+			talk.save()
+			other = self.create_event('other-talk', datetime.date(2011, 1, 2), datetime.date(2011, 1, 2))
+			other.location = hall
+			other.save()
+			locations = self.view.get_location_querysets()
+			self.assertNumQueries(0, self.view.get_location_querysets)
+			self.assertEqual(locations.keys(), [ContentType.objects.get_for_model(Location)])
+			self.assertEqual(list(locations.values()[0]), [hall])
+		finally:
+			settings.PHILO_CALENDAR_CACHE_TIMEOUT = old_timeout
+
+
+class NavigationCacheTestCase(TestCase):
+	def setUp(self):
+		view = Redirect.objects.create(url_or_subpath='http://example.com/')
+		self.root = Node.objects.create(slug='navroot', view=view)
+		self.child = Node.objects.create(slug='child', parent=self.root, view=view)
+		self.other = Node.objects.create(slug='other', view=view)
+		self.navigation = Navigation.objects.create(node=self.root, key='main')
+		parent = NavigationItem.objects.create(navigation=self.navigation, text='Root', target_node=self.root)
+		NavigationItem.objects.create(parent=parent, text='Child', target_node=self.child)
+		NavigationItem.objects.create(parent=parent, text='Other', target_node=self.other)
+		Navigation.objects.clear_cache()
+	
+	def get_request(self, node):
+		request = HttpRequest()
+		request.path = node.get_absolute_url()
+		request.node = node
+		return request
+	
+	def test_local_lru(self):
+		cache = LocalNavigationCache('default')
+		cache.max_entries = 2
+		cache.set(self.root, {'a': 1})
+		cache.set(self.child, {'b': 2})
+		cache.get(self.root)
+		cache.set(self.other, {'c': 3})
+		self.assertEqual(cache.get(self.root), {'a': 1})
+		self.assertEqual(cache.get(self.child), None)
+		
+		cache.delete(self.root)
+		self.assertEqual(cache.get(self.root), None)
+		self.assertEqual(cache.get(self.other), {'c': 3})
+	
+	def test_local_targets_generation(self):
+		# Two backend instances stand in for two worker processes, which share django's cache.
+		first, second = LocalNavigationCache('default'), LocalNavigationCache('default')
+		generation = first.get_targets_generation()
+		second.invalidate_targets()
+		self.assertNotEqual(first.get_targets_generation(), generation)
+		self.assertEqual(first.get_targets_generation(), second.get_targets_generation())
+	
+	def test_shared_invalidation(self):
+		# Two backend instances stand in for two worker processes.
+		first, second = SharedNavigationCache('default'), SharedNavigationCache('default')
+		first.set(self.child, {'a': 1})
+		first.set(self.other, {'b': 2})
+		self.assertEqual(second.get(self.child), {'a': 1})
+		
+		second.delete(self.root)
+		self.assertEqual(first.get(self.child), None)
+		self.assertEqual(first.get(self.other), {'b': 2})
+		
+		second.clear()
+		self.assertEqual(first.get(self.other), None)
+		
+		first.set_many({self.root.pk: {'c': 3}, self.child.pk: {'d': 4}}, self.root.tree_id)
+		self.assertEqual(second.get_many([self.root.pk, self.child.pk, self.other.pk], self.root.tree_id), {self.root.pk: {'c': 3}, self.child.pk: {'d': 4}})
+	
+	def test_manager(self):
+		items = self.child.navigation['main']
+		self.assertEqual([item.text for item in items], ['Root'])
+		self.assertTrue(Navigation.objects.has_cache_for(self.root))
+		
+		self.child.navigation['main']
+		item = items[0]
+		item.text = 'Changed'
+		item.save()
+		
+		# Descendants' caches are patched rather than dropped.
+		self.assertNumQueries(0, lambda: [item.text for item in self.child.navigation['main']])
+		self.assertEqual([item.text for item in self.child.navigation['main']], ['Changed'])
+	
+	def test_incremental_update(self):
+		self.child.navigation['main']
+		child_navigation = Navigation.objects.create(node=self.child, key='main')
+		NavigationItem.objects.create(navigation=child_navigation, text='Local', target_node=self.child)
+		Navigation.objects.create(node=self.root, key='footer')
+		self.assertEqual([item.text for item in self.child.navigation['main']], ['Local'])
+		self.assertEqual(sorted(self.child.navigation.keys()), ['footer', 'main'])
+		
+		# Changes on the root don't override a descendant's own navigation...
+		item = NavigationItem.objects.get(text='Root')
+		item.text = 'Home'
+		item.save()
+		self.assertEqual([item.text for item in self.child.navigation['main']], ['Local'])
+		self.assertEqual([item.text for item in self.root.navigation['main']], ['Home'])
+		
+		# ...which falls back to the inherited navigation when it is deleted.
+		child_navigation.delete()
+		self.assertEqual([item.text for item in self.child.navigation['main']], ['Home'])
+	
+	def test_active_items(self):
+		request = self.get_request(self.child)
+		active, active_ancestors = Navigation.objects.get_active_items(request, self.child, 'main')
+		items = dict((item.text, item.pk) for item in Navigation.objects.get_cache_for(self.child)['main']['items'])
+		self.assertEqual(active, set([items['Child']]))
+		self.assertEqual(active_ancestors, set([items['Root']]))
+		
+		# The sets are remembered for the rest of the request.
+		self.assertNumQueries(0, Navigation.objects.get_active_items, request, self.child, 'main')
+	
+	def test_cached_children(self):
+		root = self.child.navigation['main'][0]
+		self.assertNumQueries(0, lambda: [child.text for child in root.get_children()])
+		self.assertEqual([child.text for child in root.get_children()], ['Child', 'Other'])
+		child = root.get_children()[0]
+		self.assertNumQueries(0, lambda: child.get_root().navigation)
+		self.assertEqual(child.get_root(), root)
+	
+	def test_recursenavigation(self):
+		t = template.Template("{% load shipherd %}{% recursenavigation node 'main' %}{{ item.text }}{% if navloop.active %}*{% endif %}{% if navloop.active_descendants %}+{% endif %}[{{ children }}]{% endrecursenavigation %}")
+		request = self.get_request(self.child)
+		content = t.render(template.Context({'node': self.child, 'request': request}))
+		self.assertEqual(content, 'Root+[Child*[]Other[]]')
+		
+		# Once the cache is warm, rendering the navigation doesn't touch the database.
+		self.assertNumQueries(0, t.render, template.Context({'node': self.child, 'request': self.get_request(self.child)}))
+	
+	def test_render_cache(self):
+		old_setting = getattr(settings, 'PHILO_NAVIGATION_RENDER_CACHE', False)
+		settings.PHILO_NAVIGATION_RENDER_CACHE = True
+		try:
+			t = template.Template("{% load shipherd %}{% recursenavigation node 'main' %}{{ item.text }}{{ extra }}{% if navloop.active %}*{% endif %}[{{ children }}]{% endrecursenavigation %}")
+			render = lambda node, extra: t.render(template.Context({'node': node, 'request': self.get_request(node), 'extra': extra}))
+			self.assertEqual(render(self.child, ''), 'Root[Child*[]Other[]]')
+			
+			# The output is cached per set of active items...
+			self.assertEqual(render(self.child, '!'), 'Root[Child*[]Other[]]')
+			self.assertEqual(render(self.root, ''), 'Root*[Child[]Other[]]')
+			
+			# ...until the navigation changes.
+			item = NavigationItem.objects.get(text='Root')
+			item.text = 'Home'
+			item.save()
+			self.assertEqual(render(self.child, ''), 'Home[Child*[]Other[]]')
+			
+			# ...or another process invalidates the targets.
+			t = template.Template("{% load shipherd %}{% recursenavigation node 'main' %}{{ item.target_url }}[{{ children }}]{% endrecursenavigation %}")
+			self.assertTrue('/other[]' in render(self.child, ''))
+			Node.objects.filter(pk=self.other.pk).update(slug='moved')
+			LocalNavigationCache('default').invalidate_targets()
+			self.assertTrue('/moved[]' in render(self.child, ''))
+		finally:
+			settings.PHILO_NAVIGATION_RENDER_CACHE = old_setting
+	
+	def test_missing_navigation(self):
+		t = template.Template("{% load shipherd %}{% recursenavigation node 'missing' %}{{ item.text }}{% endrecursenavigation %}")
+		self.assertEqual(t.render(template.Context({'node': self.child, 'request': self.get_request(self.child)})), settings.TEMPLATE_STRING_IF_INVALID)
+	
+	def test_target_urls(self):
+		items = Navigation.objects.get_cache_for(self.child)['main']['items']
+		self.assertEqual([item.target_url for item in items], [self.root.get_absolute_url(), self.child.get_absolute_url(), self.other.get_absolute_url()])
+		
+		self.child.slug = 'renamed'
+		self.child.save()
+		items = Navigation.objects.get_cache_for(self.child)['main']['items']
+		self.assertEqual(items[1].target_url, self.child.get_absolute_url())
+		self.assertTrue(items[1].target_url.endswith('/renamed'))
+		
+		# Changing the site's root node moves every target url.
+		generation = Navigation.objects.cache.get_targets_generation()
+		site = Site.objects.get_current()
+		site.save()
+		self.assertNotEqual(Navigation.objects.cache.get_targets_generation(), generation)
+
+
+class CollectionMembersTestCase(TestCase):
+	def setUp(self):
+		self.collection = Collection.objects.create(name='Featured')
+		self.tags = [Tag.objects.create(name='Tag %d' % i, slug='tag-%d' % i) for i in range(3)]
+		self.template = Template.objects.create(name='Member', slug='member', code='')
+		for index, instance in ((2, self.tags[0]), (0, self.tags[1]), (1, self.template), (3, self.tags[2])):
+			self.collection.members.create(index=index, member=instance)
+		ContentType.objects.get_for_model(Tag)
+		ContentType.objects.get_for_model(Template)
+	
+	def test_get_members(self):
+		# One query for the members and one per content type.
+		self.assertNumQueries(3, self.collection.members.get_members)
+		self.assertEqual(self.collection.members.get_members(), [self.tags[1], self.template, self.tags[0], self.tags[2]])
+		self.assertEqual(self.collection.members.get_members(Tag), [self.tags[1], self.tags[0], self.tags[2]])
+	
+	def test_cached_members(self):
+		old_setting = getattr(settings, 'PHILO_COLLECTION_CACHE_TIMEOUT', None)
+		settings.PHILO_COLLECTION_CACHE_TIMEOUT = 60
+		try:
+			self.assertEqual(list(self.collection.get_members(Tag)), [self.tags[1], self.tags[0], self.tags[2]])
+			self.assertNumQueries(0, lambda: list(self.collection.get_members(Tag)))
+			
+			self.collection.members.filter(index=0).get().delete()
+			self.assertEqual(list(self.collection.get_members(Tag)), [self.tags[0], self.tags[2]])
+		finally:
+			settings.PHILO_COLLECTION_CACHE_TIMEOUT = old_setting
+	
+	def test_membersof(self):
+		t = template.Template("{% membersof collection with philo.tag as tags %}{% for tag in tags %}{{ tag.slug }} {% endfor %}")
+		context = template.Context({'collection': self.collection})
+		self.assertEqual(t.render(context), 'tag-1 tag-0 tag-2 ')
+		self.assertTrue(isinstance(context['tags'], QuerySet))
+
+
+class EmbedLoadingTestCase(TestCase):
+	def setUp(self):
+		setup_test_template_loader({'embed-tag': '{{ embedded.slug }}', 'embed-tag-name': '{{ embedded.name }}', 'embed-template': '{{ embedded.name }}'})
+		self.tags = [Tag.objects.create(name='Tag %d' % i, slug='tag-%d' % i) for i in range(3)]
+		self.template = Template.objects.create(name='Embedded', slug='embedded', code='')
+		ContentType.objects.get_for_model(Tag)
+		ContentType.objects.get_for_model(Template)
+	
+	def tearDown(self):
+		restore_template_loaders()
+	
+	def test_constant_embeds(self):
+		t = template.Template(
+			'{%% embed philo.tag with "embed-tag" %%}{%% embed philo.template with "embed-template" %%}'
+			'{%% embed philo.tag %d %%} {%% embed philo.template %d %%} {%% embed philo.tag %d %%} {%% embed philo.tag 0 %%}' % (self.tags[0].pk, self.template.pk, self.tags[2].pk)
+		)
+		context = template.Context()
+		# One query per content type, regardless of the number of embeds.
+		self.assertNumQueries(2, t.render, context)
+		self.assertEqual(t.render(context), 'tag-0 Embedded tag-2 %s' % settings.TEMPLATE_STRING_IF_INVALID)
+		self.assertNumQueries(0, t.render, context)
+	
+	def test_missing_embeds(self):
+		# Content types whose models are gone are treated as missing instances.
+		ContentType.objects.create(name='gone', app_label='philo', model='gone')
+		t = template.Template('{% embed philo.gone 1 %}{% embed philo.tag 0 %}')
+		self.assertEqual(t.render(template.Context()), settings.TEMPLATE_STRING_IF_INVALID * 2)
+		
+		# With TEMPLATE_DEBUG, missing constant instances are reported at parse time.
+		old_td, settings.TEMPLATE_DEBUG = settings.TEMPLATE_DEBUG, True
+		try:
+			self.assertRaises(Tag.DoesNotExist, template.Template, '{% embed philo.tag 0 %}')
+		finally:
+			settings.TEMPLATE_DEBUG = old_td
+	
+	def test_variable_embeds(self):
+		t = template.Template('{% embed philo.tag with "embed-tag" %}{% embed philo.tag first %} {% embed philo.tag second %}{% for pk in pks %} {% embed philo.tag pk %}{% endfor %}')
+		context = template.Context({'first': self.tags[0].pk, 'second': self.tags[1].pk, 'pks': [self.tags[0].pk, self.tags[2].pk]})
+		self.assertNumQueries(2, t.render, context)
+		self.assertEqual(t.render(context), 'tag-0 tag-1 tag-0 tag-2')
+	
+	def test_many_embeds(self):
+		embed = '{%% embed philo.tag %d %%},' % self.tags[0].pk
+		t = template.Template('{% embed philo.tag with "embed-tag" %}' + embed * 300 + '{% embed philo.tag with "embed-tag-name" %}' + embed * 300)
+		self.assertEqual(t.render(template.Context()), 'tag-0,' * 300 + 'Tag 0,' * 300)
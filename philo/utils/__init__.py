@@ -1,8 +1,15 @@
-from django.db import models
+import base64
+import time
+
+from django.db import models, DatabaseError
+from django.contrib.contenttypes.generic import GenericForeignKey
+from django.db.models.loading import app_cache_ready
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import Paginator, EmptyPage
 from django.template import Context
 from django.template.loader_tags import ExtendsNode, ConstantIncludeNode
+from django.utils import simplejson
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, quote_etag
 
 
 def fattr(*args, **kwargs):
@@ -31,37 +38,81 @@ def fattr(*args, **kwargs):
 
 
 class ContentTypeLimiter(object):
+	"""
+	Base class for objects which can be passed as ``limit_choices_to`` for a :class:`ForeignKey` or :class:`ManyToManyField` to :class:`ContentType`. The primary keys of the valid :class:`ContentType`\ s are computed once the app cache is fully loaded and then cached until :meth:`clear_cache` is called, so that building admin forms and validating instances doesn't recompute them every time.
+	
+	"""
+	#: A list of all :class:`ContentTypeLimiter` instances, used by :func:`clear_content_type_limiter_caches`.
+	instances = []
+	
+	def __init__(self):
+		self._pks = None
+		ContentTypeLimiter.instances.append(self)
+	
+	def get_models(self):
+		"""Returns an iterable of the non-abstract model classes whose :class:`ContentType`\ s are valid choices."""
+		return []
+	
+	def get_pks(self):
+		"""Returns a frozenset of the primary keys of valid :class:`ContentType`\ s. The value will be cached on the limiter if the app cache has finished loading."""
+		if self._pks is not None:
+			return self._pks
+		
+		try:
+			pks = frozenset([ContentType.objects.get_for_model(model).pk for model in self.get_models()])
+		except DatabaseError:
+			# The ContentType table may not exist yet - for example, during syncdb.
+			return frozenset()
+		
+		if app_cache_ready():
+			self._pks = pks
+		return pks
+	pks = property(get_pks)
+	
+	def clear_cache(self):
+		"""Clears the cached primary keys so that they will be recomputed the next time they are needed."""
+		self._pks = None
+	
+	def __contains__(self, content_type):
+		"""Returns ``True`` if ``content_type`` (a :class:`ContentType` instance or primary key) is a valid choice."""
+		return getattr(content_type, 'pk', content_type) in self.pks
+	
 	def q_object(self):
-		return models.Q(pk__in=[])
+		return models.Q(pk__in=self.pks)
 	
 	def add_to_query(self, query, *args, **kwargs):
 		query.add_q(self.q_object(), *args, **kwargs)
 
 
+def clear_content_type_limiter_caches(sender=None, **kwargs):
+	"""Clears the cache of every :class:`ContentTypeLimiter`. This is connected to :obj:`~django.db.models.signals.class_prepared` and to changes in the :class:`ContentType` table."""
+	for limiter in ContentTypeLimiter.instances:
+		limiter.clear_cache()
+
+
+models.signals.class_prepared.connect(clear_content_type_limiter_caches)
+models.signals.post_save.connect(clear_content_type_limiter_caches, sender=ContentType)
+models.signals.post_delete.connect(clear_content_type_limiter_caches, sender=ContentType)
+
+
 class ContentTypeRegistryLimiter(ContentTypeLimiter):
 	"""Can be used to limit the choices for a :class:`ForeignKey` or :class:`ManyToManyField` to the :class:`ContentType`\ s which have been registered with this limiter."""
 	def __init__(self):
+		super(ContentTypeRegistryLimiter, self).__init__()
 		self.classes = []
 	
 	def register_class(self, cls):
 		"""Registers a model class with this limiter."""
 		self.classes.append(cls)
+		self.clear_cache()
 	
 	def unregister_class(self, cls):
 		"""Unregisters a model class from this limiter."""
 		self.classes.remove(cls)
+		self.clear_cache()
 	
-	def q_object(self):
-		contenttype_pks = []
-		for cls in self.classes:
-			try:
-				if issubclass(cls, models.Model):
-					if not cls._meta.abstract:
-						contenttype = ContentType.objects.get_for_model(cls)
-						contenttype_pks.append(contenttype.pk)
-			except:
-				pass
-		return models.Q(pk__in=contenttype_pks)
+	def get_models(self):
+		return [cls for cls in self.classes if issubclass(cls, models.Model) and not cls._meta.abstract]
 
 
 class ContentTypeSubclassLimiter(ContentTypeLimiter):
@@ -73,25 +124,109 @@ class ContentTypeSubclassLimiter(ContentTypeLimiter):
 	
 	"""
 	def __init__(self, cls, inclusive=False):
+		super(ContentTypeSubclassLimiter, self).__init__()
 		self.cls = cls
 		self.inclusive = inclusive
 	
-	def q_object(self):
-		contenttype_pks = []
-		def handle_subclasses(cls):
-			for subclass in cls.__subclasses__():
-				try:
-					if issubclass(subclass, models.Model):
-						if not subclass._meta.abstract:
-							if not self.inclusive and subclass is self.cls:
-								continue
-							contenttype = ContentType.objects.get_for_model(subclass)
-							contenttype_pks.append(contenttype.pk)
-					handle_subclasses(subclass)
-				except:
-					pass
-		handle_subclasses(self.cls)
-		return models.Q(pk__in=contenttype_pks)
+	def get_models(self):
+		if self.cls is None:
+			return []
+		
+		subclasses = []
+		seen = set()
+		stack = [self.cls]
+		while stack:
+			cls = stack.pop()
+			if cls in seen:
+				continue
+			seen.add(cls)
+			stack.extend(cls.__subclasses__())
+			
+			if not issubclass(cls, models.Model) or cls._meta.abstract:
+				continue
+			if cls is self.cls and not self.inclusive:
+				continue
+			subclasses.append(cls)
+		return subclasses
+
+
+### Prefetching related objects
+
+
+PREFETCHED_ATTR = '_%s_prefetched'
+
+
+def prefetch_related_objects(objs, *names):
+	"""
+	Given a list of model instances of a single class, fetches the objects related to them through each named :class:`ManyToManyField` or :class:`GenericForeignKey` in bulk. Many-to-many relations cost one query per field, and the results are stored on each instance for :func:`get_prefetched`; generic foreign keys cost one query per content type, and the results are stored in the field's own cache, so that accessing the field does not cause further queries.
+	
+	:returns: ``objs``
+	
+	"""
+	if not objs:
+		return objs
+	
+	model = objs[0].__class__
+	virtual_fields = dict([(field.name, field) for field in model._meta.virtual_fields])
+	for name in names:
+		if isinstance(virtual_fields.get(name), GenericForeignKey):
+			_prefetch_generic(objs, virtual_fields[name])
+			continue
+		
+		field = model._meta.get_field(name)
+		source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+		ordering = [(order[0] == '-' and '-' or '') + '%s__%s' % (target, order.lstrip('-')) for order in field.rel.to._meta.ordering]
+		rows = field.rel.through._default_manager.filter(**{'%s__in' % source: [obj.pk for obj in objs]}).select_related(target).order_by(*ordering)
+		
+		related = {}
+		for row in rows:
+			related.setdefault(getattr(row, '%s_id' % source), []).append(getattr(row, target))
+		for obj in objs:
+			setattr(obj, PREFETCHED_ATTR % name, related.get(obj.pk, []))
+	return objs
+
+
+def _prefetch_generic(objs, field):
+	pks = {}
+	for obj in objs:
+		ct_id = getattr(obj, field.model._meta.get_field(field.ct_field).attname)
+		if ct_id is not None:
+			pks.setdefault(ct_id, set()).add(getattr(obj, field.fk_field))
+	
+	instances = {}
+	for ct_id, ct_pks in pks.items():
+		model = ContentType.objects.get_for_id(ct_id).model_class()
+		if model is None:
+			continue
+		for pk, instance in model._default_manager.in_bulk(list(ct_pks)).items():
+			instances[ct_id, unicode(pk)] = instance
+	
+	for obj in objs:
+		ct_id = getattr(obj, field.model._meta.get_field(field.ct_field).attname)
+		setattr(obj, field.cache_attr, instances.get((ct_id, unicode(getattr(obj, field.fk_field)))))
+
+
+def get_prefetched(obj, name):
+	"""Returns a list of the objects related to ``obj`` through the :class:`ManyToManyField` ``name``, using the results of :func:`prefetch_related_objects` if they are available."""
+	try:
+		return getattr(obj, PREFETCHED_ATTR % name)
+	except AttributeError:
+		return list(getattr(obj, name).all())
+
+
+### Filtering by related objects
+
+
+def filter_by_all(queryset, field_name, objs):
+	"""
+	Returns the items in ``queryset`` which are related to every one of ``objs`` through the :class:`ManyToManyField` ``field_name``. Rather than filtering once for each object, which would join the related table once for each object, the related table is joined once and only the items with a matching relation for each of ``objs`` are kept - that is, the query ends with ``HAVING COUNT(...) = len(objs)``.
+	
+	"""
+	pks = set([obj.pk for obj in objs])
+	if not pks:
+		return queryset
+	matched = '%s_matched' % field_name
+	return queryset.filter(**{'%s__in' % field_name: pks}).annotate(**{matched: models.Count(field_name, distinct=True)}).filter(**{matched: len(pks)})
 
 
 ### Pagination
@@ -116,11 +251,11 @@ def paginate(objects, per_page=None, page_number=1):
 		# There also shouldn't be pagination if the list is too short. Try count()
 		# first - good chance it's a queryset, where count is more efficient.
 		try:
-			if objects.count() <= per_page:
-				paginator = page = None
-		except AttributeError:
-			if len(objects) <= per_page:
-				paginator = page = None
+			count = objects.count()
+		except (AttributeError, TypeError):
+			count = len(objects)
+		if count <= per_page:
+			paginator = page = None
 	
 	try:
 		return paginator, page, objects
@@ -128,6 +263,8 @@ def paginate(objects, per_page=None, page_number=1):
 		pass
 	
 	paginator = Paginator(objects, per_page)
+	# Don't let the paginator count the objects a second time.
+	paginator._count = count
 	try:
 		page_number = int(page_number)
 	except:
@@ -143,6 +280,155 @@ def paginate(objects, per_page=None, page_number=1):
 	return paginator, page, objects
 
 
+class KeysetPage(object):
+	"""A page of objects returned by :func:`keyset_paginate`. Like a :class:`django.core.paginator.Page`, but with cursors for the neighbouring pages instead of page numbers."""
+	def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+		self.object_list = object_list
+		#: The cursor for the next page, or ``None`` if this is the last page.
+		self.next_cursor = next_cursor
+		#: The cursor for the previous page, or ``None`` if this is the first page.
+		self.previous_cursor = previous_cursor
+	
+	def __len__(self):
+		return len(self.object_list)
+	
+	def __repr__(self):
+		return '<KeysetPage of %d objects>' % len(self)
+	
+	def has_next(self):
+		return self.next_cursor is not None
+	
+	def has_previous(self):
+		return self.previous_cursor is not None
+	
+	def has_other_pages(self):
+		return self.has_next() or self.has_previous()
+
+
+def _get_keyset_fields(model, ordering):
+	fields = []
+	for name in ordering:
+		descending = name.startswith('-')
+		name = name.lstrip('-')
+		field = name == 'pk' and model._meta.pk or model._meta.get_field(name)
+		fields.append((name, field, descending))
+	return fields
+
+
+def _make_cursor(direction, obj, fields):
+	values = [unicode(getattr(obj, field.attname)) for name, field, descending in fields]
+	return direction + base64.urlsafe_b64encode(simplejson.dumps(values)).rstrip('=')
+
+
+def _parse_cursor(cursor, fields):
+	try:
+		direction, data = cursor[0], str(cursor[1:])
+		if direction not in 'np':
+			raise ValueError
+		values = simplejson.loads(base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)))
+		if len(values) != len(fields):
+			raise ValueError
+		return direction, [field.to_python(value) for value, (name, field, descending) in zip(values, fields)]
+	except Exception:
+		return None, None
+
+
+def keyset_paginate(objects, per_page, ordering, cursor=None):
+	"""
+	Given a :class:`QuerySet`, returns a (``page``, ``objects``) tuple for the page which follows or precedes ``cursor``. Unlike :func:`paginate`, this never counts the objects and never uses an offset: each page is selected by comparing the ``ordering`` fields with those of the last object on the page before it, so deep pages are as fast as the first one.
+	
+	:param objects: The :class:`QuerySet` to be paginated.
+	:param per_page: The number of objects per page.
+	:param ordering: A sequence of field names, optionally prefixed with ``-`` for descending order, which the objects will be ordered by. Together, the fields must uniquely identify an object - end with ``'pk'`` if in doubt.
+	:param cursor: The :attr:`~KeysetPage.next_cursor` or :attr:`~KeysetPage.previous_cursor` of a page. If this is blank or invalid, the first page is returned.
+	:returns tuple: (``page``, ``objects``) where ``page`` is a :class:`KeysetPage` and ``objects`` is ``page.object_list``.
+	
+	"""
+	per_page = int(per_page)
+	fields = _get_keyset_fields(objects.model, ordering)
+	direction, values = cursor and _parse_cursor(cursor, fields) or (None, None)
+	backwards = direction == 'p'
+	
+	if values is not None:
+		# (a, b) > (x, y) is a > x OR (a = x AND b > y), with each comparison
+		# flipped for descending fields and again when paging backwards.
+		q = models.Q()
+		for i, (name, field, descending) in enumerate(fields):
+			lookup = descending != backwards and 'lt' or 'gt'
+			condition = dict([(fields[j][0], values[j]) for j in range(i)])
+			condition['%s__%s' % (name, lookup)] = values[i]
+			q |= models.Q(**condition)
+		objects = objects.filter(q)
+	
+	if backwards:
+		objects = objects.order_by(*[(descending and name or '-%s' % name) for name, field, descending in fields])
+	else:
+		objects = objects.order_by(*ordering)
+	
+	object_list = list(objects[:per_page + 1])
+	more = len(object_list) > per_page
+	object_list = object_list[:per_page]
+	if backwards:
+		object_list.reverse()
+		has_next, has_previous = True, more
+	else:
+		has_next, has_previous = more, values is not None
+	
+	page = KeysetPage(object_list)
+	if object_list:
+		if has_next:
+			page.next_cursor = _make_cursor('n', object_list[-1], fields)
+		if has_previous:
+			page.previous_cursor = _make_cursor('p', object_list[0], fields)
+	return page, object_list
+
+
+### Conditional GETs
+
+
+def is_not_modified(request, etag=None, last_modified=None):
+	"""
+	Returns ``True`` if the conditional headers of ``request`` show that the client already has the version of a resource described by ``etag`` and ``last_modified``. ``If-None-Match`` takes precedence over ``If-Modified-Since``, as :rfc:`2616` recommends.
+	
+	:param etag: An unquoted ETag for the current version of the resource, or ``None``.
+	:param last_modified: A :class:`datetime` at which the resource was last modified, or ``None``.
+	
+	"""
+	if request.method not in ('GET', 'HEAD'):
+		return False
+	
+	if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+	if if_none_match and etag is not None:
+		etags = parse_etags(if_none_match)
+		return etag in etags or '*' in etags
+	
+	if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+	if if_modified_since and last_modified is not None:
+		if_modified_since = parse_http_date_safe(if_modified_since)
+		return if_modified_since is not None and int(time.mktime(last_modified.timetuple())) <= if_modified_since
+	return False
+
+
+def if_range_matches(request, etag=None, last_modified=None):
+	"""Returns ``True`` unless ``request`` has an ``If-Range`` header which doesn't match ``etag`` or ``last_modified`` - that is, unless the client's partial copy of the resource is stale, in which case a ``Range`` should be ignored."""
+	if_range = request.META.get('HTTP_IF_RANGE')
+	if not if_range:
+		return True
+	if if_range.startswith('"') or if_range.startswith('W/'):
+		return etag is not None and etag in parse_etags(if_range)
+	return last_modified is not None and parse_http_date_safe(if_range) == int(time.mktime(last_modified.timetuple()))
+
+
+def set_validators(response, etag=None, last_modified=None):
+	"""Sets the ``ETag`` and ``Last-Modified`` headers on ``response`` unless they have already been set. Validators are only added to successful and 304 responses."""
+	if response.status_code not in (200, 206, 304):
+		return
+	if etag is not None and not response.has_header('ETag'):
+		response['ETag'] = quote_etag(etag)
+	if last_modified is not None and not response.has_header('Last-Modified'):
+		response['Last-Modified'] = http_date(time.mktime(last_modified.timetuple()))
+
+
 ### Facilitating template analysis.
 
 